@@ -2,6 +2,7 @@ const express = require('express');
 const cors = require('cors');
 const bodyParser = require('body-parser');
 const { spawn } = require('child_process');
+const http = require('http');
 const path = require('path');
 const fs = require('fs');
 const multer = require('multer');
@@ -20,67 +21,196 @@ for (const dir of [inputImagesDir, inputVideosDir]) {
   }
 }
 
-function runPython(args, res) {
-  const proc = spawn('python3', args, { cwd: projectRoot });
-  let stdout = '';
-  let stderr = '';
-  proc.stdout.on('data', data => { stdout += data.toString(); });
-  proc.stderr.on('data', data => { stderr += data.toString(); });
-  proc.on('close', code => {
-    res.json({ code, stdout, stderr });
-  });
+// video.py --progress json writes one event per stderr line behind this prefix
+const PROGRESS_PREFIX = '@progress ';
+
+// Clients following video progress on GET /api/progress (server-sent events)
+const progressClients = new Set();
+
+function broadcastProgress(event) {
+  const message = `data: ${JSON.stringify(event)}\n\n`;
+  progressClients.forEach(client => client.write(message));
 }
 
-function runScript(cmd, args, res) {
-  const proc = spawn(cmd, args, { cwd: projectRoot });
-  let stdout = '';
-  let stderr = '';
-  proc.stdout.on('data', data => { stdout += data.toString(); });
-  proc.stderr.on('data', data => { stderr += data.toString(); });
-  proc.on('close', code => {
-    res.json({ code, stdout, stderr });
-  });
+// Split text into complete lines (passed to onLine) and the unfinished remainder (returned)
+function consumeLines(text, onLine) {
+  const lines = text.split('\n');
+  const rest = lines.pop();
+  lines.forEach(onLine);
+  return rest;
 }
 
-function runScriptWithCallback(cmd, args, onComplete) {
+function runScriptWithCallback(cmd, args, onComplete, onProgress) {
   const proc = spawn(cmd, args, { cwd: projectRoot });
   let stdout = '';
   let stderr = '';
+  let pending = '';
+  // Progress events are relayed and left out of stderr
+  const onStderrLine = line => {
+    if (onProgress && line.startsWith(PROGRESS_PREFIX)) {
+      try {
+        onProgress(JSON.parse(line.slice(PROGRESS_PREFIX.length)));
+        return;
+      } catch (error) {
+        // Not an event after all; keep it in stderr
+      }
+    }
+    stderr += `${line}\n`;
+  };
   proc.stdout.on('data', data => { stdout += data.toString(); });
-  proc.stderr.on('data', data => { stderr += data.toString(); });
+  proc.stderr.on('data', data => {
+    pending = consumeLines(pending + data.toString(), onStderrLine);
+  });
   proc.on('close', code => {
+    if (pending) onStderrLine(pending);
     onComplete(code, stdout, stderr);
   });
 }
 
+// Resident Python processing service (worker_service.py). It keeps the interpreter,
+// Pillow and detected ffmpeg capabilities warm, so jobs skip per-request start-up.
+// Set PYTHON_WORKER=off to spawn the scripts for every request instead.
+const workerEnabled = process.env.PYTHON_WORKER !== 'off';
+const workerPort = process.env.PYTHON_WORKER_PORT || '5055';
+
+function startPythonWorker() {
+  if (!workerEnabled) return;
+  const proc = spawn('python3', ['worker_service.py', '--port', workerPort], { cwd: projectRoot, stdio: 'inherit' });
+  proc.on('exit', code => {
+    console.log(`Python worker exited with code ${code}; restarting in 5s`);
+    setTimeout(startPythonWorker, 5000);
+  });
+}
+
+// Plain http.request rather than fetch: video jobs can run far longer than fetch's header timeout.
+// With onProgress the job is streamed: the worker sends progress events as JSON lines while it
+// runs, then the payload as the line with event 'result'.
+function callWorker(method, params, onProgress) {
+  return new Promise((resolve, reject) => {
+    const body = JSON.stringify({ method, params, stream: Boolean(onProgress) });
+    const req = http.request({
+      host: '127.0.0.1',
+      port: workerPort,
+      path: '/rpc',
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) },
+    }, response => {
+      let data = '';
+      let payload;
+      const streamed = onProgress && response.statusCode < 400;
+      const onLine = line => {
+        if (!line) return;
+        const event = JSON.parse(line);
+        if (event.event === 'result') {
+          payload = event;
+        } else {
+          onProgress(event);
+        }
+      };
+      response.on('data', chunk => {
+        data += chunk;
+        if (streamed) {
+          try {
+            data = consumeLines(data, onLine);
+          } catch (error) {
+            response.destroy(error);
+          }
+        }
+      });
+      response.on('error', reject);
+      response.on('end', () => {
+        try {
+          if (streamed) {
+            onLine(data);
+          } else {
+            payload = JSON.parse(data);
+          }
+        } catch (error) {
+          reject(error);
+          return;
+        }
+        // Invalid requests (e.g. a non-numeric jobs) come back as 400 {error}
+        if (response.statusCode >= 400) {
+          reject(new Error(payload.error || `HTTP ${response.statusCode}`));
+          return;
+        }
+        if (!payload) {
+          reject(new Error('worker stream ended without a result'));
+          return;
+        }
+        resolve(payload);
+      });
+    });
+    req.on('error', reject);
+    req.end(body);
+  });
+}
+
+// Run a job on the resident worker; if it is not reachable, spawn the equivalent script.
+// onComplete receives (code, stdout, stderr, result); result is only set by the worker.
+// onProgress, if given, receives each progress event of a video job while it runs.
+function runJob(method, params, fallbackArgs, onComplete, onProgress) {
+  if (!workerEnabled) {
+    runScriptWithCallback('python3', fallbackArgs, onComplete, onProgress);
+    return;
+  }
+  callWorker(method, params, onProgress)
+    .then(payload => onComplete(payload.code, payload.stdout, payload.stderr, payload.result))
+    .catch(error => {
+      if (error.code === 'ECONNREFUSED') {
+        runScriptWithCallback('python3', fallbackArgs, onComplete, onProgress);
+        return;
+      }
+      onComplete(1, '', `Python worker request failed: ${error.message}`);
+    });
+}
+
+// Video jobs report progress as JSON events, relayed to GET /api/progress
+function runVideoJob(params, fallbackArgs, onComplete) {
+  runJob('process_videos', { ...params, progress: 'json' }, [...fallbackArgs, '--progress', 'json'],
+    onComplete, broadcastProgress);
+}
+
+function respondWithOutput(res) {
+  return (code, stdout, stderr) => res.json({ code, stdout, stderr });
+}
+
+function downloadParams(type, urls) {
+  return type === 'image' ? { image_urls: urls } : { video_urls: urls };
+}
+
+function runProcessing(type, onComplete) {
+  if (type === 'image') {
+    runJob('process_images', {}, ['image.py'], onComplete);
+  } else {
+    runVideoJob({ bulk: true, queue: true }, ['video.py', '--bulk', '--queue'], onComplete);
+  }
+}
+
 function runDownload(type, urls = [], res) {
   const args = ['download.py'];
   const flag = type === 'image' ? '--image-url' : '--video-url';
   urls.forEach(url => {
     args.push(flag, url);
   });
-  runScript('python3', args, res);
+  runJob('download', downloadParams(type, urls), args, respondWithOutput(res));
 }
 
-function runDownloadProcess(type, url, res) {
+// Download and process in one streaming pass (pipeline.py): each file is processed as soon
+// as it arrives. Exit code 1 means a download failed, 2 that processing failed.
+function runDownloadPipeline(type, urls, res) {
   const flag = type === 'image' ? '--image-url' : '--video-url';
-  const args = ['download.py', flag, url];
-  runScriptWithCallback('python3', args, (code, stdout, stderr) => {
-    if (code !== 0) {
-      res.status(500).json({ code, stdout, stderr });
-      return;
-    }
-    const processArgs = type === 'image'
-      ? ['image.py']
-      : ['video.py', '--bulk'];
-    runScriptWithCallback('python3', processArgs, (processCode, processStdout, processStderr) => {
-      res.json({
-        code: processCode,
-        stdout: stdout + processStdout,
-        stderr: stderr + processStderr,
-      });
-    });
+  const args = ['pipeline.py'];
+  urls.forEach(url => {
+    args.push(flag, url);
   });
+  runJob('download_process', downloadParams(type, urls), args, (code, stdout, stderr) => {
+    res.status(code === 1 ? 500 : 200).json({ code, stdout, stderr });
+  });
+}
+
+function runDownloadProcess(type, url, res) {
+  runDownloadPipeline(type, [url], res);
 }
 
 function runDownloadBulk(type, urls, autoProcess, res) {
@@ -88,30 +218,21 @@ function runDownloadBulk(type, urls, autoProcess, res) {
     res.status(400).json({ error: 'urls array is required' });
     return;
   }
+  if (autoProcess) {
+    runDownloadPipeline(type, urls, res);
+    return;
+  }
   const args = ['download.py'];
   const flag = type === 'image' ? '--image-url' : '--video-url';
   urls.forEach(url => {
     args.push(flag, url);
   });
-  runScriptWithCallback('python3', args, (code, stdout, stderr) => {
+  runJob('download', downloadParams(type, urls), args, (code, stdout, stderr) => {
     if (code !== 0) {
       res.status(500).json({ code, stdout, stderr });
       return;
     }
-    if (!autoProcess) {
-      res.json({ code, stdout, stderr });
-      return;
-    }
-    const processArgs = type === 'image'
-      ? ['image.py']
-      : ['video.py', '--bulk'];
-    runScriptWithCallback('python3', processArgs, (processCode, processStdout, processStderr) => {
-      res.json({
-        code: processCode,
-        stdout: stdout + processStdout,
-        stderr: stderr + processStderr,
-      });
-    });
+    res.json({ code, stdout, stderr });
   });
 }
 
@@ -125,15 +246,11 @@ function autodetectLatestFiles(type) {
 }
 
 function processAllImages(res) {
-  runScriptWithCallback('python3', ['image.py'], (code, stdout, stderr) => {
-    res.json({ code, stdout, stderr });
-  });
+  runProcessing('image', respondWithOutput(res));
 }
 
 function processAllVideos(res) {
-  runScriptWithCallback('python3', ['video.py', '--bulk'], (code, stdout, stderr) => {
-    res.json({ code, stdout, stderr });
-  });
+  runProcessing('video', respondWithOutput(res));
 }
 
 const storage = multer.diskStorage({
@@ -151,7 +268,7 @@ const upload = multer({ storage });
 
 // Trigger full download for images and videos
 app.post('/api/download', (req, res) => {
-  runScript('python3', ['download.py'], res);
+  runJob('download', {}, ['download.py'], respondWithOutput(res));
 });
 
 // Download specific image URLs
@@ -216,21 +333,24 @@ app.post('/api/upload-media', upload.array('files', 100), (req, res) => {
 
 // Trigger image processing pipeline
 app.post('/api/process-images', (req, res) => {
-  runScript('python3', ['image.py'], res);
+  const jobs = req.body && req.body.jobs;
+  const args = ['image.py'];
+  if (jobs) { args.push('--jobs', String(jobs)); }
+  runJob('process_images', { jobs }, args, respondWithOutput(res));
 });
 
 // Trigger video processing pipeline; accept optional 'bulk' flag in request body
 app.post('/api/process-videos', (req, res) => {
   const args = ['video.py'];
-  if (req.body.bulk) args.push('--bulk');
+  if (req.body.bulk) args.push('--bulk', '--queue');
   if (req.body.jobs) { args.push('--jobs', String(req.body.jobs)); }
-  runScript('python3', args, res);
+  runVideoJob({ bulk: Boolean(req.body.bulk), queue: Boolean(req.body.bulk), jobs: req.body.jobs }, args, respondWithOutput(res));
 });
 
 // Process all staged media (images and videos)
 app.post('/api/process-all', (req, res) => {
-  runScriptWithCallback('python3', ['image.py'], (imageCode, imageStdout, imageStderr) => {
-    runScriptWithCallback('python3', ['video.py', '--bulk'], (videoCode, videoStdout, videoStderr) => {
+  runProcessing('image', (imageCode, imageStdout, imageStderr) => {
+    runProcessing('video', (videoCode, videoStdout, videoStderr) => {
       res.json({
         image: { code: imageCode, stdout: imageStdout, stderr: imageStderr },
         video: { code: videoCode, stdout: videoStdout, stderr: videoStderr },
@@ -239,15 +359,25 @@ app.post('/api/process-all', (req, res) => {
   });
 });
 
+// Progress of running video jobs as server-sent events, one JSON event per message
+// (frame, fps, speed, out_time, bitrate_kbps, percentage, done, file)
+app.get('/api/progress', (req, res) => {
+  res.writeHead(200, {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    Connection: 'keep-alive',
+  });
+  res.write(': connected\n\n');
+  progressClients.add(res);
+  req.on('close', () => progressClients.delete(res));
+});
+
 // List available input videos
 app.get('/api/input-videos', (req, res) => {
-  const proc = spawn('python3', ['video.py', '--list-json'], { cwd: projectRoot });
-  let stdout = '';
-  let stderr = '';
-  proc.stdout.on('data', data => { stdout += data.toString(); });
-  proc.stderr.on('data', data => { stderr += data.toString(); });
-  proc.on('close', code => {
-    if (code === 0) {
+  runJob('list_videos', {}, ['video.py', '--list-json'], (code, stdout, stderr, result) => {
+    if (code === 0 && result !== undefined) {
+      res.json(result);
+    } else if (code === 0) {
       try {
         const parsed = JSON.parse(stdout || '[]');
         res.json(parsed);
@@ -264,9 +394,9 @@ app.get('/api/input-videos', (req, res) => {
 app.post('/api/process-videos-selection', (req, res) => {
   const { filenames = [], jobs, bulk } = req.body || {};
   if (bulk) {
-    const args = ['video.py', '--bulk'];
+    const args = ['video.py', '--bulk', '--queue'];
     if (jobs) args.push('--jobs', String(jobs));
-    runPython(args, res);
+    runVideoJob({ bulk: true, queue: true, jobs }, args, respondWithOutput(res));
     return;
   }
   if (!Array.isArray(filenames) || filenames.length === 0) {
@@ -275,7 +405,7 @@ app.post('/api/process-videos-selection', (req, res) => {
   }
   const args = ['video.py', '--files-json', JSON.stringify(filenames)];
   if (jobs) args.push('--jobs', String(jobs));
-  runPython(args, res);
+  runVideoJob({ files: filenames, jobs }, args, respondWithOutput(res));
 });
 
 // Serve processed output folders for download
@@ -315,4 +445,5 @@ app.get('/api/health', (req, res) => {
 });
 
 const PORT = process.env.PORT || 5000;
+startPythonWorker();
 app.listen(PORT, () => console.log(`Backend server listening on port ${PORT}`));
\ No newline at end of file
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the image, video and download hot paths.
+
+Fixtures are generated locally, so runs are reproducible on any machine:
+deterministic images at a range of aspect ratios and sizes, and videos made with
+video.create_test_video at several resolutions and durations. Each case runs in
+a fresh process and records wall time, CPU time (including ffmpeg children),
+peak RSS and a throughput figure: images/sec, realtime factor for video, MB/s for
+downloads, plus output size against the size target where there is one.
+
+    python benchmark.py                             # full suite -> benchmark_results.json
+    python benchmark.py --quick --output before.json
+    python benchmark.py --compare before.json       # flag regressions against an earlier run
+
+Results from --compare runs exit with code 1 when any case got slower (or bigger)
+than --threshold allows.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+import functools
+import http.server
+import concurrent.futures
+import multiprocessing
+from datetime import datetime, timezone
+from pathlib import Path
+
+from PIL import Image
+
+import image
+import video
+import download
+
+RESULTS_VERSION = 1
+# Bump when fixture generation changes so cached fixtures are rebuilt
+FIXTURE_VERSION = 1
+DEFAULT_FIXTURES_DIR = os.path.join(tempfile.gettempdir(), f'spotlight_bench_fixtures_v{FIXTURE_VERSION}')
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_THRESHOLD = 0.10
+
+# (name, width, height): landscape/portrait/square, phone and camera sizes
+IMAGE_FIXTURES = [
+    ('landscape_4x3', 1600, 1200),
+    ('portrait_3x4', 1200, 1600),
+    ('wide_16x9', 1920, 1080),
+    ('tall_9x16', 1080, 1920),
+    ('square', 1000, 1000),
+    ('camera_12mp', 4000, 3000),
+]
+# (name, width, height, duration in seconds)
+VIDEO_FIXTURES = [
+    ('wide_360p', 640, 360, 5),
+    ('tall_720p', 720, 1280, 5),
+    ('wide_720p', 1280, 720, 10),
+]
+SIZE_LIMIT_FIXTURE = ('noisy_720p', 1280, 720, 6)
+SIZE_LIMIT_TARGET_MB = 1
+# Large enough that noisy_video never reaches the size-cap re-encode
+UNCAPPED_MB = 1000
+VIDEO_TARGET_MB = 10
+
+# Metrics where a larger number is worse, compared by --compare
+COMPARED_METRICS = ('wall_s', 'cpu_s', 'peak_rss_mb', 'output_mb')
+
+# --- Fixtures ---------------------------------------------------------------
+
+def _synthetic_image(width, height):
+    """Deterministic RGB image with detail for the JPEG codec to work on."""
+    detail = Image.effect_mandelbrot((width, height), (-2.2, -1.3, 0.8, 1.3), 120)
+    horizontal = Image.linear_gradient('L').rotate(90).resize((width, height))
+    radial = Image.radial_gradient('L').resize((width, height))
+    return Image.merge('RGB', (detail, horizontal, radial))
+
+def _create_noisy_video(output_path, width, height, duration):
+    """High-entropy clip at a high bitrate, so the size cap has real work to do."""
+    cmd = [
+        'ffmpeg',
+        '-f', 'lavfi', '-i', f'testsrc2=s={width}x{height}:r=30:d={duration},noise=alls=40:allf=t',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '12',
+        '-c:a', 'aac',
+        '-y', output_path
+    ]
+    success, _, _ = video.run_ffmpeg(cmd, log_success=False)
+    return success
+
+def create_fixtures(fixtures_dir, quick=False):
+    """Create (or reuse) the fixture set in fixtures_dir and return its layout."""
+    copies = 2 if quick else 8
+    images_dir = os.path.join(fixtures_dir, 'quick_images' if quick else 'images')
+    videos_dir = os.path.join(fixtures_dir, 'quick_videos' if quick else 'videos')
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(videos_dir, exist_ok=True)
+
+    for name, width, height in IMAGE_FIXTURES[:3] if quick else IMAGE_FIXTURES:
+        first = os.path.join(images_dir, f"{name}_1.jpg")
+        if not os.path.exists(first):
+            _synthetic_image(width, height).save(first, 'JPEG', quality=90)
+        for index in range(2, copies + 1):
+            path = os.path.join(images_dir, f"{name}_{index}.jpg")
+            if not os.path.exists(path):
+                shutil.copyfile(first, path)
+
+    have_ffmpeg = shutil.which('ffmpeg') is not None
+    noisy_name, noisy_width, noisy_height, noisy_duration = SIZE_LIMIT_FIXTURE
+    noisy_path = os.path.join(fixtures_dir, f"{'quick_' if quick else ''}{noisy_name}.mp4")
+    if have_ffmpeg:
+        for name, width, height, duration in VIDEO_FIXTURES[:1] if quick else VIDEO_FIXTURES:
+            path = os.path.join(videos_dir, f"{name}.mp4")
+            if not os.path.exists(path):
+                video.create_test_video(path, width, height, duration)
+        if not os.path.exists(noisy_path):
+            _create_noisy_video(noisy_path, noisy_width, noisy_height, 3 if quick else noisy_duration)
+
+    return {
+        'images_dir': images_dir,
+        'videos_dir': videos_dir,
+        'noisy_video': noisy_path,
+        'have_ffmpeg': have_ffmpeg,
+    }
+
+# --- Cases ------------------------------------------------------------------
+# Each case takes (fixtures, scratch_dir, options) and returns a metrics dict. Counts
+# such as 'images', 'media_duration_s' and 'bytes' are turned into rates afterwards.
+
+def _folder_size_mb(folder):
+    return sum(
+        os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder) if not name.startswith('.')
+    ) / (1024 * 1024)
+
+def _system_info():
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not video.check_ffmpeg_installed():
+            return None
+        return video.check_hardware_encoders(video.detect_system())
+
+def bench_images(engine, fixtures, scratch_dir, options):
+    input_dir = fixtures['images_dir']
+    filenames = sorted(name for name in os.listdir(input_dir) if name.lower().endswith(image.ALLOWED_EXTENSIONS))
+    image.process_images_in_folder(input_dir, scratch_dir, filenames, options['jobs'], force=True, engine=engine)
+    return {'images': len(filenames), 'output_mb': _folder_size_mb(scratch_dir)}
+
+def bench_videos(fixtures, scratch_dir, options):
+    system_info = _system_info()
+    video_files = video.get_video_files(fixtures['videos_dir'])
+    durations = [video.get_video_info(path)['duration'] for _, path in video_files]
+    video.process_videos_in_folder(
+        fixtures['videos_dir'], scratch_dir, video_files, system_info=system_info,
+        max_output_size_mb=VIDEO_TARGET_MB, use_manifest=False
+    )
+    sizes = [
+        video.get_file_size_mb(video.get_output_path(scratch_dir, filename, 'mp4'))
+        for filename, _ in video_files
+    ]
+    return {
+        'videos': len(video_files),
+        'media_duration_s': sum(durations),
+        'output_mb': sum(sizes),
+        'target_mb': VIDEO_TARGET_MB,
+        'max_size_vs_target': max(sizes) / VIDEO_TARGET_MB if sizes else 0,
+    }
+
+def bench_noisy_video(fixtures, scratch_dir, options, roi=False):
+    """Full pipeline on the high-entropy clip with no size cap, so output_mb is the first encode's size."""
+    system_info = _system_info()
+    input_dir = os.path.join(scratch_dir, 'input')
+    output_dir = os.path.join(scratch_dir, 'output')
+    os.makedirs(input_dir)
+    path = os.path.join(input_dir, os.path.basename(fixtures['noisy_video']))
+    shutil.copyfile(fixtures['noisy_video'], path)
+    duration = video.get_video_info(path)['duration']
+    video.process_videos_in_folder(
+        input_dir, output_dir, [(os.path.basename(path), path)], system_info=system_info,
+        max_output_size_mb=UNCAPPED_MB, use_manifest=False, roi=roi
+    )
+    return {
+        'media_duration_s': duration,
+        'output_mb': video.get_file_size_mb(video.get_output_path(output_dir, os.path.basename(path), 'mp4')),
+    }
+
+def bench_size_limit(fixtures, scratch_dir, options):
+    system_info = _system_info()
+    path = os.path.join(scratch_dir, 'oversized.mp4')
+    shutil.copyfile(fixtures['noisy_video'], path)
+    duration = video.get_video_info(path)['duration']
+    input_mb = video.get_file_size_mb(path)
+    video.enforce_size_limit(path, SIZE_LIMIT_TARGET_MB, duration, system_info)
+    output_mb = video.get_file_size_mb(path)
+    return {
+        'media_duration_s': duration,
+        'input_mb': input_mb,
+        'output_mb': output_mb,
+        'target_mb': SIZE_LIMIT_TARGET_MB,
+        'max_size_vs_target': output_mb / SIZE_LIMIT_TARGET_MB,
+    }
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+def bench_download(fixtures, scratch_dir, options):
+    handler = functools.partial(_QuietHandler, directory=fixtures['images_dir'])
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    # Short poll interval: shutdown() waits for it and is part of the measured time
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        names = sorted(os.listdir(fixtures['images_dir']))
+        jobs = [
+            {'url': f"{base_url}/{name}", 'output_file': Path(scratch_dir) / name, 'label': name}
+            for name in names
+        ]
+        succeeded = download.download_jobs(jobs, options['concurrency'])
+    finally:
+        server.shutdown()
+        server.server_close()
+    total_bytes = sum(os.path.getsize(job['output_file']) for job in succeeded)
+    return {'files': len(succeeded), 'failed': len(jobs) - len(succeeded), 'bytes': total_bytes}
+
+def get_cases(fixtures):
+    """name -> case function for everything that can run on this machine."""
+    cases = {}
+    for engine in image.ENGINES:
+        if engine == 'numpy' and image.composite_numpy is None:
+            continue
+        if engine == 'ffmpeg' and not fixtures['have_ffmpeg']:
+            continue
+        cases[f'images_{engine}'] = functools.partial(bench_images, engine)
+    if fixtures['have_ffmpeg']:
+        cases['videos'] = bench_videos
+        cases['noisy_video'] = bench_noisy_video
+        cases['noisy_video_roi'] = functools.partial(bench_noisy_video, roi=True)
+        cases['size_limit'] = bench_size_limit
+    cases['download'] = bench_download
+    return cases
+
+# --- Measurement --------------------------------------------------------------
+
+def _peak_rss_mb():
+    """Peak RSS of this process or its largest child (ffmpeg), in MB."""
+    import resource
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _run_case(name, fixtures, options):
+    """Run one case in the current (fresh) process and return its metrics."""
+    case = get_cases(fixtures)[name]
+    scratch_dir = tempfile.mkdtemp(prefix='spotlight_bench_')
+    try:
+        times_before = os.times()
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            metrics = case(fixtures, scratch_dir, options)
+        wall = time.perf_counter() - start_time
+        times_after = os.times()
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    metrics['wall_s'] = wall
+    metrics['cpu_s'] = sum(after - before for after, before in zip(times_after[:4], times_before[:4]))
+    metrics['peak_rss_mb'] = _peak_rss_mb()
+    if metrics.get('images'):
+        metrics['images_per_sec'] = metrics['images'] / wall
+    if metrics.get('media_duration_s'):
+        metrics['realtime_factor'] = metrics['media_duration_s'] / wall
+    if metrics.get('bytes'):
+        metrics['mb_per_sec'] = metrics['bytes'] / (1024 * 1024) / wall
+    return metrics
+
+def run_case_isolated(name, fixtures, options):
+    """Run a case in a fresh interpreter so peak RSS and warm caches don't leak between cases."""
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_run_case, name, fixtures, options).result()
+
+def _ffmpeg_version():
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
+        return result.stdout.split('\n')[0]
+    except OSError:
+        return None
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(fixtures_dir=DEFAULT_FIXTURES_DIR, quick=False, only=None, jobs=1, concurrency=8, repeat=1):
+    """
+    Run the benchmark cases and return the results document.
+
+    repeat runs each case several times and keeps the fastest run (least noise).
+    """
+    print(f"Preparing fixtures in '{fixtures_dir}'...")
+    fixtures = create_fixtures(fixtures_dir, quick)
+    options = {'jobs': jobs, 'concurrency': concurrency}
+    cases = get_cases(fixtures)
+    names = [name for name in cases if not only or name in only]
+
+    results = {}
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            runs.append(run_case_isolated(name, fixtures, options))
+        best = min(runs, key=lambda metrics: metrics['wall_s'])
+        results[name] = best
+        print(f"  {name:<16} {format_metrics(best)}")
+
+    return {
+        'version': RESULTS_VERSION,
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': _ffmpeg_version(),
+        },
+        'options': {'quick': quick, 'jobs': jobs, 'concurrency': concurrency, 'repeat': repeat},
+        'results': results,
+    }
+
+def format_metrics(metrics):
+    parts = [f"wall {metrics['wall_s']:.2f}s", f"cpu {metrics['cpu_s']:.2f}s", f"rss {metrics['peak_rss_mb']:.0f}MB"]
+    if 'images_per_sec' in metrics:
+        parts.append(f"{metrics['images_per_sec']:.1f} img/s")
+    if 'realtime_factor' in metrics:
+        parts.append(f"{metrics['realtime_factor']:.2f}x realtime")
+    if 'mb_per_sec' in metrics:
+        parts.append(f"{metrics['mb_per_sec']:.1f} MB/s")
+    if 'max_size_vs_target' in metrics:
+        parts.append(f"size {metrics['max_size_vs_target'] * 100:.0f}% of target")
+    return ', '.join(parts)
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Print per-case changes against a baseline and return the list of regressions:
+    (case, metric, old, new) where new is more than threshold worse than old.
+    """
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')}):")
+    for name, metrics in current['results'].items():
+        old_metrics = baseline.get('results', {}).get(name)
+        if not old_metrics:
+            print(f"  {name:<16} (new case)")
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            old, new = old_metrics.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ''
+            if change > threshold:
+                flag = ' ⚠️'
+                regressions.append((name, metric, old, new))
+            changes.append(f"{metric} {change * 100:+.0f}%{flag}")
+        if old_metrics.get('max_size_vs_target', 0) <= 1 < metrics.get('max_size_vs_target', 0):
+            changes.append('over size target ⚠️')
+            regressions.append((name, 'max_size_vs_target', old_metrics['max_size_vs_target'], metrics['max_size_vs_target']))
+        print(f"  {name:<16} {', '.join(changes)}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image, video and download processing.")
+    parser.add_argument('--quick', action='store_true', help='Smaller fixture set for a fast check')
+    parser.add_argument('--only', nargs='+', help='Run only these cases (e.g. images_pillow videos)')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Worker processes for image cases (default: 1)')
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='Simultaneous downloads (default: 8)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per case; the fastest is kept (default: 1)')
+    parser.add_argument('--fixtures-dir', default=DEFAULT_FIXTURES_DIR, help='Where fixtures are generated and cached')
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT, help=f'Results file (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Relative slowdown counted as a regression (default: 0.10)')
+    args = parser.parse_args()
+
+    results = run_suite(args.fixtures_dir, args.quick, args.only, args.jobs, args.concurrency, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold * 100:.0f}%")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Build manifest used by image.py and video.py to skip inputs that are already up to date.
+
+For every output the manifest records the input's content hash, the parameters the
+output was built with and the version of the script that built it. A re-run only
+processes an input when one of those changed or the output is missing.
+
+The manifest lives in the output folder as .build_manifest.json, keyed by output
+filename. Hashes are only recomputed when an input's size or mtime changes.
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+MANIFEST_FILE = '.build_manifest.json'
+MANIFEST_VERSION = 1
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(output_folder):
+    """Load the manifest entries for output_folder (empty if missing or unreadable)."""
+    try:
+        with open(os.path.join(output_folder, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == MANIFEST_VERSION:
+            return data.get('entries', {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+def save_manifest(output_folder, entries):
+    """Write the manifest atomically so an interrupted run never leaves it half-written."""
+    try:
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=output_folder)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, os.path.join(output_folder, MANIFEST_FILE))
+    except OSError as e:
+        print(f"⚠️  Could not save build manifest: {e}")
+
+def input_fingerprint(entry, input_path):
+    """
+    Return (size, mtime_ns, sha256) for input_path, reusing the hash stored in entry
+    when the size and mtime still match.
+    """
+    stat = os.stat(input_path)
+    if entry and entry.get('input_size') == stat.st_size and entry.get('input_mtime_ns') == stat.st_mtime_ns:
+        return stat.st_size, stat.st_mtime_ns, entry['input_sha256']
+    return stat.st_size, stat.st_mtime_ns, hash_file(input_path)
+
+def is_up_to_date(entries, output_path, input_path, params, script_version):
+    """True if output_path exists and was built from the same input content, params and version."""
+    entry = entries.get(os.path.basename(output_path))
+    if not entry or not os.path.exists(output_path) or not os.path.exists(input_path):
+        return False
+    if entry.get('params') != params or entry.get('script_version') != script_version:
+        return False
+    if os.path.getsize(output_path) != entry.get('output_size'):
+        return False
+    size, mtime_ns, sha256 = input_fingerprint(entry, input_path)
+    if sha256 != entry.get('input_sha256'):
+        return False
+    # Touched but unchanged: remember the new mtime so the next run skips hashing
+    entry['input_size'], entry['input_mtime_ns'] = size, mtime_ns
+    return True
+
+def record_output(entries, output_path, input_path, params, script_version):
+    """Record that output_path was built from input_path with params by script_version."""
+    key = os.path.basename(output_path)
+    size, mtime_ns, sha256 = input_fingerprint(entries.get(key), input_path)
+    entries[key] = {
+        'input': os.path.basename(input_path),
+        'input_size': size,
+        'input_mtime_ns': mtime_ns,
+        'input_sha256': sha256,
+        'params': params,
+        'script_version': script_version,
+        'output_size': os.path.getsize(output_path),
+    }
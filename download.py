@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 
+import os
 import re
-import subprocess
+import time
+import threading
+import http.client
+import urllib.parse
+import concurrent.futures
 from pathlib import Path
 import argparse
 
+import metrics
+
 IMAGE_INPUT_FILE = "links_images.txt"
 VIDEO_INPUT_FILE = "links_videos.txt"
 INPUT_IMAGE_FOLDER = "input_images"
@@ -12,6 +19,16 @@ INPUT_VIDEO_FOLDER = "input_videos"
 Path(INPUT_IMAGE_FOLDER).mkdir(exist_ok=True)
 Path(INPUT_VIDEO_FOLDER).mkdir(exist_ok=True)
 
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # seconds; doubled after every failed attempt
+DEFAULT_TIMEOUT = 30
+CHUNK_SIZE = 256 * 1024
+USER_AGENT = "spotlight-downloader/1.0"
+
+# Per-thread pool of kept-alive connections, keyed by (scheme, host)
+_thread_state = threading.local()
+
 def extract_event_id(line):
     """Extract event ID from URL"""
     match = re.search(r'[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}_(\d+)MEDIA', line)
@@ -37,37 +54,138 @@ def extract_video_extension(line):
     match = re.search(r'\.(mp4|mov|avi|mkv|webm|flv|ts|mpg)', line, re.IGNORECASE)
     return match.group(0) if match else ''
 
-def download_file(url, output_path, validate=False):
+class DownloadError(Exception):
+    """Raised when a URL cannot be fetched; status holds the HTTP status if there was one."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+def _get_connection(scheme, netloc, timeout):
+    """Return this thread's kept-alive connection to scheme://netloc, opening one if needed."""
+    connections = getattr(_thread_state, 'connections', None)
+    if connections is None:
+        connections = _thread_state.connections = {}
+    conn = connections.get((scheme, netloc))
+    if conn is None:
+        conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        conn = conn_class(netloc, timeout=timeout)
+        connections[(scheme, netloc)] = conn
+    return conn
+
+def _drop_connection(scheme, netloc):
+    """Close and forget this thread's connection to scheme://netloc."""
+    connections = getattr(_thread_state, 'connections', {})
+    conn = connections.pop((scheme, netloc), None)
+    if conn is not None:
+        conn.close()
+
+def _request(url, timeout):
+    """Send a GET over the pooled connection for url's host and return the response."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        raise DownloadError(f"Unsupported URL scheme: {parts.scheme or '(none)'}")
+    target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+    headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'identity'}
+
+    # A kept-alive connection may have been closed by the server since its last use;
+    # in that case reconnect once straight away instead of burning a retry on it.
+    for attempt in range(2):
+        conn = _get_connection(parts.scheme, parts.netloc, timeout)
+        reused = conn.sock is not None
+        try:
+            conn.request('GET', target, headers=headers)
+            return conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            _drop_connection(parts.scheme, parts.netloc)
+            if not reused or attempt == 1:
+                raise
+        except Exception:
+            _drop_connection(parts.scheme, parts.netloc)
+            raise
+
+def fetch_to_file(url, output_path, timeout=DEFAULT_TIMEOUT, max_redirects=5):
     """
-    Try to download file, return True if successful
-    validate=True will use -f flag to fail on HTTP errors (for blob validation)
+    Stream url to output_path over a kept-alive connection, following redirects.
+
+    Data is written to '<output_path>.part' and renamed into place once complete,
+    so an interrupted download never leaves a truncated file behind.
+    Returns the number of bytes written; raises DownloadError or OSError on failure.
     """
-    try:
-        cmd = ['curl', '-s', '-L', '-o', output_path, url]
-        if validate:
-            cmd.insert(2, '-f')  # Add -f flag for validation
-        
-        result = subprocess.run(cmd, capture_output=True, timeout=30)
-        
-        if result.returncode == 0 and Path(output_path).stat().st_size > 0:
-            return True
-        else:
-            # Log curl error output for debugging
-            err = result.stderr.decode('utf-8', errors='replace').strip()
-            print(f"  DEBUG: curl failed for {url}\n    stderr: {err}")
-            Path(output_path).unlink(missing_ok=True)
-            return False
-    except Exception as e:
-        Path(output_path).unlink(missing_ok=True)
+    for _ in range(max_redirects + 1):
+        response = _request(url, timeout)
+        if response.status in (301, 302, 303, 307, 308):
+            location = response.getheader('Location')
+            response.read()
+            if not location:
+                raise DownloadError(f"HTTP {response.status} without Location header")
+            url = urllib.parse.urljoin(url, location)
+            continue
+        if response.status != 200:
+            response.read()
+            raise DownloadError(f"HTTP {response.status}", response.status)
+
+        part_path = f"{output_path}.part"
+        written = 0
+        try:
+            with open(part_path, 'wb') as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+            if response.length:
+                raise DownloadError(f"Connection closed with {response.length} bytes missing")
+            if written == 0:
+                raise DownloadError("Empty response body")
+            os.replace(part_path, output_path)
+        except BaseException:
+            _drop_connection(*urllib.parse.urlsplit(url)[:2])
+            Path(part_path).unlink(missing_ok=True)
+            raise
+        if response.will_close:
+            _drop_connection(*urllib.parse.urlsplit(url)[:2])
+        return written
+    raise DownloadError(f"Too many redirects (>{max_redirects})")
+
+def download_file(url, output_path, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Try to download file, return True if successful.
+
+    Transient failures (network errors, 5xx, 408 and 429) are retried with
+    exponential backoff; other HTTP errors fail immediately.
+    """
+    with metrics.stage('download', file=os.path.basename(output_path)) as event:
+        for attempt in range(retries + 1):
+            event['attempts'] = attempt + 1
+            try:
+                event['bytes'] = fetch_to_file(url, output_path)
+                return True
+            except (DownloadError, http.client.HTTPException, OSError) as e:
+                status = getattr(e, 'status', None)
+                retryable = status is None or status >= 500 or status in (408, 429)
+                if not retryable or attempt == retries:
+                    print(f"  DEBUG: download failed for {url}\n    error: {e}")
+                    Path(output_path).unlink(missing_ok=True)
+                    event['ok'] = False
+                    return False
+                time.sleep(backoff * (2 ** attempt))
+        event['ok'] = False
         return False
 
-def process_image_line(line):
-    """Process a single line from the file"""
+def plan_image_line(line, keep_existing=False):
+    """
+    Work out where a line from the image links file should be saved.
+    Returns a job dict (url, output_file, label) or None when there is nothing to download.
+    With keep_existing, a file that is already on disk is still returned, marked 'exists',
+    so callers that process downloads can pick it up without fetching it again.
+    """
     line = line.strip()
     if not line:
-        return
+        return None
     
-    # Check for StepZero URL and download by UUID using wget
+    # Check for StepZero URL and download by UUID
     if line.startswith('https://stepzero.blob.core.windows.net'):
         # Use the entire line as the URL (don't split on |||)
         full_url = line.strip()
@@ -77,7 +195,7 @@ def process_image_line(line):
         if not uuid:
             print(f"⊘ Skipping StepZero (no UUID found in URL)")
             print(f"   URL: {full_url}")
-            return
+            return None
         
         # Always use .jpeg extension for StepZero files
         output_file = Path(INPUT_IMAGE_FOLDER) / f"{uuid}.jpeg"
@@ -85,7 +203,9 @@ def process_image_line(line):
         # Check if already downloaded
         if output_file.exists():
             print(f"→ Already exists: {uuid}.jpeg")
-            return
+            if keep_existing:
+                return {'url': full_url, 'output_file': output_file, 'label': f"{uuid}.jpeg", 'exists': True}
+            return None
         
         # Enhanced logging
         print(f"\n{'='*60}")
@@ -93,58 +213,40 @@ def process_image_line(line):
         print(f"  Extracted UUID: {uuid}")
         print(f"  Saved filename: {uuid}.jpeg")
         print(f"{'='*60}")
-        
-        # Use wget to download with custom filename
-        try:
-            result = subprocess.run(
-                ['wget', '-O', str(output_file), full_url],
-                capture_output=True,
-                timeout=60
-            )
-            
-            if result.returncode == 0 and output_file.exists() and output_file.stat().st_size > 0:
-                print(f"  ✓ Success: {uuid}.jpeg downloaded successfully")
-            else:
-                print(f"  ⊘ Failed: Could not download {uuid}.jpeg")
-                if output_file.exists():
-                    output_file.unlink()
-        except Exception as e:
-            print(f"  ⊘ Failed: Error during download - {str(e)}")
-            if output_file.exists():
-                output_file.unlink()
-        return
+        return {'url': full_url, 'output_file': output_file, 'label': f"{uuid}.jpeg"}
     
     # Determine output file
     # Extract event ID (for Swiggy and other media-assets URLs)
     event_id = extract_event_id(line)
     if not event_id:
         print(f"⊘ Skipping (no event ID)")
-        return
+        return None
     extension = extract_extension(line)
     output_file = Path(INPUT_IMAGE_FOLDER) / f"{event_id}{extension}"
     
     # Skip if already exists
     if output_file.exists():
         print(f"→ Already exists: {event_id}")
-        return
+        if keep_existing:
+            return {'url': line, 'output_file': output_file, 'label': event_id, 'exists': True}
+        return None
     
     # Check for Swiggy URL (download ALL)
     swiggy_match = re.search(r'https://media-assets\.swiggy\.com/[^\s]+', line)
     if swiggy_match:
-        swiggy_url = swiggy_match.group(0)
         print(f"Downloading from Swiggy: {event_id}")
-        
-        if download_file(swiggy_url, str(output_file), validate=False):
-            print(f"  ✓ Success: {event_id}")
-        else:
-            print(f"  ✗ Failed: {event_id}")
-        return
+        return {'url': swiggy_match.group(0), 'output_file': output_file, 'label': event_id}
+    return None
 
-# Define video processing function at module level
-def process_video_line(line):
+def plan_video_line(line, keep_existing=False):
+    """
+    Work out where a line from the video links file should be saved.
+    Returns a job dict (url, output_file, label) or None when there is nothing to download.
+    keep_existing works as in plan_image_line.
+    """
     line = line.strip()
     if not line:
-        return
+        return None
     # Support display delimiter
     parts = line.split('|||', 1)
     url = parts[0]
@@ -152,39 +254,95 @@ def process_video_line(line):
     event_id = extract_event_id(url)
     if not event_id:
         print(f"⊘ Skipping video (no event ID): {url}")
-        return
+        return None
     # Extract extension from URL
     extension = extract_video_extension(url)
     output_file = Path(INPUT_VIDEO_FOLDER) / f"{event_id}{extension}"
     # Skip if already exists
     if output_file.exists():
         print(f"→ Already exists: {event_id}")
-        return
+        if keep_existing:
+            return {'url': url, 'output_file': output_file, 'label': event_id, 'exists': True}
+        return None
     print(f"Downloading Video: {event_id}")
-    if download_file(url, str(output_file), validate=False):
-        print(f"  ✓ Success: {event_id}")
-    else:
-        print(f"  ⊘ Failed: {event_id}")
+    return {'url': url, 'output_file': output_file, 'label': event_id}
+
+def dedupe_jobs(jobs):
+    """Drop unplannable (None) jobs and repeats of the same output file, keeping the first."""
+    unique = {}
+    for job in jobs:
+        if job:
+            unique.setdefault(str(job['output_file']), job)
+    return list(unique.values())
+
+def download_jobs(jobs, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+    """
+    Download planned jobs concurrently, at most `concurrency` at a time.
+
+    Each worker thread keeps one connection per host alive, so consecutive files
+    from media-assets.swiggy.com or stepzero.blob.core.windows.net reuse the same
+    TLS session instead of paying a handshake per file.
+    Returns the list of jobs that downloaded successfully.
+    """
+    # The same file can be listed twice in one batch; only fetch it once
+    unique_jobs = dedupe_jobs(jobs)
+    if not unique_jobs:
+        return []
+
+    succeeded = []
+    workers = max(1, min(concurrency, len(unique_jobs)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_file, job['url'], str(job['output_file']), retries): job
+            for job in unique_jobs
+        }
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            if future.result():
+                print(f"  ✓ Success: {job['label']}")
+                succeeded.append(job)
+            else:
+                print(f"  ✗ Failed: {job['label']}")
+    return succeeded
+
+def process_image_line(line):
+    """Process a single line from the file"""
+    download_jobs([plan_image_line(line)])
+
+def process_video_line(line):
+    """Process a single line from the video links file"""
+    download_jobs([plan_video_line(line)])
+
+def download_image_lines(lines, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+    """Plan and concurrently download every line from an image links list."""
+    return download_jobs([plan_image_line(line) for line in lines], concurrency, retries)
+
+def download_video_lines(lines, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+    """Plan and concurrently download every line from a video links list."""
+    return download_jobs([plan_video_line(line) for line in lines], concurrency, retries)
 
 def main():
     parser = argparse.ArgumentParser(description="Download images and videos using predefined logic.")
     parser.add_argument('--image-url', dest='image_urls', action='append', help='Image URL to download (can be provided multiple times)')
     parser.add_argument('--video-url', dest='video_urls', action='append', help='Video URL to download (can be provided multiple times)')
+    parser.add_argument('--concurrency', '-c', type=int, default=DEFAULT_CONCURRENCY, help=f'Maximum simultaneous downloads (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help=f'Retries per URL for transient failures (default: {DEFAULT_RETRIES})')
+    parser.add_argument('--metrics', metavar='PATH', help='Record per-download timings as JSON lines (or Prometheus text if PATH ends in .prom)')
     args = parser.parse_args()
+    if args.metrics:
+        metrics.enable(args.metrics, 'download')
 
     processed_via_cli = False
 
     if args.image_urls:
         print("Starting image downloads...")
-        for url in args.image_urls:
-            process_image_line(url)
+        download_image_lines(args.image_urls, args.concurrency, args.retries)
         print("Image downloads complete.")
         processed_via_cli = True
 
     if args.video_urls:
         print("Starting video downloads...")
-        for url in args.video_urls:
-            process_video_line(url)
+        download_video_lines(args.video_urls, args.concurrency, args.retries)
         print("Video downloads complete.")
         processed_via_cli = True
 
@@ -197,8 +355,7 @@ def main():
         image_lines = [line for line in f if line.strip()]
     if image_lines:
         print("Starting image downloads...")
-        for line in image_lines:
-            process_image_line(line)
+        download_image_lines(image_lines, args.concurrency, args.retries)
         print("Image downloads complete.")
     else:
         print("No image links found; skipping to video downloads.")
@@ -208,8 +365,7 @@ def main():
         video_lines = [line for line in f if line.strip()]
     if video_lines:
         print("Starting video downloads...")
-        for line in video_lines:
-            process_video_line(line)
+        download_video_lines(video_lines, args.concurrency, args.retries)
         print("Video downloads complete.")
     else:
         print("No video links found.")
@@ -218,4 +374,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,201 @@
+"""
+Video encoder backends for video.py.
+
+Each backend describes one way of encoding (VideoToolbox, NVENC, Quick Sync,
+VAAPI or software x264/x265): the ffmpeg encoder per output codec, what the
+filter graph has to hand it (pixel format, hardware upload), the largest frame
+it accepts and its quality/bitrate options.
+
+A backend counts as available only when ffmpeg lists its encoder *and* a short
+test encode succeeds. Builds routinely list h264_nvenc or h264_vaapi on machines
+with no GPU, driver or /dev/dri device, and those fail at the first frame.
+BACKENDS is in order of preference (fastest first). Software is always last and
+is always used when nothing else works.
+
+    probe_backends('h264')                      # e.g. ['vaapi', 'software']
+    probe_backends('h264', ffmpeg_bin='./fake')  # any ffmpeg stand-in, for testing
+
+Extra backends can be added with register_backend().
+"""
+import os
+import platform
+import subprocess
+import functools
+
+SOFTWARE = 'software'
+TEST_ENCODE_TIMEOUT = 30
+TEST_ENCODE_FRAMES = 5
+
+def _capped(target_bitrate_kbps):
+    """Peak bitrate options for a quality-targeted encode with a size budget."""
+    if not target_bitrate_kbps:
+        return []
+    return ['-maxrate', f'{int(target_bitrate_kbps)}k', '-bufsize', f'{int(target_bitrate_kbps * 2)}k']
+
+def _nvenc_args(codec, target_bitrate_kbps):
+    return ['-preset', 'p5', '-tune', 'hq', '-rc', 'vbr', '-cq', '19' if codec == 'h264' else '21', '-b:v', '0',
+            *_capped(target_bitrate_kbps)]
+
+def _qsv_args(codec, target_bitrate_kbps):
+    if target_bitrate_kbps:
+        # ICQ (global_quality) ignores maxrate, so a budget switches to capped VBR
+        return ['-preset', 'medium', '-b:v', f'{int(target_bitrate_kbps * 0.8)}k', *_capped(target_bitrate_kbps)]
+    return ['-preset', 'medium', '-global_quality', '20']
+
+def _vaapi_args(codec, target_bitrate_kbps):
+    if target_bitrate_kbps:
+        return ['-rc_mode', 'VBR', '-b:v', f'{int(target_bitrate_kbps * 0.8)}k', *_capped(target_bitrate_kbps)]
+    return ['-rc_mode', 'CQP', '-qp', '20']
+
+# name: backend identifier used in system_info and logs
+# encoders: ffmpeg encoder per output codec
+# platforms: platform.system() values it can exist on (None for any)
+# input_args: global options placed before the inputs (e.g. the VAAPI device)
+# pix_fmt / upload: end of the filter graph (format=<pix_fmt>[,<upload>])
+# max_size: largest (width, height) the hardware encodes
+# args(codec, target_bitrate_kbps): quality and rate-control options; None means
+#   video.get_optimal_codec_settings keeps its own settings for this backend
+BACKENDS = [
+    {
+        'name': 'videotoolbox',
+        'encoders': {'h264': 'h264_videotoolbox', 'h265': 'hevc_videotoolbox', 'prores': 'prores_videotoolbox'},
+        'platforms': ('Darwin',),
+        'input_args': [],
+        'pix_fmt': 'yuv420p',
+        'upload': None,
+        'max_size': (4096, 2304),
+        'args': None,
+    },
+    {
+        'name': 'nvenc',
+        'encoders': {'h264': 'h264_nvenc', 'h265': 'hevc_nvenc'},
+        'platforms': ('Linux', 'Windows'),
+        'input_args': [],
+        'pix_fmt': 'yuv420p',
+        'upload': None,
+        'max_size': (4096, 4096),
+        'args': _nvenc_args,
+    },
+    {
+        'name': 'qsv',
+        'encoders': {'h264': 'h264_qsv', 'h265': 'hevc_qsv'},
+        'platforms': ('Linux', 'Windows'),
+        'input_args': [],
+        'pix_fmt': 'nv12',
+        'upload': None,
+        'max_size': (4096, 4096),
+        'args': _qsv_args,
+    },
+    {
+        'name': 'vaapi',
+        'encoders': {'h264': 'h264_vaapi', 'h265': 'hevc_vaapi'},
+        'platforms': ('Linux',),
+        'input_args': ['-vaapi_device', os.environ.get('VAAPI_DEVICE', '/dev/dri/renderD128')],
+        'pix_fmt': 'nv12',
+        'upload': 'hwupload',
+        'max_size': (4096, 4096),
+        'args': _vaapi_args,
+    },
+    {
+        'name': SOFTWARE,
+        'encoders': {'h264': 'libx264', 'h265': 'libx265'},
+        'platforms': None,
+        'input_args': [],
+        'pix_fmt': 'yuv420p',
+        'upload': None,
+        'max_size': None,
+        'args': None,
+    },
+]
+
+def get_backend(name):
+    for backend in BACKENDS:
+        if backend['name'] == name:
+            return backend
+    raise KeyError(f"Unknown encoder backend: {name}")
+
+def register_backend(backend, before=SOFTWARE):
+    """Add a backend (same keys as BACKENDS), preferred over the backend named before."""
+    index = next(i for i, existing in enumerate(BACKENDS) if existing['name'] == before)
+    BACKENDS.insert(index, backend)
+    probe_backends.cache_clear()
+
+def list_ffmpeg_encoders(ffmpeg_bin='ffmpeg'):
+    """Names of the encoders ffmpeg was built with (empty if ffmpeg can't be run)."""
+    try:
+        result = subprocess.run([ffmpeg_bin, '-hide_banner', '-encoders'], capture_output=True, text=True,
+                                timeout=TEST_ENCODE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return set()
+    names = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        # Encoder lines look like " V....D h264_nvenc  NVIDIA NVENC H.264 encoder"
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS':
+            names.add(parts[1])
+    return names
+
+def get_output_filter(backend):
+    """The filter chain that ends the graph for this backend (pixel format and any hardware upload)."""
+    return backend['pix_fmt'] + (f",{backend['upload']}" if backend['upload'] else '')
+
+def test_encode(backend, codec, ffmpeg_bin='ffmpeg'):
+    """Encode a few frames of a generated source with backend; True if ffmpeg succeeds."""
+    cmd = [
+        ffmpeg_bin, '-hide_banner', '-v', 'error',
+        *backend['input_args'],
+        '-f', 'lavfi', '-i', 'color=c=black:s=256x256:r=25',
+        '-vf', f"format={get_output_filter(backend)}",
+        '-frames:v', str(TEST_ENCODE_FRAMES),
+        '-c:v', backend['encoders'][codec],
+        '-f', 'null', '-'
+    ]
+    try:
+        return subprocess.run(cmd, capture_output=True, timeout=TEST_ENCODE_TIMEOUT).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+@functools.lru_cache(maxsize=None)
+def probe_backends(codec='h264', ffmpeg_bin='ffmpeg', platform_name=None):
+    """
+    Names of the backends that can encode codec here, fastest first. Software is
+    always included last as the fallback, even if the probe could not run ffmpeg.
+    Results are cached per (codec, ffmpeg_bin, platform_name) for the process.
+    """
+    platform_name = platform_name or platform.system()
+    listed = list_ffmpeg_encoders(ffmpeg_bin)
+    working = []
+    for backend in BACKENDS:
+        encoder = backend['encoders'].get(codec)
+        if backend['name'] == SOFTWARE or encoder is None or encoder not in listed:
+            continue
+        if backend['platforms'] and platform_name not in backend['platforms']:
+            continue
+        if test_encode(backend, codec, ffmpeg_bin):
+            working.append(backend['name'])
+    return working + [SOFTWARE]
+
+def fits(backend, width, height):
+    """Whether backend can encode width x height frames."""
+    if not backend['max_size'] or width is None or height is None:
+        return True
+    max_width, max_height = backend['max_size']
+    return width <= max_width and height <= max_height
+
+def select_backend(system_info, codec, width=None, height=None):
+    """
+    The preferred working backend for codec (from system_info['encoder_backends'],
+    filled in by video.check_hardware_encoders) that accepts the output size.
+    """
+    for name in system_info.get('encoder_backends', {}).get(codec, []):
+        try:
+            backend = get_backend(name)
+        except KeyError:
+            continue
+        if fits(backend, width, height):
+            return backend
+    return get_backend(SOFTWARE)
+
+def encoder_args(backend, codec, target_bitrate_kbps=None):
+    """Encoder and rate-control options for a hardware backend with its own settings (args)."""
+    return ['-c:v', backend['encoders'][codec], *backend['args'](codec, target_bitrate_kbps)]
@@ -0,0 +1,96 @@
+"""
+ffmpeg helpers shared by image.py and video.py: running a one-off ffmpeg command
+and the RGBA spotlight filter graph (crop, rounded-corner mask, border, black
+canvas) that video.py falls back to and image.py's ffmpeg engine batches images
+through.
+
+Kept apart from video.py so image.py (and each of its worker processes) doesn't
+import the whole video pipeline for a filter string.
+"""
+import subprocess
+from typing import List, Tuple
+
+def run_ffmpeg(cmd: list, log_success: bool = True):
+    """
+    Run an FFmpeg command and handle stderr output cleanly.
+    Returns (success: bool, stderr_output: str, stdout_output: str).
+    
+    This function is ideal for simple FFmpeg operations like version checks,
+    encoder listings, and test video creation. For complex operations that 
+    require progress tracking, use video.run_ffmpeg_with_progress().
+    """
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    stderr = result.stderr.strip()
+    stdout = result.stdout.strip()
+    
+    if result.returncode != 0:
+        print(f"❌ FFmpeg error (code {result.returncode}):")
+        print(stderr)
+        return False, stderr, stdout
+    
+    if log_success:
+        print("✅ FFmpeg completed successfully.")
+        # Optionally log stderr for review (FFmpeg logs progress to stderr even on success)
+        # with open("ffmpeg.log", "a") as f:
+        #     f.write(f"Command: {' '.join(cmd)}\n")
+        #     f.write(f"FFmpeg logs: {stderr}\n\n")
+    
+    return True, stderr, stdout
+
+# The canvas around the bordered video is static black. With video.py --roi, encoders
+# that read ROI side data (libx264/libx265 and some hardware encoders) are told to spend
+# next to no bits on it: addroi qoffset runs from 0 (unchanged) to 1 (lowest quality).
+# Off by default: x264 already codes the flat canvas as skip blocks, and on the
+# benchmark's noisy clip the offsets made CRF outputs ~1% larger, not smaller.
+STATIC_ROI_QOFFSET = 0.8
+
+def build_roi_filters(regions) -> str:
+    """addroi filters (comma-separated) marking regions as low priority, or ''."""
+    return ','.join(
+        f"addroi=x={x}:y={y}:w={w}:h={h}:qoffset={STATIC_ROI_QOFFSET}" for x, y, w, h in regions
+    )
+
+def build_composite_filter(crop_width: int, crop_height: int, crop_x: int, crop_y: int, border_size: int,
+                           canvas_width: int, canvas_height: int, paste_x: int, paste_y: int,
+                           pix_fmt: str = 'yuv420p', canvas_rate: str = None, source_format: str = None,
+                           overlay_format: str = None, scale_size: Tuple[int, int] = None,
+                           source_rate: str = None, static_regions: List[Tuple[int, int, int, int]] = None) -> str:
+    """
+    Build the spotlight filter graph: crop input 0, round its corners with the mask
+    (input 1), draw the border image (input 2) on a black canvas and the rounded
+    video inside the border. The composited stream is labelled [final].
+
+    The mask and border are single-frame inputs (no -loop): the filters hold their
+    last frame, and the final overlay ends with input 0 (shortest=1), so ffmpeg
+    stops by itself exactly when the source does. canvas_rate sets the output frame
+    rate and should match the source (defaults to ffmpeg's 25 fps).
+
+    Delivery profiles shrink the work before compositing: source_rate drops input 0
+    to a lower frame rate first, and scale_size scales the crop to (width, height),
+    so the mask, border and overlays all run at the output size.
+
+    static_regions (see video.get_static_regions) are marked as low priority for the encoder.
+
+    video.py uses its build_yuv_composite_filter instead whenever the video lands on
+    the chroma grid; this graph is its fallback, and is also used by image.py's
+    ffmpeg engine, which needs a few extras:
+        source_format: pixel format to convert input 0 to before cropping
+        overlay_format: format option for the overlay filters (e.g. 'rgb' to avoid chroma subsampling)
+    """
+    source = f"format={source_format}," if source_format else ""
+    source += f"fps={source_rate}," if source_rate else ""
+    scale = f",scale={scale_size[0]}:{scale_size[1]}" if scale_size else ""
+    roi = f"{build_roi_filters(static_regions)}," if static_regions else ""
+    rate = f":r={canvas_rate}" if canvas_rate else ""
+    overlay_opts = f":format={overlay_format}" if overlay_format else ""
+    return (
+        f"[0:v]{source}crop={crop_width}:{crop_height}:{crop_x}:{crop_y}{scale}[cropped];"
+        f"[1:v]format=rgba[mask];"
+        f"[cropped][mask]alphamerge[rounded];"
+        f"[2:v]format=rgba[border];"
+        f"color=c=black:s={canvas_width}x{canvas_height}{rate}[bg];"
+        f"[bg][border]overlay={paste_x}:{paste_y}{overlay_opts}[framed];"
+        # Center the rounded video inside the border
+        f"[framed][rounded]overlay={paste_x + border_size}:{paste_y + border_size}:shortest=1{overlay_opts},"
+        f"{roi}format={pix_fmt}[final]"
+    )
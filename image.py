@@ -1,7 +1,61 @@
 import os
+import io
+import math
 import argparse
 import json
-from PIL import Image, ImageDraw
+import time
+import shutil
+import tempfile
+import contextlib
+import collections
+import concurrent.futures
+from PIL import Image, ImageChops, ImageStat
+import metrics
+from overlays import get_rounded_mask, get_border_overlay, get_rounded_mask_path, get_border_overlay_path
+from build_manifest import load_manifest, save_manifest, is_up_to_date, record_output
+from ffmpeg_common import build_composite_filter, run_ffmpeg
+
+try:
+    import composite_numpy
+except ImportError:
+    composite_numpy = None
+
+ALLOWED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.avif')
+
+# Bump when the processing logic changes so existing outputs are rebuilt
+SCRIPT_VERSION = '1.1'
+
+# Everything besides the input that determines an output image (recorded in the build manifest)
+BUILD_PARAMS = {
+    'aspect_ratio': '3:4',
+    'radius_ratio': 16 / 360,
+    'border_ratio': 2 / 360,
+    'border_color': [255, 255, 255, 38],
+    'canvas_scale': 1.2,
+    'format': 'JPEG',
+    'quality': 95,
+    'subsampling': 0,
+}
+
+BORDER_COLOR = (255, 255, 255, 38)  # White with 15% opacity
+BACKGROUND_COLOR = (0, 0, 0)        # Black
+
+# Formats the ffmpeg engine reads through the image2 demuxer (others fall back to Pillow)
+FFMPEG_ENGINE_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'BMP': '.bmp', 'TIFF': '.tiff'}
+FFMPEG_BATCH_SIZE = 64
+ENGINES = ('pillow', 'numpy', 'ffmpeg')
+
+def get_build_params(engine='pillow', max_dimension=None):
+    """
+    Build parameters for an engine. The NumPy engine is pixel-identical to Pillow, so
+    both keep the original params and their outputs stay up to date across engines.
+    """
+    params = BUILD_PARAMS
+    if engine not in ('pillow', 'numpy'):
+        params = dict(params, engine=engine)
+    if max_dimension:
+        params = dict(params, max_dimension=max_dimension)
+    return params
 
 def create_output_directory(path):
     """Creates a directory if it doesn't exist."""
@@ -9,98 +63,460 @@ def create_output_directory(path):
         os.makedirs(path)
         print(f"Created directory: {path}")
 
-def process_images_in_folder(input_folder, output_folder, specific_files=None):
+def output_filename_for(filename):
+    """Name of the processed JPEG for an input filename."""
+    return ''.join([str(filename.split('.')[0]), ".jpeg"])
+
+def get_image_geometry(width, height):
+    """
+    Layout of the spotlight output for a width x height source: the 3:4 crop box,
+    the corner radius and border size, and the canvas the bordered crop sits on.
+    """
+    target_ratio = 3 / 4
+    image_ratio = width / height
+    if image_ratio > target_ratio:
+        new_width = int(height * target_ratio)
+        crop_margin = (width - new_width) // 2
+        crop_box = (crop_margin, 0, width - crop_margin, height)
+    elif image_ratio < target_ratio:
+        new_height = int(width / target_ratio)
+        crop_box = (0, 0, width, new_height)
+    else:
+        crop_box = (0, 0, width, height)
+
+    crop_width = crop_box[2] - crop_box[0]
+    crop_height = crop_box[3] - crop_box[1]
+    radius = int(crop_width * (16 / 360))
+    border_size = max(1, round(crop_width * (2 / 360)))
+
+    canvas_height = round(crop_height * 1.2 / 4) * 4
+    canvas_width = (canvas_height // 4) * 3
+    content_width = crop_width + border_size * 2
+    if canvas_width < content_width:
+        canvas_width = content_width
+        canvas_height = round((canvas_width * 4 / 3) / 4) * 4
+
+    return {
+        'crop_box': crop_box,
+        'crop_width': crop_width,
+        'crop_height': crop_height,
+        'radius': radius,
+        'border_size': border_size,
+        'canvas_width': canvas_width,
+        'canvas_height': canvas_height,
+        'paste_x': (canvas_width - content_width) // 2,
+        'paste_y': 0,
+    }
+
+def get_output_scale(width, height, max_dimension):
+    """Factor (< 1) the output for a width x height source must shrink by to fit max_dimension, or None."""
+    if not max_dimension:
+        return None
+    geometry = get_image_geometry(width, height)
+    scale = max_dimension / max(geometry['canvas_width'], geometry['canvas_height'])
+    return scale if scale < 1 else None
+
+def load_scaled_crop(image, scale):
+    """
+    Returns the 3:4 crop of a not-yet-loaded image, shrunk by scale.
+
+    JPEGs are decoded with draft(), which lets libjpeg scale the DCT by 1/2, 1/4 or
+    1/8 while decoding; the smallest scale that still covers the target size is
+    used. Other formats are decoded in full. Either way the crop happens first and
+    the final resize uses reduce() for the bulk of the shrink (reducing_gap).
+
+    Returns (image, draft_scale) where draft_scale is the decode scale used (1 if none).
+    """
+    width, height = image.size
+    geometry = get_image_geometry(width, height)
+    target = (
+        max(1, int(geometry['crop_width'] * scale)),
+        max(1, int(geometry['crop_height'] * scale))
+    )
+
+    draft_scale = 1
+    if image.format == 'JPEG':
+        image.draft(image.mode, (math.ceil(width * scale), math.ceil(height * scale)))
+        draft_scale = image.size[0] / width
+        geometry = get_image_geometry(*image.size)
+
+    cropped = image.crop(geometry['crop_box'])
+    return cropped.resize(target, Image.LANCZOS, reducing_gap=3.0), draft_scale
+
+def _composite_pillow(original_image, geometry):
+    """Crops original_image to geometry and composites it onto the canvas with Pillow."""
+    original_width, original_height = original_image.size
+    # Crop before converting so only the kept pixels are converted.
+    # If the ratio is already correct, no cropping is done.
+    if geometry['crop_box'] != (0, 0, original_width, original_height):
+        original_image = original_image.crop(geometry['crop_box'])
+    original_image = original_image.convert("RGBA")
+    original_width, original_height = original_image.size
+    radius = geometry['radius']
+    border_size = geometry['border_size']
+    # Border and mask only depend on the geometry, so they come from the shared cache
+    bordered_img = get_border_overlay(original_width, original_height, border_size, radius, BORDER_COLOR).copy()
+
+    # a mask to round the corners of the original image
+    mask = get_rounded_mask(original_width, original_height, radius)
+    bordered_img.paste(original_image, (border_size, border_size), mask)
+
+    final_image = Image.new("RGB", (geometry['canvas_width'], geometry['canvas_height']), BACKGROUND_COLOR)
+    final_image.paste(bordered_img, (geometry['paste_x'], geometry['paste_y']), bordered_img)
+    return final_image
+
+def process_single_image(filename, input_folder, output_folder, engine='pillow', max_dimension=None):
+    """
+    Processes one image: crops it to a 3:4 aspect ratio, adds a rounded border,
+    and places it on a slightly larger 3:4 black canvas.
+
+    engine 'numpy' composites into a single canvas buffer (see composite_numpy);
+    anything else uses Pillow.
+
+    max_dimension caps the longest side of the output. Larger sources are decoded
+    at reduced resolution where the format allows it (see load_scaled_crop).
+
+    Log lines are collected instead of printed so that results coming back from
+    worker processes can be printed in a stable order.
+
+    Returns:
+        (status, messages) where status is 'processed', 'skipped' or 'failed'
+    """
+    messages = []
+    try:
+        # Construct full file path
+        image_path = os.path.join(input_folder, filename)
+        if not os.path.exists(image_path):
+            messages.append(f"Skipping '{filename}' (not found in input folder)")
+            return 'skipped', messages
+
+        # Open the original image
+        with Image.open(image_path) as source_image:
+            original_image = source_image
+            original_width, original_height = original_image.size
+            geometry = get_image_geometry(original_width, original_height)
+
+            if geometry['crop_width'] < original_width:
+                messages.append(f"Cropping width of '{filename}' to 3:4 aspect ratio.")
+            elif geometry['crop_height'] < original_height:
+                messages.append(f"Cropping height of '{filename}' to 3:4 aspect ratio.")
+
+            scale = get_output_scale(original_width, original_height, max_dimension)
+            with metrics.stage('decode', file=filename):
+                if scale:
+                    original_image, draft_scale = load_scaled_crop(original_image, scale)
+                else:
+                    original_image.load()
+            if scale:
+                decoded = f" (decoded at 1/{round(1 / draft_scale)} scale)" if draft_scale < 1 else ""
+                messages.append(f"Scaling '{filename}' down to fit {max_dimension}px{decoded}.")
+                original_width, original_height = original_image.size
+                geometry = get_image_geometry(original_width, original_height)
+
+            output_path = os.path.join(output_folder, output_filename_for(filename))
+            with metrics.stage('composite', file=filename, engine=engine):
+                if engine == 'numpy':
+                    final_image = composite_numpy.composite(original_image, geometry, BORDER_COLOR)
+                else:
+                    final_image = _composite_pillow(original_image, geometry)
+            with metrics.stage('save', file=filename) as event:
+                final_image.save(output_path, 'JPEG', quality=95, subsampling=0, optimize=True)
+                event['bytes'] = os.path.getsize(output_path)
+            messages.append(f"Successfully processed and saved '{filename}' to '{output_folder}'")
+            return 'processed', messages
+
+    except Exception as e:
+        messages.append(f"Could not process {filename}. Reason: {e}")
+        return 'failed', messages
+
+def _iter_results_in_pool(filenames, input_folder, output_folder, jobs, engine='pillow', max_dimension=None,
+                          mp_context=None):
+    """
+    Runs process_single_image across a process pool and yields results in input order.
+
+    At most jobs * 2 images are in flight at once, so a large folder never turns
+    into thousands of queued futures (and decoded images) waiting on the pool.
+    """
+    max_in_flight = jobs * 2
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context) as executor:
+        pending = collections.deque()
+        for filename in filenames:
+            pending.append(executor.submit(
+                metrics.run_collected, process_single_image, filename, input_folder, output_folder, engine, max_dimension
+            ))
+            if len(pending) >= max_in_flight:
+                yield _collected_result(pending.popleft())
+        while pending:
+            yield _collected_result(pending.popleft())
+
+def _collected_result(future):
+    """A worker's result, after passing the metrics it recorded on to this process."""
+    result, events = future.result()
+    metrics.merge(events)
+    return result
+
+def _has_alpha(img):
+    """True if img has an alpha channel or a transparent palette/colour key."""
+    return img.mode in ('RGBA', 'RGBa', 'LA', 'La', 'PA') or 'transparency' in img.info
+
+def _plan_ffmpeg_batches(filenames, input_folder, max_dimension=None):
+    """
+    Group images that can share one ffmpeg invocation: same size, container format
+    and pixel mode, single frame. Returns (batches, leftovers) where each batch is
+    ((width, height), extension, [filenames]) and leftovers go through Pillow
+    (including images that need scaling down to max_dimension, and images with
+    transparency: the filter graph's alphamerge replaces the source alpha with the
+    rounded mask, which would expose the colour hidden under transparent pixels).
+    """
+    groups = collections.OrderedDict()
+    leftovers = []
+    for filename in filenames:
+        try:
+            with Image.open(os.path.join(input_folder, filename)) as img:
+                extension = FFMPEG_ENGINE_FORMATS.get(img.format)
+                if (extension is None or getattr(img, 'n_frames', 1) > 1 or _has_alpha(img)
+                        or get_output_scale(img.width, img.height, max_dimension)):
+                    leftovers.append(filename)
+                    continue
+                groups.setdefault((img.size, extension, img.mode), []).append(filename)
+        except Exception:
+            # Unreadable files get Pillow's error message
+            leftovers.append(filename)
+
+    batches = []
+    for (size, extension, _), group in groups.items():
+        for start in range(0, len(group), FFMPEG_BATCH_SIZE):
+            batches.append((size, extension, group[start:start + FFMPEG_BATCH_SIZE]))
+    return batches, leftovers
+
+def process_image_batch(filenames, input_folder, output_folder, size, extension):
+    """
+    Composites a batch of same-geometry images in a single ffmpeg process, using the
+    filter graph video.py falls back to for videos (ffmpeg_common): the batch is read
+    as one image sequence (image2 demuxer), every frame goes through the
+    crop/mask/border/canvas graph and is written back out as a numbered JPEG (image2
+    muxer), then renamed into place.
+
+    Returns a list of (filename, (status, messages)). If ffmpeg fails, the batch is
+    redone with Pillow.
+    """
+    geometry = get_image_geometry(*size)
+    crop_width, crop_height = geometry['crop_width'], geometry['crop_height']
+    mask_path = get_rounded_mask_path(crop_width, crop_height, geometry['radius'])
+    border_path = get_border_overlay_path(crop_width, crop_height, geometry['border_size'], geometry['radius'], BORDER_COLOR)
+    # The canvas runs at the image sequence's one frame per second, so every image
+    # becomes exactly one output frame; RGB overlays avoid chroma subsampling
+    filter_str = build_composite_filter(
+        crop_width, crop_height, geometry['crop_box'][0], geometry['crop_box'][1], geometry['border_size'],
+        geometry['canvas_width'], geometry['canvas_height'], geometry['paste_x'], geometry['paste_y'],
+        pix_fmt='yuvj444p', canvas_rate='1', source_format='rgba', overlay_format='rgb'
+    )
+
+    input_dir = tempfile.mkdtemp(prefix='spotlight_batch_')
+    output_dir = tempfile.mkdtemp(prefix='.batch_', dir=output_folder)
+    try:
+        for index, filename in enumerate(filenames, 1):
+            source = os.path.abspath(os.path.join(input_folder, filename))
+            link = os.path.join(input_dir, f"{index:06d}{extension}")
+            try:
+                os.symlink(source, link)
+            except OSError:
+                shutil.copyfile(source, link)
+
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-f', 'image2', '-framerate', '1', '-i', os.path.join(input_dir, f"%06d{extension}"),
+            '-i', mask_path,
+            '-i', border_path,
+            '-filter_complex', filter_str,
+            '-map', '[final]',
+            '-frames:v', str(len(filenames)),
+            '-c:v', 'mjpeg', '-q:v', '2',
+            '-f', 'image2', '-y', os.path.join(output_dir, '%06d.jpeg')
+        ]
+        with metrics.stage('ffmpeg_batch', images=len(filenames), width=size[0], height=size[1]) as event:
+            success, _, _ = run_ffmpeg(cmd, log_success=False)
+            event['ok'] = success
+
+        results = []
+        for index, filename in enumerate(filenames, 1):
+            produced = os.path.join(output_dir, f"{index:06d}.jpeg")
+            if success and os.path.exists(produced):
+                os.replace(produced, os.path.join(output_folder, output_filename_for(filename)))
+                results.append((filename, ('processed', [f"Successfully processed and saved '{filename}' to '{output_folder}'"])))
+            else:
+                status, messages = process_single_image(filename, input_folder, output_folder)
+                results.append((filename, (status, [f"ffmpeg could not process '{filename}', used Pillow instead"] + messages)))
+        return results
+    finally:
+        shutil.rmtree(input_dir, ignore_errors=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def _iter_ffmpeg_results(filenames, input_folder, output_folder, jobs, max_dimension=None):
+    """Runs the ffmpeg engine, jobs batches at a time, and yields (filename, result) pairs batch by batch."""
+    batches, leftovers = _plan_ffmpeg_batches(filenames, input_folder, max_dimension)
+    print(f"Compositing {len(filenames) - len(leftovers)} images in {len(batches)} ffmpeg batch(es)...")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(process_image_batch, batch, input_folder, output_folder, size, extension)
+            for size, extension, batch in batches
+        ]
+        for future in futures:
+            yield from future.result()
+    for filename in leftovers:
+        yield filename, process_single_image(filename, input_folder, output_folder, 'pillow', max_dimension)
+
+def process_images_in_folder(input_folder, output_folder, specific_files=None, jobs=1, force=False, engine='pillow',
+                             max_dimension=None, mp_context=None):
     """
     Processes all images in a folder: crops them to a 3:4 aspect ratio,
     adds a rounded border, and places them on a slightly larger 3:4 black canvas.
+
+    Args:
+        input_folder: Input folder path
+        output_folder: Output folder path
+        specific_files: Optional list of filenames to process instead of the whole folder
+        jobs: Number of worker processes (1 processes in-line, 0 or None uses all CPUs)
+        force: Reprocess every image even if the build manifest says its output is up to date
+        engine: 'pillow' composites each image with Pillow; 'numpy' composites into one
+            canvas buffer with identical output (see composite_numpy); 'ffmpeg' pushes
+            batches of same-size images through one ffmpeg process each (see process_image_batch)
+        max_dimension: Optional cap on the longest side of each output, in pixels
+        mp_context: multiprocessing context for the worker pool (default start method if None)
     """
     print(f"Starting image processing from '{input_folder}'...")
     
     # Ensure the output directory exists
     create_output_directory(output_folder)
-    allowed_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.avif')
 
     if specific_files:
         candidates = specific_files
     else:
         candidates = os.listdir(input_folder)
 
-    for filename in candidates:
-        if filename.lower().endswith(allowed_extensions):
-            try:
-                # Construct full file path
-                image_path = os.path.join(input_folder, filename)
-                if not os.path.exists(image_path):
-                    print(f"Skipping '{filename}' (not found in input folder)")
-                    continue
-                
-                # Open the original image
-                with Image.open(image_path) as original_image:
-                    original_image = original_image.convert("RGBA")
-                    original_width, original_height = original_image.size
-                    target_ratio = 3 / 4
-                    image_ratio = original_width / original_height
-
-                    if image_ratio > target_ratio:
-                        print(f"Cropping width of '{filename}' to 3:4 aspect ratio.")
-                        new_width = int(original_height * target_ratio)
-                        crop_margin = (original_width - new_width) // 2
-                        crop_box = (crop_margin, 0, original_width - crop_margin, original_height)
-                        original_image = original_image.crop(crop_box)
-
-                    elif image_ratio < target_ratio:
-                        print(f"Cropping height of '{filename}' to 3:4 aspect ratio.")
-                        new_height = int(original_width / target_ratio)
-                        crop_box = (0, 0, original_width, new_height)
-                        original_image = original_image.crop(crop_box)
-
-                    # If the ratio is already correct, no cropping is done.
-                    # IMPORTANT: Update the dimensions after any potential cropping for subsequent steps
-                    original_width, original_height = original_image.size
-                    border_color = (255, 255, 255, 38)  # White with 15% opacity
-                    background_color = (0, 0, 0)        # Black
-                    radius = int(original_width * (16 / 360))
-                    border_size = max(1, round(original_width * (2 / 360)))
-                    bordered_img_size = (original_width + border_size * 2, original_height + border_size * 2)
-                    bordered_img = Image.new('RGBA', bordered_img_size, (0, 0, 0, 0))
-                    draw = ImageDraw.Draw(bordered_img)
-
-
-                    draw.rounded_rectangle(
-                        (0, 0, bordered_img_size[0], bordered_img_size[1]),
-                        radius=radius,
-                        fill=border_color
-                    )
-
-                    # a mask to round the corners of the original image
-                    mask = Image.new('L', (original_width, original_height), 0)
-                    mask_draw = ImageDraw.Draw(mask)
-                    mask_draw.rounded_rectangle((0, 0, original_width, original_height), radius=radius, fill=255)
-                    bordered_img.paste(original_image, (border_size, border_size), mask)
-                    
-                    target_height = original_height * 1.2
-                    new_height = round(target_height / 4) * 4
-                    new_width = (new_height // 4) * 3
-                    
-                    content_width = bordered_img.width
-                    if new_width < content_width:
-                        new_width = content_width
-                        new_height = round((new_width * 4 / 3) / 4) * 4
-
-                    final_image = Image.new("RGB", (new_width, new_height), background_color)
-                    paste_x = (new_width - bordered_img.width) // 2
-                    paste_y = 0 
-                    
-                    final_image.paste(bordered_img, (paste_x, paste_y), bordered_img)
-                    
-                    output_path = os.path.join(output_folder, ''.join([str(filename.split('.')[0]),".jpeg"]))
-                    final_image.save(output_path, 'JPEG', quality=95, subsampling=0, optimize=True)
-                    print(f"Successfully processed and saved '{filename}' to '{output_folder}'")
-
-            except Exception as e:
-                print(f"Could not process {filename}. Reason: {e}")
-                
+    filenames = [filename for filename in candidates if filename.lower().endswith(ALLOWED_EXTENSIONS)]
+
+    if engine == 'ffmpeg' and shutil.which('ffmpeg') is None:
+        print("⚠️  ffmpeg not found; using the Pillow engine")
+        engine = 'pillow'
+    if engine == 'numpy' and composite_numpy is None:
+        print("⚠️  NumPy not installed; using the Pillow engine")
+        engine = 'pillow'
+    build_params = get_build_params(engine, max_dimension)
+
+    # Skip inputs whose output was already built from the same content and settings
+    manifest = load_manifest(output_folder)
+    up_to_date = 0
+    if not force:
+        stale = [
+            filename for filename in filenames
+            if not is_up_to_date(
+                manifest,
+                os.path.join(output_folder, output_filename_for(filename)),
+                os.path.join(input_folder, filename),
+                build_params,
+                SCRIPT_VERSION
+            )
+        ]
+        up_to_date = len(filenames) - len(stale)
+        filenames = stale
+        if up_to_date:
+            print(f"Skipping {up_to_date} up-to-date image(s) (use --force to rebuild)")
+
+    jobs = jobs or os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(filenames) or 1))
+    if engine == 'ffmpeg':
+        results = _iter_ffmpeg_results(filenames, input_folder, output_folder, jobs, max_dimension)
+    elif jobs > 1:
+        print(f"Processing {len(filenames)} images with {jobs} workers...")
+        results = zip(filenames, _iter_results_in_pool(filenames, input_folder, output_folder, jobs, engine, max_dimension,
+                                                      mp_context))
+    else:
+        results = (
+            (filename, process_single_image(filename, input_folder, output_folder, engine, max_dimension))
+            for filename in filenames
+        )
+
+    counts = {'processed': 0, 'skipped': up_to_date, 'failed': 0}
+    start_time = time.time()
+    try:
+        for filename, (status, messages) in results:
+            for message in messages:
+                print(message)
+            counts[status] += 1
+            if status == 'processed':
+                record_output(
+                    manifest,
+                    os.path.join(output_folder, output_filename_for(filename)),
+                    os.path.join(input_folder, filename),
+                    build_params,
+                    SCRIPT_VERSION
+                )
+    finally:
+        save_manifest(output_folder, manifest)
+    elapsed = time.time() - start_time
+
     print("\nImage processing complete.")
+    print(f"Processed: {counts['processed']}, skipped: {counts['skipped']}, failed: {counts['failed']}")
+    if counts['processed'] > 0 and elapsed > 0:
+        print(f"Total time: {elapsed:.2f}s ({counts['processed'] / elapsed:.1f} images/sec)")
+    return counts['failed'] == 0
+
+def benchmark_engines(input_folder, jobs=1, engines=ENGINES, max_dimension=None):
+    """
+    Runs every engine over input_folder into scratch folders and prints wall time,
+    CPU time (including ffmpeg child processes), throughput and output size, plus how
+    far each engine's output is from the Pillow output (mean absolute pixel difference).
+    """
+    if composite_numpy is None:
+        engines = [engine for engine in engines if engine != 'numpy']
+    filenames = sorted(f for f in os.listdir(input_folder) if f.lower().endswith(ALLOWED_EXTENSIONS))
+    print(f"Benchmarking {', '.join(engines)} on {len(filenames)} images from '{input_folder}' (jobs={jobs})...")
+    output_folders = {}
+    rows = []
+    try:
+        for engine in engines:
+            output_folder = tempfile.mkdtemp(prefix=f'spotlight_bench_{engine}_')
+            output_folders[engine] = output_folder
+            times_before = os.times()
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                process_images_in_folder(input_folder, output_folder, filenames, jobs, force=True, engine=engine,
+                                         max_dimension=max_dimension)
+            elapsed = time.perf_counter() - start_time
+            times_after = os.times()
+            cpu = sum(after - before for after, before in zip(times_after[:4], times_before[:4]))
+            output_bytes = sum(
+                os.path.getsize(os.path.join(output_folder, name))
+                for name in os.listdir(output_folder) if not name.startswith('.')
+            )
+            rows.append((engine, elapsed, cpu, output_bytes))
+
+        print(f"\n{'Engine':<8} {'Wall (s)':>9} {'CPU (s)':>9} {'Images/s':>9} {'Output MB':>10} {'Diff vs Pillow':>15}")
+        for engine, elapsed, cpu, output_bytes in rows:
+            diff = _mean_difference(output_folders.get('pillow'), output_folders[engine], filenames)
+            rate = len(filenames) / elapsed if elapsed > 0 else 0
+            diff_text = '-' if diff is None else f"{diff:.2f}"
+            print(f"{engine:<8} {elapsed:>9.2f} {cpu:>9.2f} {rate:>9.1f} {output_bytes / (1024 * 1024):>10.2f} {diff_text:>15}")
+    finally:
+        for output_folder in output_folders.values():
+            shutil.rmtree(output_folder, ignore_errors=True)
+
+def _mean_difference(reference_folder, output_folder, filenames):
+    """Mean absolute per-channel difference (0-255) between two engines' outputs."""
+    if not reference_folder or reference_folder == output_folder:
+        return None
+    diffs = []
+    for filename in filenames:
+        name = output_filename_for(filename)
+        try:
+            with Image.open(os.path.join(reference_folder, name)) as a, Image.open(os.path.join(output_folder, name)) as b:
+                if a.size != b.size:
+                    return float('inf')
+                diffs.append(sum(ImageStat.Stat(ImageChops.difference(a.convert('RGB'), b.convert('RGB'))).mean) / 3)
+        except OSError:
+            continue
+    return sum(diffs) / len(diffs) if diffs else None
 
 if __name__ == "__main__":
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -111,7 +527,15 @@ if __name__ == "__main__":
     parser.add_argument('--input-folder', default=DEFAULT_INPUT_FOLDER, help='Folder containing input images')
     parser.add_argument('--output-folder', default=DEFAULT_OUTPUT_FOLDER, help='Folder where processed images are saved')
     parser.add_argument('--files-json', help='JSON array of specific filenames to process')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Number of parallel worker processes (0 uses all CPUs)')
+    parser.add_argument('--force', action='store_true', help='Reprocess images even if their outputs are up to date')
+    parser.add_argument('--engine', choices=ENGINES, default='pillow', help='Compositing engine (default: pillow)')
+    parser.add_argument('--max-dimension', type=int, help='Cap the longest side of outputs (large inputs are decoded at reduced size)')
+    parser.add_argument('--benchmark', action='store_true', help='Compare the engines on the input folder instead of processing')
+    parser.add_argument('--metrics', metavar='PATH', help='Record per-stage timings as JSON lines (or Prometheus text if PATH ends in .prom)')
     args = parser.parse_args()
+    if args.metrics:
+        metrics.enable(args.metrics, 'image')
 
     input_folder = args.input_folder
     output_folder = args.output_folder
@@ -141,4 +565,8 @@ if __name__ == "__main__":
             print("Could not decode --files-json argument. Ensure it is valid JSON.")
             exit(1)
 
-    process_images_in_folder(input_folder, output_folder, specific_files)
\ No newline at end of file
+    if args.benchmark:
+        benchmark_engines(input_folder, args.jobs or os.cpu_count() or 1, max_dimension=args.max_dimension)
+    else:
+        process_images_in_folder(input_folder, output_folder, specific_files, args.jobs, args.force, args.engine,
+                                 args.max_dimension)
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+Durable SQLite job queue for bulk video processing.
+
+Every video in a bulk run is recorded as a job (queued -> running -> done/failed)
+in .video_jobs.sqlite3 inside the output folder. If the process dies mid-batch
+(e.g. a container restart during a deploy), jobs left 'running' by the dead
+process are put back in the queue on the next run, so finished work is never
+redone and interrupted work is picked up again. The processing service starts that
+run itself when it finds pending jobs at start-up (see pending_jobs).
+
+A running job records its worker as PID plus that process's start time. After a
+container restart PIDs are handed out again, so the recorded PID may belong to an
+unrelated live process; its start time won't match and the job is still treated
+as interrupted.
+"""
+import os
+import time
+import sqlite3
+
+QUEUE_FILE = '.video_jobs.sqlite3'
+MAX_ATTEMPTS = 3
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+def open_queue(output_folder):
+    """Open (creating if needed) the job queue stored in output_folder."""
+    conn = sqlite3.connect(os.path.join(output_folder, QUEUE_FILE), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            input_path TEXT NOT NULL UNIQUE,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker_pid INTEGER,
+            worker_started TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    # Queues created before worker_started was recorded
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+    if 'worker_started' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN worker_started TEXT')
+    return conn
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _process_started(pid):
+    """Start time of process pid (clock ticks since boot, from /proc), or None if unavailable."""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name in parentheses may contain spaces; starttime is field 22
+    return stat.rsplit(')', 1)[1].split()[19]
+
+def _worker_gone(row):
+    """Whether the process that claimed a running job is gone (dead, or its PID reused)."""
+    pid = row['worker_pid']
+    if pid == os.getpid() or not _pid_alive(pid):
+        return True
+    started = _process_started(pid)
+    return row['worker_started'] is not None and started is not None and started != row['worker_started']
+
+def recover_interrupted(conn):
+    """Requeue jobs left 'running' by a process that no longer exists. Returns how many."""
+    rows = conn.execute('SELECT id, worker_pid, worker_started FROM jobs WHERE state = ?', (RUNNING,)).fetchall()
+    stale = [row['id'] for row in rows if _worker_gone(row)]
+    for job_id in stale:
+        # A job that keeps taking its process down with it is given up on
+        conn.execute('''
+            UPDATE jobs SET
+                state = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                error = CASE WHEN attempts >= ? THEN 'interrupted too many times' ELSE error END,
+                worker_pid = NULL,
+                worker_started = NULL,
+                updated_at = ?
+            WHERE id = ? AND state = ?
+        ''', (MAX_ATTEMPTS, FAILED, QUEUED, MAX_ATTEMPTS, time.time(), job_id, RUNNING))
+    return len(stale)
+
+def enqueue(conn, video_files):
+    """
+    Queue (filename, path) pairs. Jobs that already finished or failed are queued
+    again with a fresh attempt count; queued and running jobs are left alone.
+    """
+    now = time.time()
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for filename, path in video_files:
+            conn.execute('''
+                INSERT INTO jobs (filename, input_path, state, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(input_path) DO UPDATE SET
+                    state = excluded.state, attempts = 0, error = NULL, updated_at = excluded.updated_at
+                WHERE jobs.state IN (?, ?)
+            ''', (filename, os.path.abspath(path), QUEUED, now, now, DONE, FAILED))
+
+def claim_next(conn):
+    """Atomically move the oldest queued job to 'running' and return it (or None)."""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT * FROM jobs WHERE state = ? ORDER BY id LIMIT 1', (QUEUED,)).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            'UPDATE jobs SET state = ?, attempts = attempts + 1, worker_pid = ?, worker_started = ?, '
+            'updated_at = ? WHERE id = ?',
+            (RUNNING, os.getpid(), _process_started(os.getpid()), time.time(), row['id'])
+        )
+    return row
+
+def mark_done(conn, job_id):
+    conn.execute(
+        'UPDATE jobs SET state = ?, worker_pid = NULL, worker_started = NULL, error = NULL, updated_at = ? '
+        'WHERE id = ?',
+        (DONE, time.time(), job_id)
+    )
+
+def mark_failed(conn, job_id, error=None):
+    conn.execute(
+        'UPDATE jobs SET state = ?, worker_pid = NULL, worker_started = NULL, error = ?, updated_at = ? '
+        'WHERE id = ?',
+        (FAILED, error, time.time(), job_id)
+    )
+
+def pending_jobs(output_folder):
+    """
+    How many jobs a bulk run on output_folder's queue would pick up: queued jobs plus
+    running ones whose worker is gone. 0 when there is no queue.
+    """
+    if not os.path.exists(os.path.join(output_folder, QUEUE_FILE)):
+        return 0
+    conn = open_queue(output_folder)
+    try:
+        rows = conn.execute('SELECT state, worker_pid, worker_started FROM jobs WHERE state IN (?, ?)',
+                            (QUEUED, RUNNING)).fetchall()
+    finally:
+        conn.close()
+    return sum(1 for row in rows if row['state'] == QUEUED or _worker_gone(row))
+
+def queue_summary(conn):
+    """Return {state: count} for all jobs in the queue."""
+    rows = conn.execute('SELECT state, COUNT(*) AS count FROM jobs GROUP BY state').fetchall()
+    return {row['state']: row['count'] for row in rows}
@@ -0,0 +1,161 @@
+"""
+Structured per-stage timings (--metrics on image.py, video.py and download.py).
+
+Off by default; every stage() and record() call is a no-op until enable() is
+called. Once enabled, each timed stage becomes one event:
+
+    {"ts": 1700000000.12, "script": "video", "stage": "encode", "seconds": 4.21,
+     "ok": true, "pid": 4242, "file": "clip.mp4", "media_seconds": 12.0}
+
+A metrics path ending in .prom gets a Prometheus text file (for node_exporter's
+textfile collector) with per-stage totals, rewritten atomically as the run goes;
+any other path gets the events appended as JSON lines.
+
+Stages recorded:
+    download                        download.py (bytes, attempts)
+    decode, composite, save         image.py, per image
+    ffmpeg_batch                    image.py --engine ffmpeg, per batch (images)
+    probe, mask, encode             video.py, per video (media_seconds on encode)
+    tune_sample                     video.py --time-budget, the sample encode per clip
+    size_check                      video.py, the size limit check including any re-encode
+    reencode_pass1, reencode_pass2  video.py, inside size_check
+
+Worker processes don't write anything themselves: run_collected() gathers their
+events and the parent passes them to merge().
+"""
+import os
+import json
+import time
+import atexit
+import tempfile
+import threading
+import contextlib
+
+PROMETHEUS_SUFFIX = '.prom'
+PROMETHEUS_PREFIX = 'spotlight'
+# Minimum seconds between rewrites of the Prometheus file while a run is going
+PROMETHEUS_INTERVAL = 5
+
+_lock = threading.Lock()
+_path = None
+_script = None
+_totals = {}          # (script, stage) -> {'count', 'seconds', 'failures', 'bytes'}
+_last_write = 0.0
+_collector = None     # events gathered inside a worker process (see run_collected)
+
+def enable(path, script):
+    """Record metrics for this process to path, tagging every event with script."""
+    global _path, _script
+    _path = os.path.abspath(path)
+    _script = script
+    directory = os.path.dirname(_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    atexit.register(flush)
+
+def enabled():
+    return _path is not None or _collector is not None
+
+def record(stage_name, seconds, ok=True, **labels):
+    """Record one finished stage. Extra labels (file, bytes, ...) are kept in the event."""
+    if not enabled():
+        return
+    event = {'ts': round(time.time(), 3), 'script': _script, 'stage': stage_name,
+             'seconds': round(seconds, 6), 'ok': ok, 'pid': os.getpid()}
+    event.update(labels)
+    if _collector is not None:
+        _collector.append(event)
+    else:
+        _emit(event)
+
+@contextlib.contextmanager
+def stage(stage_name, **labels):
+    """
+    Time the enclosed block as stage_name. Yields the event's labels, so the block
+    can add values it only learns while running (event['bytes'] = ...) or mark
+    the stage failed without raising (event['ok'] = False). Exceptions are
+    recorded as failures and re-raised.
+    """
+    event = dict(labels)
+    event.setdefault('ok', True)
+    start = time.perf_counter()
+    try:
+        yield event
+    except BaseException:
+        event['ok'] = False
+        raise
+    finally:
+        ok = event.pop('ok')
+        record(stage_name, time.perf_counter() - start, ok, **event)
+
+def run_collected(func, *args):
+    """
+    Call func(*args) in a worker process and return (result, events), where events
+    are the metrics recorded meanwhile; the parent hands them to merge().
+    """
+    global _collector
+    _collector = []
+    try:
+        return func(*args), _collector
+    finally:
+        _collector = None
+
+def merge(events):
+    """Record events gathered by run_collected() in a worker process."""
+    if _path is None:
+        return
+    for event in events:
+        _emit(dict(event, script=_script))
+
+def _emit(event):
+    global _last_write
+    with _lock:
+        totals = _totals.setdefault((event['script'], event['stage']),
+                                    {'count': 0, 'seconds': 0.0, 'failures': 0, 'bytes': 0})
+        totals['count'] += 1
+        totals['seconds'] += event['seconds']
+        totals['failures'] += not event['ok']
+        totals['bytes'] += event.get('bytes') or 0
+
+        if not _path.endswith(PROMETHEUS_SUFFIX):
+            with open(_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event) + '\n')
+        elif time.time() - _last_write >= PROMETHEUS_INTERVAL:
+            _write_prometheus()
+
+def flush():
+    """Write the Prometheus file with the final totals (JSON lines are written as they happen)."""
+    if _path is None or not _path.endswith(PROMETHEUS_SUFFIX):
+        return
+    with _lock:
+        _write_prometheus()
+
+def _write_prometheus():
+    global _last_write
+    families = (
+        ('stage_seconds_total', 'seconds', 'counter', 'Total seconds spent in each stage'),
+        ('stage_runs_total', 'count', 'counter', 'Number of times each stage ran'),
+        ('stage_failures_total', 'failures', 'counter', 'Number of stage runs that failed'),
+        ('stage_bytes_total', 'bytes', 'counter', 'Bytes handled by each stage (downloads, saved outputs)'),
+    )
+    lines = []
+    for name, key, kind, help_text in families:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+        for (script, stage_name), totals in sorted(_totals.items()):
+            value = round(totals[key], 6)
+            lines.append(f'{PROMETHEUS_PREFIX}_{name}{{script="{script}",stage="{stage_name}"}} {value}')
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_metrics_updated_seconds Unix time the metrics were written")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_metrics_updated_seconds gauge")
+    lines.append(f"{PROMETHEUS_PREFIX}_metrics_updated_seconds {time.time():.3f}")
+
+    fd, temp_path = tempfile.mkstemp(prefix='.metrics_', dir=os.path.dirname(_path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, _path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    _last_write = time.time()
@@ -0,0 +1,175 @@
+"""
+Rounded-corner masks and border overlays shared by image.py and video.py, and the
+corner tiles of video.py's YUV composite (the border with the mask punched out,
+cut down to the four corners).
+
+The shapes only depend on the crop geometry (width, height, radius and
+border size), and most sources come in a handful of standard resolutions, so each
+shape is drawn once and reused instead of being redrawn for every file.
+
+Shapes are kept in an in-memory LRU cache. When SPOTLIGHT_OVERLAY_DIR is set they
+are also stored there as PNGs, which lets separate runs and worker processes share
+them; ffmpeg always reads them from disk (see get_rounded_mask_path,
+get_border_overlay_path and get_corner_tiles_path).
+"""
+import os
+import functools
+import tempfile
+from PIL import Image, ImageDraw
+
+OVERLAY_CACHE_SIZE = 32
+OVERLAY_DIR = os.environ.get('SPOTLIGHT_OVERLAY_DIR')
+DEFAULT_OVERLAY_DIR = os.path.join(tempfile.gettempdir(), 'spotlight_overlays')
+
+def _mask_filename(width, height, radius):
+    return f"mask_{width}x{height}_r{radius}.png"
+
+def _border_filename(width, height, border_size, radius, color):
+    color_hex = ''.join(f"{channel:02x}" for channel in color)
+    return f"border_{width}x{height}_b{border_size}_r{radius}_{color_hex}.png"
+
+def _corner_filename(width, height, border_size, radius, color, parity):
+    color_hex = ''.join(f"{channel:02x}" for channel in color)
+    return f"corners_{width}x{height}_b{border_size}_r{radius}_{color_hex}_p{parity[0]}{parity[1]}.png"
+
+def _save_atomically(image, path):
+    """Write a PNG via a temp file + rename so concurrent workers never read a partial file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.png', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, 'PNG')
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _load_or_draw(filename, draw):
+    """Load a shape from the on-disk store if enabled, otherwise draw it (and store it)."""
+    if OVERLAY_DIR:
+        path = os.path.join(OVERLAY_DIR, filename)
+        if os.path.exists(path):
+            try:
+                image = Image.open(path)
+                image.load()
+                return image
+            except Exception:
+                pass
+    image = draw()
+    if OVERLAY_DIR:
+        try:
+            _save_atomically(image, os.path.join(OVERLAY_DIR, filename))
+        except OSError:
+            pass
+    return image
+
+@functools.lru_cache(maxsize=OVERLAY_CACHE_SIZE)
+def get_rounded_mask(width, height, radius):
+    """
+    Returns an 'L' mask with a white rounded rectangle on black.
+
+    The image is shared between callers and must not be modified.
+    """
+    def draw():
+        mask = Image.new('L', (width, height), 0)
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, width, height), radius=radius, fill=255)
+        return mask
+
+    return _load_or_draw(_mask_filename(width, height, radius), draw)
+
+@functools.lru_cache(maxsize=OVERLAY_CACHE_SIZE)
+def get_border_overlay(width, height, border_size, radius, color):
+    """
+    Returns an RGBA border for content of width x height: a rounded rectangle of
+    (width + 2 * border_size) x (height + 2 * border_size) filled with color on a
+    transparent background. radius is the radius of that outer rectangle.
+
+    The image is shared between callers; copy it before pasting onto it.
+    """
+    def draw():
+        size = (width + border_size * 2, height + border_size * 2)
+        border = Image.new('RGBA', size, (0, 0, 0, 0))
+        ImageDraw.Draw(border).rounded_rectangle((0, 0, size[0], size[1]), radius=radius, fill=color)
+        return border
+
+    return _load_or_draw(_border_filename(width, height, border_size, radius, color), draw)
+
+def get_corner_tile_size(radius):
+    """Side of the square corner tiles: wider than the outer radius, and even."""
+    return radius // 2 * 2 + 2
+
+def get_corner_tile_offsets(frame_width, frame_height, radius, parity=(0, 0)):
+    """
+    (x, y) of the top-left, top-right, bottom-left and bottom-right corner tiles
+    relative to the bordered frame. parity is the frame's (x, y) position on the
+    canvas modulo 2: tiles of an odd-positioned frame are moved one pixel outwards,
+    so they start on even canvas positions (which overlay needs in YUV 4:2:0).
+    """
+    tile = get_corner_tile_size(radius)
+    parity_x, parity_y = parity
+    left, right = -parity_x, frame_width - tile + parity_x
+    top, bottom = -parity_y, frame_height - tile + parity_y
+    return [(left, top), (right, top), (left, bottom), (right, bottom)]
+
+@functools.lru_cache(maxsize=OVERLAY_CACHE_SIZE)
+def get_corner_tiles(width, height, border_size, radius, color, parity=(0, 0)):
+    """
+    Returns the four corners of the bordered, rounded frame around content of
+    width x height, packed into one RGBA image of 2 x 2 square tiles (in the order
+    of get_corner_tile_offsets). Tiles are cut from the full-size border on black
+    with the rounded content mask punched out of it, so they are black outside the
+    border (the canvas), the border colour on the ring and transparent where the
+    content shows through. radius is the outer radius, as for get_border_overlay.
+
+    The image is shared between callers and must not be modified.
+    """
+    def draw():
+        border = get_border_overlay(width, height, border_size, radius, color)
+        # One pixel of canvas around the frame, for tiles moved outwards by parity
+        frame = Image.new('RGBA', (border.width + 2, border.height + 2), (0, 0, 0, 255))
+        frame.alpha_composite(border, (1, 1))
+        alpha = frame.getchannel('A')
+        alpha.paste(0, (border_size + 1, border_size + 1), get_rounded_mask(width, height, radius - border_size))
+        frame.putalpha(alpha)
+
+        tile = get_corner_tile_size(radius)
+        tiles = Image.new('RGBA', (tile * 2, tile * 2), (0, 0, 0, 0))
+        offsets = get_corner_tile_offsets(border.width, border.height, radius, parity)
+        for k, (x, y) in enumerate(offsets):
+            tiles.paste(frame.crop((x + 1, y + 1, x + 1 + tile, y + 1 + tile)), (k % 2 * tile, k // 2 * tile))
+        return tiles
+
+    return _load_or_draw(_corner_filename(width, height, border_size, radius, color, parity), draw)
+
+def _overlay_path(filename, image_factory, cache_dir):
+    directory = cache_dir or OVERLAY_DIR or DEFAULT_OVERLAY_DIR
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        _save_atomically(image_factory(), path)
+    return path
+
+def get_rounded_mask_path(width, height, radius, cache_dir=None):
+    """Returns the path of a PNG holding get_rounded_mask(width, height, radius), writing it once."""
+    return _overlay_path(
+        _mask_filename(width, height, radius),
+        lambda: get_rounded_mask(width, height, radius),
+        cache_dir
+    )
+
+def get_border_overlay_path(width, height, border_size, radius, color, cache_dir=None):
+    """Returns the path of a PNG holding get_border_overlay(...), writing it once."""
+    return _overlay_path(
+        _border_filename(width, height, border_size, radius, color),
+        lambda: get_border_overlay(width, height, border_size, radius, color),
+        cache_dir
+    )
+
+def get_corner_tiles_path(width, height, border_size, radius, color, parity=(0, 0), cache_dir=None):
+    """Returns the path of a PNG holding get_corner_tiles(...), writing it once."""
+    return _overlay_path(
+        _corner_filename(width, height, border_size, radius, color, parity),
+        lambda: get_corner_tiles(width, height, border_size, radius, color, parity),
+        cache_dir
+    )
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Streaming download -> process pipeline.
+
+Running download.py and then image.py / video.py handles the stages back to back:
+nothing is processed until the last file has arrived. Here every finished download
+is handed straight to a processor through a bounded in-process queue, so network
+I/O overlaps with compositing and encoding, and a batch takes roughly
+max(download, process) instead of their sum.
+
+Files that were downloaded earlier are not fetched again, but still go through
+processing; the build manifest skips the ones whose outputs are already up to date.
+
+When the processors fall behind, the queue fills up and download threads wait
+before fetching more (backpressure), so a fast network never piles up
+unprocessed files.
+
+    python pipeline.py                          # everything in links_images.txt / links_videos.txt
+    python pipeline.py --image-url URL ...      # specific URLs
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import concurrent.futures
+
+import download
+import image
+import video
+from build_manifest import load_manifest, save_manifest, is_up_to_date, record_output
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_IMAGE_FOLDER = os.path.join(BASE_DIR, "output_images")
+OUTPUT_VIDEO_FOLDER = os.path.join(BASE_DIR, "output_videos")
+
+DEFAULT_QUEUE_SIZE = 16
+# ffmpeg already uses every core, and process_single_video rewrites the video manifest,
+# so videos are encoded one at a time
+VIDEO_WORKERS = 1
+OUTPUT_CODEC = 'h264'
+OUTPUT_FORMAT = 'mp4'
+MAX_OUTPUT_SIZE_MB = 10
+
+# Exit codes
+EXIT_OK = 0
+EXIT_DOWNLOAD_FAILED = 1
+EXIT_PROCESSING_FAILED = 2
+
+_STOP = object()
+
+class _Stage:
+    """A bounded work queue for one media type and the threads that drain it."""
+
+    def __init__(self, name, process, workers, queue_size):
+        self.name = name
+        self.process = process
+        self.work = queue.Queue(maxsize=queue_size)
+        self.counts = {'processed': 0, 'skipped': 0, 'failed': 0}
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            job = self.work.get()
+            if job is _STOP:
+                return
+            try:
+                status = self.process(job)
+            except Exception as e:
+                print(f"❌ Could not process {job['label']}: {e}")
+                status = 'failed'
+            with self.lock:
+                self.counts[status] += 1
+
+    def finish(self):
+        """Wait for queued work to drain, then stop the workers."""
+        for _ in self.threads:
+            self.work.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+def _image_processor(output_folder, engine):
+    """Returns a process(job) callable for downloaded images, recording results in the build manifest."""
+    if engine == 'numpy' and image.composite_numpy is None:
+        print("⚠️  NumPy not installed; using the Pillow engine")
+        engine = 'pillow'
+    image.create_output_directory(output_folder)
+    manifest = load_manifest(output_folder)
+    params = image.get_build_params(engine)
+    lock = threading.Lock()
+
+    def process(job):
+        input_path = str(job['output_file'])
+        input_folder, filename = os.path.split(input_path)
+        output_path = os.path.join(output_folder, image.output_filename_for(filename))
+        with lock:
+            if is_up_to_date(manifest, output_path, input_path, params, image.SCRIPT_VERSION):
+                print(f"→ Up to date: '{os.path.basename(output_path)}'")
+                return 'skipped'
+
+        status, messages = image.process_single_image(filename, input_folder, output_folder, engine)
+        with lock:
+            for message in messages:
+                print(message)
+            if status == 'processed':
+                record_output(manifest, output_path, input_path, params, image.SCRIPT_VERSION)
+                save_manifest(output_folder, manifest)
+        return status
+
+    return process
+
+def _video_processor(output_folder, system_info):
+    """Returns a process(job) callable for downloaded videos."""
+    video.create_output_directory(output_folder)
+
+    def process(job):
+        input_path = str(job['output_file'])
+        filename = os.path.basename(input_path)
+        ok, _ = video.process_single_video(
+            filename, input_path, output_folder, OUTPUT_CODEC, OUTPUT_FORMAT, system_info, MAX_OUTPUT_SIZE_MB
+        )
+        return 'processed' if ok else 'failed'
+
+    return process
+
+def _download_and_hand_off(job, stage, retries):
+    """Download one job and queue it for processing (blocks while the stage's queue is full)."""
+    if job.get('exists'):
+        stage.work.put(job)
+        return True
+    if not download.download_file(job['url'], str(job['output_file']), retries):
+        print(f"  ✗ Failed: {job['label']}")
+        return False
+    print(f"  ✓ Success: {job['label']}")
+    stage.work.put(job)
+    return True
+
+def run_pipeline(image_lines=(), video_lines=(), concurrency=download.DEFAULT_CONCURRENCY,
+                 retries=download.DEFAULT_RETRIES, image_workers=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 engine='pillow'):
+    """
+    Download every image and video line and process each file as soon as it arrives.
+
+    Args:
+        image_lines / video_lines: Lines in the links-file format (or bare URLs)
+        concurrency: Maximum simultaneous downloads
+        retries: Retries per URL for transient failures
+        image_workers: Threads compositing images (defaults to the CPU count)
+        queue_size: Downloaded files allowed to wait for processing, per media type
+        engine: Image compositing engine, 'pillow' or 'numpy' (see image.process_single_image)
+
+    Returns one of the EXIT_* codes.
+    """
+    start_time = time.time()
+    jobs = []
+    stages = []
+
+    image_jobs = download.dedupe_jobs(download.plan_image_line(line, keep_existing=True) for line in image_lines)
+    if image_jobs:
+        workers = image_workers or os.cpu_count() or 1
+        stage = _Stage('images', _image_processor(OUTPUT_IMAGE_FOLDER, engine), workers, queue_size)
+        stages.append(stage)
+        jobs.extend((job, stage) for job in image_jobs)
+
+    video_jobs = download.dedupe_jobs(download.plan_video_line(line, keep_existing=True) for line in video_lines)
+    if video_jobs:
+        if not video.check_ffmpeg_installed():
+            return EXIT_PROCESSING_FAILED
+        system_info = video.check_hardware_encoders(video.detect_system())
+        stage = _Stage('videos', _video_processor(OUTPUT_VIDEO_FOLDER, system_info), VIDEO_WORKERS, queue_size)
+        stages.append(stage)
+        jobs.extend((job, stage) for job in video_jobs)
+
+    if not jobs:
+        print("Nothing to download or process.")
+        return EXIT_OK
+
+    existing = sum(1 for job, _ in jobs if job.get('exists'))
+    print(f"Streaming {len(image_jobs)} image(s) and {len(video_jobs)} video(s) through download → process"
+          f" ({existing} already downloaded)...")
+    for stage in stages:
+        stage.start()
+
+    downloaded = 0
+    try:
+        workers = max(1, min(concurrency, len(jobs)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_download_and_hand_off, job, stage, retries) for job, stage in jobs]
+            for future in concurrent.futures.as_completed(futures):
+                downloaded += bool(future.result())
+    finally:
+        for stage in stages:
+            stage.finish()
+
+    elapsed = time.time() - start_time
+    print(f"\nPipeline complete in {video.format_time(elapsed)}: {downloaded}/{len(jobs)} downloaded or already present")
+    processing_failed = False
+    for stage in stages:
+        counts = stage.counts
+        print(f"  {stage.name}: {counts['processed']} processed, {counts['skipped']} up to date, {counts['failed']} failed")
+        processing_failed = processing_failed or counts['failed'] > 0
+
+    if downloaded < len(jobs):
+        return EXIT_DOWNLOAD_FAILED
+    if processing_failed:
+        return EXIT_PROCESSING_FAILED
+    return EXIT_OK
+
+def read_links_file(path):
+    """Non-empty lines of a links file (empty if the file is missing)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def main():
+    parser = argparse.ArgumentParser(description="Download media and process each file as soon as it arrives.")
+    parser.add_argument('--image-url', dest='image_urls', action='append', help='Image URL to download and process (can be provided multiple times)')
+    parser.add_argument('--video-url', dest='video_urls', action='append', help='Video URL to download and process (can be provided multiple times)')
+    parser.add_argument('--concurrency', '-c', type=int, default=download.DEFAULT_CONCURRENCY, help=f'Maximum simultaneous downloads (default: {download.DEFAULT_CONCURRENCY})')
+    parser.add_argument('--retries', type=int, default=download.DEFAULT_RETRIES, help=f'Retries per URL for transient failures (default: {download.DEFAULT_RETRIES})')
+    parser.add_argument('--jobs', '-j', type=int, default=0, help='Image processing threads (default: one per CPU)')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help=f'Downloaded files allowed to wait for processing (default: {DEFAULT_QUEUE_SIZE})')
+    parser.add_argument('--engine', choices=('pillow', 'numpy'), default='pillow', help='Image compositing engine (default: pillow)')
+    args = parser.parse_args()
+
+    image_lines, video_lines = args.image_urls or [], args.video_urls or []
+    if not image_lines and not video_lines:
+        image_lines = read_links_file(download.IMAGE_INPUT_FILE)
+        video_lines = read_links_file(download.VIDEO_INPUT_FILE)
+
+    sys.exit(run_pipeline(image_lines, video_lines, args.concurrency, args.retries, args.jobs, args.queue_size, args.engine))
+
+if __name__ == '__main__':
+    main()
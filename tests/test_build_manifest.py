@@ -0,0 +1,85 @@
+"""build_manifest.py up-to-date checks."""
+import os
+
+import pytest
+
+import build_manifest
+
+PARAMS = {'codec': 'h264', 'max_size_mb': 10}
+
+
+@pytest.fixture
+def built(tmp_path):
+    input_path, output_path = tmp_path / 'clip.mov', tmp_path / 'out' / 'clip.mp4'
+    input_path.write_bytes(b'source frames')
+    output_path.parent.mkdir()
+    output_path.write_bytes(b'encoded')
+    entries = {}
+    build_manifest.record_output(entries, str(output_path), str(input_path), PARAMS, '1.0')
+    return entries, str(output_path), str(input_path)
+
+
+def test_unchanged_output_is_up_to_date(built):
+    entries, output_path, input_path = built
+    assert build_manifest.is_up_to_date(entries, output_path, input_path, dict(PARAMS), '1.0')
+
+
+def test_touched_input_is_rehashed_once(built, monkeypatch):
+    entries, output_path, input_path = built
+    stat = os.stat(input_path)
+    os.utime(input_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert build_manifest.is_up_to_date(entries, output_path, input_path, PARAMS, '1.0')
+    assert entries['clip.mp4']['input_mtime_ns'] == stat.st_mtime_ns + 10 ** 9
+    # The new mtime was remembered, so the next check doesn't hash
+    monkeypatch.setattr(build_manifest, 'hash_file', lambda path: pytest.fail('rehashed'))
+    assert build_manifest.is_up_to_date(entries, output_path, input_path, PARAMS, '1.0')
+
+
+def test_changed_input_content_is_stale(built):
+    entries, output_path, input_path = built
+    stat = os.stat(input_path)
+    # Same size, new mtime: only the hash tells
+    with open(input_path, 'wb') as f:
+        f.write(b'source FRAMES')
+    os.utime(input_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not build_manifest.is_up_to_date(entries, output_path, input_path, PARAMS, '1.0')
+
+
+def test_changed_input_size_is_stale(built):
+    entries, output_path, input_path = built
+    with open(input_path, 'ab') as f:
+        f.write(b' and more')
+    assert not build_manifest.is_up_to_date(entries, output_path, input_path, PARAMS, '1.0')
+
+
+@pytest.mark.parametrize('params, version', [
+    (dict(PARAMS, codec='hevc'), '1.0'),
+    (dict(PARAMS, roi=True), '1.0'),
+    (PARAMS, '1.1'),
+])
+def test_changed_options_or_version_are_stale(built, params, version):
+    entries, output_path, input_path = built
+    assert not build_manifest.is_up_to_date(entries, output_path, input_path, params, version)
+
+
+def test_missing_or_replaced_output_is_stale(built):
+    entries, output_path, input_path = built
+    with open(output_path, 'ab') as f:
+        f.write(b'!')
+    assert not build_manifest.is_up_to_date(entries, output_path, input_path, PARAMS, '1.0')
+    os.remove(output_path)
+    assert not build_manifest.is_up_to_date(entries, output_path, input_path, PARAMS, '1.0')
+
+
+def test_unrecorded_output_is_stale(built, tmp_path):
+    entries, _, input_path = built
+    other = tmp_path / 'out' / 'other.mp4'
+    other.write_bytes(b'encoded')
+    assert not build_manifest.is_up_to_date(entries, str(other), input_path, PARAMS, '1.0')
+
+
+def test_manifest_round_trips(built, tmp_path):
+    entries, output_path, input_path = built
+    build_manifest.save_manifest(str(tmp_path / 'out'), entries)
+    loaded = build_manifest.load_manifest(str(tmp_path / 'out'))
+    assert build_manifest.is_up_to_date(loaded, output_path, input_path, PARAMS, '1.0')
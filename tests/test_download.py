@@ -0,0 +1,88 @@
+"""download.py against a local HTTP stand-in server."""
+import threading
+import http.server
+
+import pytest
+
+import download
+
+BODY = b'spotlight' * 1000
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = {}
+    failures_before_success = 2
+
+    def do_GET(self):
+        hits = StandInHandler.hits[self.path] = StandInHandler.hits.get(self.path, 0) + 1
+        if self.path == '/flaky' and hits <= StandInHandler.failures_before_success:
+            self._reply(503, b'busy')
+        elif self.path in ('/flaky', '/ok'):
+            self._reply(200, BODY)
+        elif self.path == '/truncated':
+            # Promise more than is sent, then drop the connection
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY[:100])
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self._reply(404, b'not found')
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StandInHandler.hits = {}
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_downloads_file(server, tmp_path):
+    output = tmp_path / 'ok.jpeg'
+    assert download.download_file(f"{server}/ok", str(output), retries=0, backoff=0)
+    assert output.read_bytes() == BODY
+    assert not (tmp_path / 'ok.jpeg.part').exists()
+
+
+def test_retries_server_errors(server, tmp_path):
+    output = tmp_path / 'flaky.jpeg'
+    assert download.download_file(f"{server}/flaky", str(output), retries=3, backoff=0)
+    assert output.read_bytes() == BODY
+    assert StandInHandler.hits['/flaky'] == StandInHandler.failures_before_success + 1
+
+
+def test_gives_up_after_retries(server, tmp_path):
+    output = tmp_path / 'flaky.jpeg'
+    assert not download.download_file(f"{server}/flaky", str(output), retries=1, backoff=0)
+    assert StandInHandler.hits['/flaky'] == 2
+    assert not output.exists()
+
+
+def test_does_not_retry_not_found(server, tmp_path):
+    output = tmp_path / 'missing.jpeg'
+    assert not download.download_file(f"{server}/missing", str(output), retries=3, backoff=0)
+    assert StandInHandler.hits['/missing'] == 1
+    assert not output.exists()
+
+
+def test_removes_partial_file_on_failure(server, tmp_path):
+    output = tmp_path / 'truncated.mp4'
+    assert not download.download_file(f"{server}/truncated", str(output), retries=1, backoff=0)
+    assert StandInHandler.hits['/truncated'] == 2  # Dropped connections are retried
+    assert not output.exists()
+    assert not (tmp_path / 'truncated.mp4.part').exists()
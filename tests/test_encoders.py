@@ -0,0 +1,64 @@
+"""encoders.py backend probing against a fake ffmpeg."""
+import sys
+import stat
+
+import pytest
+
+import encoders
+import video
+
+FAKE_FFMPEG = '''#!{python}
+import sys
+args = sys.argv[1:]
+if '-encoders' in args:
+    print("Encoders:")
+    print(" V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC")
+    print(" V....D h264_nvenc           NVIDIA NVENC H.264 encoder")
+    print(" V....D h264_vaapi           H.264/AVC (VAAPI)")
+    print(" V....D h264_videotoolbox    VideoToolbox H.264 Encoder")
+    sys.exit(0)
+encoder = args[args.index('-c:v') + 1]
+sys.exit(0 if encoder in {working!r} else 1)
+'''
+
+
+@pytest.fixture(autouse=True)
+def fresh_probe():
+    encoders.probe_backends.cache_clear()
+    yield
+    encoders.probe_backends.cache_clear()
+
+
+def fake_ffmpeg(tmp_path, working):
+    """An ffmpeg stand-in that lists NVENC, VAAPI and VideoToolbox but only test-encodes with `working`."""
+    path = tmp_path / 'ffmpeg'
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable, working=set(working)))
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def test_listed_encoders_that_fail_fall_back_to_software(tmp_path):
+    fake = fake_ffmpeg(tmp_path, working=['libx264'])
+    assert encoders.probe_backends('h264', ffmpeg_bin=fake, platform_name='Linux') == ['software']
+
+
+def test_working_vaapi_is_picked(tmp_path):
+    fake = fake_ffmpeg(tmp_path, working=['libx264', 'h264_vaapi'])
+    backends = encoders.probe_backends('h264', ffmpeg_bin=fake, platform_name='Linux')
+    assert backends == ['vaapi', 'software']
+    system_info = {'encoder_backends': {'h264': backends}}
+    assert encoders.select_backend(system_info, 'h264', 1280, 720)['name'] == 'vaapi'
+
+
+def test_backends_for_other_platforms_are_not_probed(tmp_path):
+    fake = fake_ffmpeg(tmp_path, working=['libx264', 'h264_nvenc', 'h264_vaapi'])
+    assert encoders.probe_backends('h264', ffmpeg_bin=fake, platform_name='Darwin') == ['software']
+
+
+@pytest.mark.parametrize('apple_silicon, expected', [(True, ['videotoolbox', 'software']), (False, ['software'])])
+def test_videotoolbox_is_only_used_on_apple_silicon(tmp_path, apple_silicon, expected):
+    fake = fake_ffmpeg(tmp_path, working=['libx264', 'h264_videotoolbox'])
+    system_info = {'platform': 'Darwin', 'is_apple_silicon': apple_silicon}
+    video.check_hardware_encoders(system_info, ffmpeg_bin=fake)
+    assert system_info['encoder_backends']['h264'] == expected
+    assert system_info['has_videotoolbox'] == apple_silicon
@@ -0,0 +1,80 @@
+"""image.py ffmpeg engine batch planning, engine parity and reduced-size decoding."""
+import random
+
+import pytest
+from PIL import Image
+
+import image
+
+
+def test_transparent_images_are_not_batched_through_ffmpeg(tmp_path):
+    # Left half fully transparent, right half half-transparent, colour underneath
+    transparent = Image.new('RGBA', (800, 600), (200, 30, 30, 128))
+    transparent.paste((200, 30, 30, 0), (0, 0, 400, 600))
+    transparent.save(tmp_path / 'alpha.png')
+    keyed = Image.new('RGB', (800, 600), (10, 20, 30))
+    keyed.save(tmp_path / 'keyed.png', transparency=(10, 20, 30))
+    Image.new('RGB', (800, 600), (10, 20, 30)).save(tmp_path / 'opaque.png')
+
+    batches, leftovers = image._plan_ffmpeg_batches(['alpha.png', 'keyed.png', 'opaque.png'], str(tmp_path))
+
+    assert sorted(leftovers) == ['alpha.png', 'keyed.png']
+    assert batches == [((800, 600), '.png', ['opaque.png'])]
+
+
+def noise_image(mode, size, seed=0):
+    bands = len(mode)
+    return Image.frombytes(mode, size, random.Random(seed).randbytes(size[0] * size[1] * bands))
+
+
+@pytest.mark.skipif(image.composite_numpy is None, reason='needs numpy')
+@pytest.mark.parametrize('size', [(800, 600), (300, 400), (301, 701), (37, 53)])
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA', 'L', 'LA'])
+def test_numpy_engine_matches_pillow(size, mode):
+    source = noise_image(mode, size)
+    if mode == 'RGBA':
+        # Fully transparent and fully opaque areas next to the random alpha
+        source.paste((0, 0, 0, 0), (0, 0, size[0] // 4, size[1]))
+        source.paste((90, 160, 20, 255), (size[0] // 4, 0, size[0] // 2, size[1]))
+    geometry = image.get_image_geometry(*size)
+    expected = image._composite_pillow(source, geometry)
+    actual = image.composite_numpy.composite(source, geometry, image.BORDER_COLOR)
+    assert actual.size == expected.size
+    assert actual.convert('RGB').tobytes() == expected.tobytes()
+
+
+@pytest.mark.skipif(image.composite_numpy is None, reason='needs numpy')
+def test_numpy_engine_matches_pillow_for_keyed_transparency():
+    source = noise_image('RGB', (120, 160))
+    source.paste((10, 20, 30), (0, 0, 60, 80))
+    source.info['transparency'] = (10, 20, 30)
+    geometry = image.get_image_geometry(*source.size)
+    expected = image._composite_pillow(source, geometry)
+    actual = image.composite_numpy.composite(source, geometry, image.BORDER_COLOR)
+    assert actual.convert('RGB').tobytes() == expected.tobytes()
+
+
+def test_output_scale_only_shrinks():
+    # A 1600x1200 source has a 900x1200 crop on a 1080x1440 canvas
+    geometry = image.get_image_geometry(1600, 1200)
+    assert (geometry['canvas_width'], geometry['canvas_height']) == (1080, 1440)
+    assert image.get_output_scale(1600, 1200, 720) == pytest.approx(0.5)
+    assert image.get_output_scale(1600, 1200, 1440) is None
+    assert image.get_output_scale(1600, 1200, None) is None
+
+
+@pytest.mark.parametrize('scale, draft_scale', [(0.6, 1), (0.5, 0.5), (0.3, 0.5), (0.25, 0.25), (0.1, 0.125)])
+def test_jpegs_are_drafted_at_the_smallest_scale_that_covers_the_target(tmp_path, scale, draft_scale):
+    noise_image('RGB', (1600, 1200)).save(tmp_path / 'photo.jpg', quality=90)
+    with Image.open(tmp_path / 'photo.jpg') as source:
+        cropped, used = image.load_scaled_crop(source, scale)
+    assert used == draft_scale
+    assert cropped.size == (int(900 * scale), int(1200 * scale))
+
+
+def test_other_formats_are_decoded_in_full(tmp_path):
+    noise_image('RGB', (1600, 1200)).save(tmp_path / 'photo.png')
+    with Image.open(tmp_path / 'photo.png') as source:
+        cropped, used = image.load_scaled_crop(source, 0.25)
+    assert used == 1
+    assert cropped.size == (225, 300)
@@ -0,0 +1,85 @@
+"""job_queue.py recovery of jobs left running by a gone process."""
+import sys
+import sqlite3
+import subprocess
+
+import pytest
+
+import job_queue
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = job_queue.open_queue(str(tmp_path))
+    job_queue.enqueue(conn, [('a.mp4', str(tmp_path / 'a.mp4'))])
+    job_queue.claim_next(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def other_process():
+    proc = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def set_worker(conn, pid, started):
+    conn.execute('UPDATE jobs SET worker_pid = ?, worker_started = ?', (pid, started))
+
+
+def test_live_worker_is_left_running(conn, other_process):
+    set_worker(conn, other_process.pid, job_queue._process_started(other_process.pid))
+    assert job_queue.recover_interrupted(conn) == 0
+    assert job_queue.queue_summary(conn) == {job_queue.RUNNING: 1}
+
+
+def test_dead_worker_is_requeued(conn, other_process):
+    set_worker(conn, other_process.pid, job_queue._process_started(other_process.pid))
+    other_process.kill()
+    other_process.wait()
+    assert job_queue.recover_interrupted(conn) == 1
+    assert job_queue.queue_summary(conn) == {job_queue.QUEUED: 1}
+
+
+@pytest.mark.skipif(job_queue._process_started(1) is None, reason='needs /proc')
+def test_reused_pid_is_requeued(conn, other_process):
+    # The recorded PID is alive, but belongs to a process started at another time
+    set_worker(conn, other_process.pid, 'earlier-process')
+    assert job_queue.recover_interrupted(conn) == 1
+    assert job_queue.queue_summary(conn) == {job_queue.QUEUED: 1}
+
+
+def test_old_queue_gains_worker_started(tmp_path):
+    old = sqlite3.connect(str(tmp_path / job_queue.QUEUE_FILE))
+    old.execute('''
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, input_path TEXT NOT NULL UNIQUE,
+            state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, worker_pid INTEGER, error TEXT,
+            created_at REAL NOT NULL, updated_at REAL NOT NULL
+        )
+    ''')
+    old.close()
+    conn = job_queue.open_queue(str(tmp_path))
+    job_queue.enqueue(conn, [('a.mp4', str(tmp_path / 'a.mp4'))])
+    assert job_queue.claim_next(conn)['filename'] == 'a.mp4'
+    assert conn.execute('SELECT worker_started FROM jobs').fetchone()[0] is not None
+    conn.close()
+
+
+def test_pending_jobs_counts_queued_and_interrupted(tmp_path, other_process):
+    assert job_queue.pending_jobs(str(tmp_path)) == 0  # No queue yet
+    conn = job_queue.open_queue(str(tmp_path))
+    job_queue.enqueue(conn, [(name, str(tmp_path / name)) for name in ('a.mp4', 'b.mp4', 'c.mp4', 'd.mp4')])
+    for _ in range(3):
+        job_queue.claim_next(conn)
+    rows = conn.execute('SELECT id FROM jobs ORDER BY id').fetchall()
+    job_queue.mark_done(conn, rows[0]['id'])
+    # b.mp4 is still being worked on by a live process; c.mp4's worker is gone
+    conn.execute('UPDATE jobs SET worker_pid = ?, worker_started = ? WHERE id = ?',
+                 (other_process.pid, job_queue._process_started(other_process.pid), rows[1]['id']))
+    conn.execute('UPDATE jobs SET worker_pid = ?, worker_started = ? WHERE id = ?',
+                 (other_process.pid, 'not-its-start-time', rows[2]['id']))
+    conn.close()
+    assert job_queue.pending_jobs(str(tmp_path)) == 2  # c.mp4 (interrupted) and d.mp4 (queued)
@@ -0,0 +1,77 @@
+"""metrics.py event and Prometheus output."""
+import json
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    # Module state is per process; start every test disabled with no totals
+    for name, value in [('_path', None), ('_script', None), ('_totals', {}), ('_last_write', 0.0),
+                        ('_collector', None)]:
+        monkeypatch.setattr(metrics, name, value)
+
+
+def test_disabled_metrics_record_nothing(tmp_path):
+    with metrics.stage('encode', file='clip.mp4'):
+        pass
+    metrics.record('download', 1.0)
+    assert metrics._totals == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stages_are_written_as_json_lines(tmp_path):
+    path = tmp_path / 'metrics' / 'run.jsonl'
+    metrics.enable(str(path), 'video')
+    with metrics.stage('encode', file='clip.mp4', media_seconds=12.0) as event:
+        event['bytes'] = 2048
+    with pytest.raises(RuntimeError):
+        with metrics.stage('size_check', file='clip.mp4'):
+            raise RuntimeError('ffmpeg died')
+    with metrics.stage('probe', file='other.mp4') as event:
+        event['ok'] = False
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(e['stage'], e['ok']) for e in events] == [('encode', True), ('size_check', False), ('probe', False)]
+    assert set(events[0]) == {'ts', 'script', 'stage', 'seconds', 'ok', 'pid', 'file', 'media_seconds', 'bytes'}
+    assert events[0]['script'] == 'video' and events[0]['bytes'] == 2048 and events[0]['seconds'] >= 0
+
+
+def test_worker_events_are_merged_under_the_parent_script(tmp_path):
+    path = tmp_path / 'run.jsonl'
+
+    def work(name):
+        metrics.record('decode', 0.5, file=name)
+        return name.upper()
+
+    result, events = metrics.run_collected(work, 'a.jpg')
+    assert result == 'A.JPG' and [e['file'] for e in events] == ['a.jpg']
+    metrics.enable(str(path), 'image')
+    metrics.merge(events)
+    assert json.loads(path.read_text())['script'] == 'image'
+
+
+def test_prometheus_file_has_per_stage_totals(tmp_path):
+    path = tmp_path / 'spotlight.prom'
+    metrics.enable(str(path), 'download')
+    metrics.record('download', 1.5, bytes=1000, file='a.mp4')
+    metrics.record('download', 0.5, ok=False, file='b.mp4')
+    metrics.flush()
+
+    lines = path.read_text().splitlines()
+    samples = {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1]) for line in lines if not line.startswith('#')}
+    labels = '{script="download",stage="download"}'
+    assert samples[f'spotlight_stage_seconds_total{labels}'] == 2.0
+    assert samples[f'spotlight_stage_runs_total{labels}'] == 2
+    assert samples[f'spotlight_stage_failures_total{labels}'] == 1
+    assert samples[f'spotlight_stage_bytes_total{labels}'] == 1000
+    assert 'spotlight_metrics_updated_seconds' in samples
+    # Every family is announced with its type before its samples
+    for name in ('stage_seconds_total', 'stage_runs_total', 'stage_failures_total', 'stage_bytes_total'):
+        type_line = lines.index(f'# TYPE spotlight_{name} counter')
+        assert lines[type_line + 1].startswith(f'spotlight_{name}{{')
+    assert '# TYPE spotlight_metrics_updated_seconds gauge' in lines
+    # Nothing but the finished file is left in the directory
+    assert [p.name for p in tmp_path.iterdir()] == ['spotlight.prom']
@@ -0,0 +1,59 @@
+"""overlays.py shape caches, keyed by geometry."""
+import os
+
+import overlays
+
+GREY = (128, 128, 128, 255)
+
+
+def test_shapes_are_drawn_once_per_geometry(monkeypatch):
+    monkeypatch.setattr(overlays, 'OVERLAY_DIR', None)
+    overlays.get_rounded_mask.cache_clear()
+    overlays.get_border_overlay.cache_clear()
+    mask = overlays.get_rounded_mask(300, 400, 13)
+    assert overlays.get_rounded_mask(300, 400, 13) is mask
+    # Any change to the geometry is a different shape
+    for other in [(300, 400, 14), (302, 400, 13), (300, 402, 13)]:
+        assert overlays.get_rounded_mask(*other) is not mask
+        assert overlays.get_rounded_mask(*other).size == other[:2]
+    assert overlays.get_rounded_mask.cache_info().misses == 4
+
+    border = overlays.get_border_overlay(300, 400, 2, 15, GREY)
+    assert overlays.get_border_overlay(300, 400, 2, 15, GREY) is border
+    assert border.size == (304, 404)
+    assert overlays.get_border_overlay(300, 400, 3, 15, GREY).size == (306, 406)
+    assert overlays.get_border_overlay(300, 400, 2, 15, (255, 0, 0, 255)).getpixel((150, 1)) == (255, 0, 0, 255)
+
+
+def test_shape_files_are_keyed_by_geometry(tmp_path):
+    cache_dir = str(tmp_path)
+    paths = {
+        overlays.get_rounded_mask_path(300, 400, 13, cache_dir),
+        overlays.get_rounded_mask_path(300, 400, 14, cache_dir),
+        overlays.get_border_overlay_path(300, 400, 2, 15, GREY, cache_dir),
+        overlays.get_border_overlay_path(300, 400, 2, 15, (255, 255, 255, 255), cache_dir),
+        overlays.get_corner_tiles_path(300, 400, 3, 16, GREY, (0, 0), cache_dir),
+        overlays.get_corner_tiles_path(300, 400, 3, 16, GREY, (1, 0), cache_dir),
+    }
+    assert len(paths) == 6 and sorted(os.listdir(cache_dir)) == sorted(os.path.basename(p) for p in paths)
+    # Existing files are reused, not redrawn
+    path = overlays.get_rounded_mask_path(300, 400, 13, cache_dir)
+    stat = os.stat(path)
+    assert overlays.get_rounded_mask_path(300, 400, 13, cache_dir) == path
+    assert os.stat(path).st_mtime_ns == stat.st_mtime_ns
+
+
+def test_shapes_are_shared_through_the_overlay_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(overlays, 'OVERLAY_DIR', str(tmp_path))
+    overlays.get_rounded_mask.cache_clear()
+    mask = overlays.get_rounded_mask(64, 48, 5)
+    assert os.listdir(tmp_path) == [overlays._mask_filename(64, 48, 5)]
+    # Another process starts with an empty memory cache and loads the stored shape
+    overlays.get_rounded_mask.cache_clear()
+
+    def redraw(image):
+        raise AssertionError('redrawn')
+
+    monkeypatch.setattr(overlays.ImageDraw, 'Draw', redraw)
+    assert overlays.get_rounded_mask(64, 48, 5).tobytes() == mask.tobytes()
+    overlays.get_rounded_mask.cache_clear()
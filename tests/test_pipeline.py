@@ -0,0 +1,26 @@
+"""pipeline.py hand-off of files that are already downloaded."""
+import download
+import pipeline
+
+
+def test_existing_download_is_processed_without_fetching(tmp_path, monkeypatch):
+    monkeypatch.setattr(download, 'INPUT_IMAGE_FOLDER', str(tmp_path))
+    (tmp_path / '42.jpg').write_bytes(b'already here')
+
+    def no_download(*args, **kwargs):
+        raise AssertionError('existing file was downloaded again')
+
+    processed = []
+
+    def fake_processor(output_folder, engine):
+        def process(job):
+            processed.append(job['output_file'].name)
+            return 'processed'
+        return process
+
+    monkeypatch.setattr(download, 'download_file', no_download)
+    monkeypatch.setattr(pipeline, '_image_processor', fake_processor)
+    line = 'https://media-assets.swiggy.com/swiggy/image/upload/0123abcd-0123-4567-89ab-0123456789ab_42MEDIA.jpg'
+    assert download.plan_image_line(line) is None
+    assert pipeline.run_pipeline(image_lines=[line]) == pipeline.EXIT_OK
+    assert processed == ['42.jpg']
@@ -0,0 +1,26 @@
+"""tuning.py preset choice for clips too short to sample."""
+import tuning
+
+PIXEL_RATE = 1280 * 720 * 30
+
+
+def history_record(preset, speed):
+    return {'preset': preset, 'throughput': speed * PIXEL_RATE}
+
+
+def test_short_clip_without_history_uses_base_preset():
+    plan = tuning.plan_encode(5, 60, 2000, PIXEL_RATE)
+    assert plan['preset'] == tuning.BASE_PRESET
+
+
+def test_short_clip_estimates_unmeasured_presets_from_medium():
+    # Medium ran at 2x realtime, so slow (0.6x medium) manages 1.2x and slower (0.3x) only 0.6x
+    history = [history_record('medium', 2.0)]
+    assert tuning.plan_encode(5, 5, 2000, PIXEL_RATE, history=history)['preset'] == 'slow'
+    assert tuning.plan_encode(5, 10, 2000, PIXEL_RATE, history=history)['preset'] == 'slower'
+    assert tuning.plan_encode(5, 2, 2000, PIXEL_RATE, history=history)['preset'] == 'fast'
+
+
+def test_short_clip_prefers_a_presets_own_history():
+    history = [history_record('medium', 2.0), history_record('slower', 0.1)]
+    assert tuning.plan_encode(5, 10, 2000, PIXEL_RATE, history=history)['preset'] == 'slow'
@@ -0,0 +1,418 @@
+"""video.py helpers."""
+import os
+import shutil
+import subprocess
+import sys
+import stat
+
+import pytest
+
+import overlays
+import video
+from ffmpeg_common import build_composite_filter
+
+# Two -progress blocks as ffmpeg writes them to pipe:1, the last one final
+FAKE_FFMPEG = '''#!{python}
+import sys
+sys.stdout.write("frame=25\\nfps=24.5\\nbitrate=N/A\\ntotal_size=1024\\nout_time_us=1000000\\n"
+                 "speed=2.01x\\nprogress=continue\\n")
+sys.stdout.write("frame=50\\nfps=25.0\\nbitrate=2310.4kbits/s\\ntotal_size=4096\\nout_time_us=N/A\\n"
+                 "speed=2.1x\\nprogress=end\\n")
+sys.stderr.write("some ffmpeg log\\n")
+'''
+
+# Reports the whole clip as encoded, then keeps finalising before it writes its output
+FINALISING_FFMPEG = '''#!{python}
+import sys, time
+sys.stdout.write("frame=89\\nout_time_us=3000000\\nspeed=3x\\nprogress=continue\\n")
+sys.stdout.flush()
+time.sleep(0.5)
+open(sys.argv[-1], "w").write("complete")
+sys.stdout.write("frame=89\\nout_time_us=3000000\\nspeed=3x\\nprogress=end\\n")
+'''
+
+
+def test_parse_progress_block():
+    fields = {'frame': '120', 'fps': '29.97', 'bitrate': '1500.0kbits/s', 'total_size': '2048',
+              'out_time_us': '4000000', 'speed': '1.5x', 'progress': 'continue'}
+    assert video.parse_progress(fields, 8) == {
+        'frame': 120, 'fps': 29.97, 'speed': 1.5, 'out_time': 4.0, 'bitrate_kbps': 1500.0,
+        'total_size': 2048, 'percentage': 50.0, 'done': False,
+    }
+    event = video.parse_progress({'out_time_ms': '9000000', 'speed': 'N/A', 'progress': 'end'}, 0)
+    assert (event['out_time'], event['speed'], event['percentage'], event['done']) == (9.0, None, None, True)
+
+
+def test_progress_stream_is_parsed_per_block(tmp_path):
+    fake = tmp_path / 'ffmpeg'
+    fake.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    fake.chmod(fake.stat().st_mode | stat.S_IXUSR)
+    events = []
+    success, stderr_lines = video.run_ffmpeg_with_progress([str(fake), '-i', 'in.mp4'], 'in.mp4', 2, 0, events.append)
+    assert success and stderr_lines == ['some ffmpeg log\n']
+    assert [(e['frame'], e['percentage'], e['done'], e['file']) for e in events] == [
+        (25, 50.0, False, 'in.mp4'), (50, 50.0, True, 'in.mp4')
+    ]
+    # out_time went N/A on the last block; the last known position is kept
+    assert events[1]['out_time'] == 1.0 and events[1]['bitrate_kbps'] == 2310.4
+
+
+def test_json_progress_goes_to_stderr_behind_prefix(capsys):
+    video.print_progress_json({'frame': 1, 'percentage': 10.0})
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err.startswith(video.PROGRESS_PREFIX)
+    assert video.parse_progress_line(err.rstrip('\n')) == {'frame': 1, 'percentage': 10.0, 'event': 'progress'}
+    assert video.parse_progress_line('✅ Successfully processed') is None
+
+
+def test_rendition_size_limit_grows_to_what_the_minimum_bitrate_needs():
+    # At 60 s the minimum video bitrate alone needs more than mobile's 4 MB
+    min_mb = video.get_min_size_limit_mb(60, 192)
+    assert min_mb > 4
+    assert video.calculate_target_bitrate(60, min_mb, 192) == pytest.approx(video.MIN_VIDEO_BITRATE_KBPS)
+    assert video.get_min_size_limit_mb(20, 192) < 4
+
+
+def test_renditions_report_which_ones_were_built(tmp_path, monkeypatch):
+    outputs = video.get_rendition_outputs(str(tmp_path), 'clip.mov', ['full', 'mobile'], 'h264', 'mp4', 10, False)
+    assert [(o['output_path'], o['own_size_limit']) for o in outputs] == [
+        (str(tmp_path / 'clip.mp4'), False), (str(tmp_path / 'clip_mobile.mp4'), True)
+    ]
+
+    def fake_encode(cmd, *args):
+        for output in outputs:
+            open(output['partial_path'], 'wb').close()
+        return True, []
+
+    limits = {}
+
+    def fake_enforce(path, max_mb, *args, **kwargs):
+        limits[os.path.basename(path)] = max_mb
+        return 'mobile' not in path
+
+    monkeypatch.setattr(video, 'run_ffmpeg_with_progress', fake_encode)
+    monkeypatch.setattr(video, 'enforce_size_limit', fake_enforce)
+    system_info = {'encoder_backends': {}, 'has_videotoolbox': False, 'is_apple_silicon': False,
+                   'available_hw_encoders': []}
+    ok = video.encode_renditions(outputs, '[0:v]null[final]', (str(tmp_path / 'clip.mov'),), (720, 960),
+                                 {'audio': None}, system_info, 90, None, 'clip.mov')
+    assert not ok
+    assert [o['ok'] for o in outputs] == [True, False]
+    assert limits['.clip.partial.mp4'] == 10
+    assert limits['.clip_mobile.partial.mp4'] == pytest.approx(video.get_min_size_limit_mb(90, 0))
+
+
+def test_align_paste_position_puts_the_video_on_the_chroma_grid():
+    # Odd border: the paste position has to be odd
+    assert video.align_paste_position(4, 3, 10) == 5
+    assert video.align_paste_position(5, 3, 10) == 5
+    # No room to move right: one pixel left instead, or unchanged at 0 with no slack
+    assert video.align_paste_position(4, 3, 4) == 3
+    assert video.align_paste_position(0, 3, 0) == 0
+    for paste, border_size, slack in [(0, 1, 7), (3, 2, 9), (6, 5, 6), (0, 3, 1)]:
+        aligned = video.align_paste_position(paste, border_size, slack)
+        assert 0 <= aligned <= slack and abs(aligned - paste) <= 1
+        assert video.yuv_composite_fits(border_size, aligned, aligned)
+
+
+@pytest.mark.parametrize('fps, rate', [
+    (29.97, '30000/1001'), (23.976, '24000/1001'), (59.94, '60000/1001'),
+    (30, '30/1'), (25.0, '25/1'), (12.5, '25/2'), (0, None), (None, None),
+])
+def test_get_canvas_rate(fps, rate):
+    assert video.get_canvas_rate(fps) == rate
+
+
+def _render_rgb(source, graph, inputs, size):
+    cmd = ['ffmpeg', '-v', 'error', '-i', source]
+    for path in inputs:
+        cmd += ['-i', path]
+    cmd += ['-filter_complex', graph, '-map', '[final]', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    data = subprocess.run(cmd, check=True, capture_output=True).stdout
+    frame_size = size[0] * size[1] * 3
+    return [data[i:i + frame_size] for i in range(0, len(data), frame_size)]
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+def test_yuv_composite_matches_the_rgba_composite(tmp_path):
+    source = str(tmp_path / 'clip.mp4')
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=96x80:rate=30000/1001:duration=0.5',
+                    '-pix_fmt', 'yuv420p', source], check=True)
+    # Odd border, so both paste positions are moved onto odd offsets
+    crop_width, crop_height, border_size, radius = 60, 46, 3, 6
+    canvas_width, canvas_height = 72, 96
+    content_width, content_height = crop_width + border_size * 2, crop_height + border_size * 2
+    paste_x = video.align_paste_position((canvas_width - content_width) // 2, border_size, canvas_width - content_width)
+    paste_y = video.align_paste_position(0, border_size, canvas_height - content_height)
+    assert (paste_x, paste_y) == (3, 1)
+    rate = video.get_canvas_rate(29.97)
+    color = (128, 128, 128, 255)
+    cache_dir = str(tmp_path)
+
+    yuv = _render_rgb(source, video.build_yuv_composite_filter(
+        crop_width, crop_height, 4, 6, border_size, canvas_width, canvas_height, paste_x, paste_y,
+        radius + border_size, canvas_rate=rate
+    ), [overlays.get_corner_tiles_path(crop_width, crop_height, border_size, radius + border_size, color,
+                                       (paste_x % 2, paste_y % 2), cache_dir=cache_dir)],
+        (canvas_width, canvas_height))
+    # RGB overlays, so the reference graph places the border at odd positions exactly too
+    rgba = _render_rgb(source, build_composite_filter(
+        crop_width, crop_height, 4, 6, border_size, canvas_width, canvas_height, paste_x, paste_y,
+        canvas_rate=rate, overlay_format='rgb'
+    ), [overlays.get_rounded_mask_path(crop_width, crop_height, radius, cache_dir=cache_dir),
+        overlays.get_border_overlay_path(crop_width, crop_height, border_size, radius + border_size, color,
+                                         cache_dir=cache_dir)],
+        (canvas_width, canvas_height))
+
+    assert len(yuv) == len(rgba) == 15
+    for yuv_frame, rgba_frame in zip(yuv, rgba):
+        # Same canvas, border and corners: black pixels match exactly, the rest
+        # only differ by chroma subsampling
+        for i in range(0, len(yuv_frame), 3):
+            yuv_pixel, rgba_pixel = yuv_frame[i:i + 3], rgba_frame[i:i + 3]
+            assert (max(yuv_pixel) < 12) == (max(rgba_pixel) < 12)
+            assert max(abs(a - b) for a, b in zip(yuv_pixel, rgba_pixel)) < 48
+
+
+STEREO_AAC = {'codec': 'aac', 'channels': 2, 'sample_rate': 48000, 'bitrate_kbps': 128}
+REENCODE = ['-c:a', 'aac', '-b:a', '192k', '-ar', '48000']
+
+
+@pytest.mark.parametrize('audio, output_format, copy', [
+    (STEREO_AAC, 'mp4', True),
+    (dict(STEREO_AAC, sample_rate=44100, channels=1), 'mov', True),
+    (dict(STEREO_AAC, bitrate_kbps=192), 'mkv', True),
+    (dict(STEREO_AAC, codec='mp3'), 'mp4', False),
+    (dict(STEREO_AAC, codec='opus'), 'mkv', False),
+    (dict(STEREO_AAC, sample_rate=32000), 'mp4', False),
+    (dict(STEREO_AAC, sample_rate=96000), 'mp4', False),
+    (dict(STEREO_AAC, channels=6), 'mp4', False),
+    (dict(STEREO_AAC, streams=2), 'mp4', False),
+    (dict(STEREO_AAC, bitrate_kbps=320), 'mp4', False),
+    (dict(STEREO_AAC, bitrate_kbps=None), 'mp4', False),
+    (STEREO_AAC, 'webm', False),
+])
+def test_audio_is_copied_only_when_compliant(audio, output_format, copy):
+    assert video.can_copy_audio(audio, output_format) is copy
+    assert video.get_audio_settings(audio, output_format) == (['-c:a', 'copy'] if copy else REENCODE)
+    assert video.get_audio_bitrate_kbps(audio, output_format) == (audio['bitrate_kbps'] if copy else 192)
+
+
+def test_silent_sources_get_no_audio():
+    assert not video.can_copy_audio(None, 'mp4')
+    assert video.get_audio_settings(None, 'mp4') == ['-an']
+    assert video.get_audio_bitrate_kbps(None, 'mp4') == 0
+    # A lower re-encode bitrate also lowers what can be copied
+    assert video.get_audio_settings(STEREO_AAC, 'mp4', 96) == ['-c:a', 'aac', '-b:a', '96k', '-ar', '48000']
+
+
+def clip_info(width, height, duration=60):
+    return {'width': width, 'height': height, 'duration': duration}
+
+
+def test_fixed_jobs_split_the_threads():
+    infos = [clip_info(1920, 1080)] * 10
+    assert video.plan_encoder_threads(infos, 16, jobs=1) == (1, 16)
+    # Uneven splits round the threads down, so jobs x threads stays within the budget
+    assert video.plan_encoder_threads(infos, 10, jobs=3) == (3, 3)
+    assert video.plan_encoder_threads(infos, 7, jobs=2) == (2, 3)
+    # More jobs than cores still get a thread each
+    assert video.plan_encoder_threads(infos, 4, jobs=8) == (8, 1)
+    # Never more jobs than clips
+    assert video.plan_encoder_threads(infos[:2], 16, jobs=4) == (2, 8)
+
+
+def test_planned_jobs_follow_the_canvas_size():
+    # 1080p clips get a 1296-tall canvas: 4 threads a job
+    assert video.plan_encoder_threads([clip_info(1920, 1080)] * 10, 16) == (4, 4)
+    # Small canvases take more, narrower jobs; the remainder goes to the threads
+    assert video.plan_encoder_threads([clip_info(320, 240)] * 10, 7) == (3, 2)
+    # 4K gets 8 threads a job, unless the delivery profile caps the canvas
+    assert video.plan_encoder_threads([clip_info(3840, 2160)] * 10, 16) == (2, 8)
+    assert video.plan_encoder_threads([clip_info(3840, 2160)] * 10, 16,
+                                      profile=video.DELIVERY_PROFILES['web']) == (4, 4)
+
+
+def test_planned_jobs_for_short_clips_and_small_batches():
+    # Short clips halve the threads a job
+    assert video.plan_encoder_threads([clip_info(1920, 1080, 8)] * 10, 16) == (8, 2)
+    # A lone clip gets the whole budget, however small its canvas
+    assert video.plan_encoder_threads([clip_info(320, 240)], 16) == (1, 16)
+    # Fewer cores than a job's threads still plan one job
+    assert video.plan_encoder_threads([clip_info(3840, 2160)] * 3, 4) == (1, 4)
+    # Unprobed clips are planned as 1080p
+    assert video.plan_encoder_threads([None] * 10, 16) == (4, 4)
+
+
+def overlaps(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+def test_static_regions_surround_the_bordered_video():
+    # A 3:4 canvas with the bordered video centred at the top, as process_videos_in_folder lays it out
+    canvas, video_rect = (720, 960), (21, 1, 678, 800)
+    regions = video.get_static_regions(*canvas, *video_rect)
+    # Above the video is only one pixel of canvas, under a block: no region there
+    assert regions == [(0, 816, 720, 144), (0, 0, 16, 816), (704, 0, 16, 816)]
+    for x, y, w, h in regions:
+        # Block-aligned, so no block that holds video is marked
+        assert x % 16 == y % 16 == 0
+        assert 0 <= x and 0 <= y and x + w <= canvas[0] and y + h <= canvas[1]
+        assert not overlaps((x, y, w, h), video_rect)
+
+
+def test_static_regions_all_around_a_small_video():
+    regions = video.get_static_regions(640, 640, 100, 120, 300, 200)
+    assert regions == [(0, 320, 640, 320), (0, 0, 640, 112), (0, 112, 96, 208), (400, 112, 240, 208)]
+    # Nothing left when the video fills the canvas
+    assert video.get_static_regions(640, 480, 0, 0, 640, 480) == []
+
+
+@pytest.mark.parametrize('size', [(480, 640), (360, 480), (702, 936)])
+def test_scaled_regions_stay_on_the_static_canvas(size):
+    canvas, video_rect = (720, 960), (21, 1, 678, 800)
+    scale_x, scale_y = size[0] / canvas[0], size[1] / canvas[1]
+    scaled_video = (video_rect[0] * scale_x, video_rect[1] * scale_y, video_rect[2] * scale_x, video_rect[3] * scale_y)
+    regions = video.get_static_regions(*canvas, *video_rect)
+    scaled = video.scale_regions(regions, scale_x, scale_y)
+    assert scaled
+    for x, y, w, h in scaled:
+        assert x % 16 == y % 16 == w % 16 == h % 16 == 0
+        assert x + w <= size[0] and y + h <= size[1]
+        assert not overlaps((x, y, w, h), scaled_video)
+        # Inside one of the regions it was scaled from
+        assert any(rx * scale_x <= x and ry * scale_y <= y and x + w <= (rx + rw) * scale_x
+                   and y + h <= (ry + rh) * scale_y for rx, ry, rw, rh in regions)
+
+
+def test_scaled_regions_drop_bands_thinner_than_a_block():
+    # The 16-wide side bands are 10.7 pixels wide at 2/3 scale
+    regions = video.get_static_regions(720, 960, 21, 1, 678, 800)
+    assert video.scale_regions(regions, 2 / 3, 2 / 3) == [(0, 544, 480, 96)]
+    assert video.scale_regions(regions, 1, 1) == regions
+
+
+def test_video_infos_come_from_the_cache_until_a_file_changes(tmp_path, monkeypatch):
+    inputs, cache_dir = tmp_path / 'input', str(tmp_path / 'cache')
+    inputs.mkdir()
+    clip = inputs / 'clip.mp4'
+    clip.write_bytes(b'frames')
+    probed = []
+
+    def fake_probe(path):
+        probed.append(path)
+        return {'width': 1920, 'height': 1080, 'duration': os.path.getsize(path), 'audio': None}
+
+    monkeypatch.setattr(video, 'get_video_info', fake_probe)
+    assert video.get_video_infos([str(clip)], cache_dir=cache_dir)[str(clip)]['duration'] == 6
+    assert video.get_video_info_cached(str(clip), cache_dir)['duration'] == 6
+    assert probed == [str(clip)]
+    # The index is kept in the cache directory, not next to the videos
+    assert os.listdir(inputs) == ['clip.mp4']
+    assert os.path.exists(os.path.join(cache_dir, video.VIDEO_INFO_CACHE_FILE))
+
+    clip.write_bytes(b'more frames')
+    assert video.get_video_info_cached(str(clip), cache_dir)['duration'] == 11
+    assert len(probed) == 2
+    stat = clip.stat()
+    os.utime(clip, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    video.get_video_info_cached(str(clip), cache_dir)
+    assert len(probed) == 3
+    # Missing files are neither probed nor kept in the index
+    assert video.get_video_infos([str(inputs / 'gone.mp4')], cache_dir=cache_dir) == {str(inputs / 'gone.mp4'): None}
+    assert len(probed) == 3
+
+
+def test_size_limit_reencode_uses_the_source_probe(tmp_path, monkeypatch):
+    monkeypatch.setattr(video, 'get_video_info', lambda path: pytest.fail('probed the oversized file'))
+    commands = []
+    monkeypatch.setattr(video, 'run_ffmpeg', lambda cmd, *args, **kwargs: commands.append(cmd) or (True, '', ''))
+    monkeypatch.setattr(video, 'run_ffmpeg_with_progress', lambda cmd, *args: (commands.append(cmd) or True, []))
+    source = {'audio': dict(STEREO_AAC, codec='mp3', bitrate_kbps=320)}
+    video.reencode_to_target_size(str(tmp_path / 'in.mp4'), str(tmp_path / 'out.mp4'), 10, 60, {}, video_info=source)
+    # The encode re-encoded the MP3 to 192 kbps AAC, which is then brought down to 128 kbps
+    assert ['-c:a', 'aac', '-b:a', '128k', '-ar', '48000'] == commands[-1][commands[-1].index('-c:a'):][:6]
+    assert video.get_output_audio(STEREO_AAC, 'mp4') is STEREO_AAC
+    assert video.get_output_audio(source['audio'], 'mp4')['bitrate_kbps'] == 192
+    assert video.get_output_audio(None, 'mp4') is None
+
+
+def test_target_bitrate_fits_the_size_limit():
+    # 10 MB over 60 s with 192 kbps audio: 90% of what the audio leaves
+    bitrate = video.calculate_target_bitrate(60, 10, 192)
+    assert bitrate == pytest.approx((10 * 8 * 1024 * 1024 / 60 / 1000 - 192) * 0.9)
+    # The margin only comes off the video's share, so the output lands a little above 9 MB
+    audio_mb = video.predict_output_size_mb(60, 0, 192)
+    assert video.predict_output_size_mb(60, bitrate, 192) == pytest.approx(10 * 0.9 + audio_mb * 0.1)
+    for duration, size_mb, audio_kbps in [(10, 4, 0), (45, 10, 128), (90, 25, 192), (120, 50, 320)]:
+        bitrate = video.calculate_target_bitrate(duration, size_mb, audio_kbps)
+        if video.MIN_VIDEO_BITRATE_KBPS < bitrate < video.MAX_VIDEO_BITRATE_KBPS:
+            assert video.predict_output_size_mb(duration, bitrate, audio_kbps) <= size_mb
+
+
+def test_target_bitrate_is_clamped():
+    # Short clips would get more than the quality ceiling, long ones less than the floor
+    assert video.calculate_target_bitrate(5, 10, 192) == video.MAX_VIDEO_BITRATE_KBPS
+    assert video.calculate_target_bitrate(600, 10, 192) == video.MIN_VIDEO_BITRATE_KBPS
+    assert video.calculate_target_bitrate(0, 10, 192) == 2000
+    # The cap is a VBV ceiling of that bitrate over a two-second buffer
+    assert video.get_bitrate_cap_settings(1085.5) == ['-maxrate', '1085k', '-bufsize', '2171k']
+    assert video.get_bitrate_cap_settings(None) == []
+
+
+def test_encode_at_full_progress_runs_to_completion(tmp_path):
+    fake = tmp_path / 'ffmpeg'
+    fake.write_text(FINALISING_FFMPEG.format(python=sys.executable))
+    fake.chmod(fake.stat().st_mode | stat.S_IXUSR)
+    output = tmp_path / 'out.mp4'
+    events = []
+    success, _ = video.run_ffmpeg_with_progress([str(fake), str(output)], 'in.mp4', 3, 0, events.append)
+    # Nothing interrupts ffmpeg once the clip reads 100%; it ends by itself
+    assert success and output.read_text() == 'complete'
+    assert [(e['percentage'], e['done']) for e in events] == [(100.0, False), (100.0, True)]
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+def test_composite_keeps_every_source_frame(tmp_path):
+    source = str(tmp_path / 'clip.mp4')
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=96x80:rate=30000/1001',
+                    '-frames:v', '89', '-pix_fmt', 'yuv420p', source], check=True)
+    cache_dir = str(tmp_path)
+    graph = build_composite_filter(60, 46, 4, 6, 2, 72, 96, 4, 0, canvas_rate=video.get_canvas_rate(29.97))
+    # Single-frame mask and border, no -t: the graph has to end with the source
+    frames = _render_rgb(source, graph, [
+        overlays.get_rounded_mask_path(60, 46, 6, cache_dir=cache_dir),
+        overlays.get_border_overlay_path(60, 46, 2, 8, (128, 128, 128, 255), cache_dir=cache_dir),
+    ], (72, 96))
+    assert len(frames) == 89
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+def test_delivery_profile_caps_canvas_size_fps_and_duration(tmp_path, monkeypatch):
+    inputs, outputs = tmp_path / 'input', tmp_path / 'output'
+    inputs.mkdir()
+    source = str(inputs / 'clip.mp4')
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=640x480:rate=60', '-t', '1',
+                    '-pix_fmt', 'yuv420p', source], check=True)
+    # Without ffprobe here, the probe is given
+    monkeypatch.setattr(video, 'check_ffmpeg_installed', lambda: True)
+    monkeypatch.setattr(video, 'get_video_info_cached', lambda path, cache_dir=None: {
+        'width': 640, 'height': 480, 'codec': 'h264', 'duration': 1.0, 'fps': 60.0, 'audio': None
+    })
+    monkeypatch.setattr(overlays, 'OVERLAY_DIR', str(tmp_path / 'overlays'))
+    monkeypatch.setitem(video.DELIVERY_PROFILES, 'tiny', {'max_canvas_height': 288, 'max_fps': 15, 'max_duration': 0.5})
+    system_info = {'encoder_backends': {}, 'has_videotoolbox': False, 'is_apple_silicon': False,
+                   'available_hw_encoders': []}
+
+    assert video.process_videos_in_folder(str(inputs), str(outputs), [('clip.mp4', source)], 'h264', 'mp4',
+                                          system_info, profile='tiny', use_manifest=False)
+
+    # The 360x480 crop is scaled so the canvas is 288 tall, and 60 fps dropped to 15
+    info = subprocess.run(['ffmpeg', '-i', str(outputs / 'clip.mp4')], capture_output=True, text=True).stderr
+    assert ' 216x288 ' in info and ' 15 fps' in info
+    frames = subprocess.run(['ffmpeg', '-v', 'error', '-i', str(outputs / 'clip.mp4'), '-f', 'rawvideo',
+                             '-pix_fmt', 'gray', '-'], check=True, capture_output=True).stdout
+    assert len(frames) // (216 * 288) == 8
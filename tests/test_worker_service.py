@@ -0,0 +1,121 @@
+"""worker_service.py request validation."""
+import os
+import json
+import threading
+import http.client
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import worker_service
+
+
+def test_coerces_numeric_strings():
+    params = worker_service.coerce_params({'jobs': '4', 'segments': 2, 'time_budget': '1.5', 'concurrency': None,
+                                           'files': ['a.mp4']})
+    assert params == {'jobs': 4, 'segments': 2, 'time_budget': 1.5, 'files': ['a.mp4']}
+
+
+def test_checks_named_choices():
+    params = worker_service.coerce_params({'engine': 'numpy', 'progress': 'json', 'profile': '',
+                                           'renditions': 'full,mobile'})
+    assert params == {'engine': 'numpy', 'progress': 'json', 'renditions': ['full', 'mobile']}
+
+
+@pytest.mark.parametrize('params', [
+    {'jobs': 'four'}, {'jobs': '2.5'}, {'jobs': True}, {'jobs': -1},
+    {'segments': 'x'}, {'concurrency': 0}, {'time_budget': 0}, {'time_budget': 'nan'},
+    {'engine': 'gpu'}, {'progress': 'xml'}, {'profile': 'cinema'}, {'renditions': ['full', 'huge']},
+    {'renditions': 'full,huge'}, {'renditions': {'full': 1}}, {'renditions': ['full'], 'time_budget': 1},
+    {'files': 'a.mp4'}, {'files': ['a.mp4', 3]}, {'image_urls': {'url': 'x'}},
+])
+def test_rejects_invalid_values(params):
+    with pytest.raises(ValueError):
+        worker_service.coerce_params(params)
+
+
+def test_invalid_params_get_400():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), worker_service.WorkerRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+        conn.request('POST', '/rpc', json.dumps({'method': 'process_images', 'params': {'jobs': 'four'}}),
+                     {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        assert response.status == 400
+        assert 'jobs' in json.loads(response.read())['error']
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_captured_job_returns_its_own_output(monkeypatch):
+    def noisy(params):
+        # Written at the fd level, like ffmpeg and bulk worker processes do
+        os.write(1, f"processing {params['files'][0]}\n".encode())
+        os.write(2, b'a warning\n')
+        return 0, 'done'
+
+    def broken(params):
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(worker_service.METHODS, 'noisy', (noisy, True))
+    monkeypatch.setitem(worker_service.METHODS, 'broken', (broken, True))
+    assert worker_service.run_captured_job('noisy', {'files': ['a.png']}) == (0, 'done', 'processing a.png\n', 'a warning\n')
+    assert worker_service.run_captured_job('broken', {})[:3] == (1, None, '')
+
+
+def test_progress_events_are_followed_and_left_out_of_stderr(tmp_path, monkeypatch):
+    stderr_path = tmp_path / 'stderr'
+    stderr_path.write_bytes(b'warning\n@progress {"event": "progress", "frame": 1}\n@progress {"event": "pro')
+    events = []
+    position = worker_service._follow_progress(str(stderr_path), 0, events.append)
+    assert events == [{'event': 'progress', 'frame': 1}]
+    with open(stderr_path, 'ab') as f:
+        f.write(b'gress", "frame": 2}\n')
+    worker_service._follow_progress(str(stderr_path), position, events.append)
+    assert [event['frame'] for event in events] == [1, 2]
+
+    def encoding(params):
+        os.write(2, b'@progress {"event": "progress", "frame": 3}\nffmpeg warning\n')
+        return 0, None
+
+    monkeypatch.setitem(worker_service.METHODS, 'encoding', (encoding, True))
+    assert worker_service.run_captured_job('encoding', {})[3] == 'ffmpeg warning\n'
+
+
+def test_streamed_rpc_sends_progress_then_result(monkeypatch):
+    def fake_handle_rpc(method, params, on_progress=None):
+        on_progress({'event': 'progress', 'percentage': 50.0})
+        on_progress({'event': 'progress', 'percentage': 100.0})
+        return {'code': 0, 'stdout': 'done\n', 'stderr': '', 'result': None}
+
+    monkeypatch.setattr(worker_service, 'handle_rpc', fake_handle_rpc)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), worker_service.WorkerRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+        conn.request('POST', '/rpc', json.dumps({'method': 'process_videos', 'params': {'progress': 'json'},
+                                                 'stream': True}), {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        assert response.status == 200
+        lines = [json.loads(line) for line in response.read().decode().splitlines()]
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [line.get('percentage') for line in lines[:2]] == [50.0, 100.0]
+    assert lines[2] == {'code': 0, 'stdout': 'done\n', 'stderr': '', 'result': None, 'event': 'result'}
+
+
+def test_pending_queue_is_resumed_at_start_up(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(worker_service, 'OUTPUT_VIDEO_FOLDER', str(tmp_path))
+    monkeypatch.setattr(worker_service, 'handle_rpc', lambda method, params: calls.append((method, params))
+                        or {'code': 0, 'stdout': '', 'stderr': '', 'result': None})
+    assert worker_service.resume_queued_jobs() is None and calls == []
+
+    conn = worker_service.job_queue.open_queue(str(tmp_path))
+    worker_service.job_queue.enqueue(conn, [('a.mp4', str(tmp_path / 'a.mp4'))])
+    conn.close()
+    assert worker_service.resume_queued_jobs() == 0
+    assert calls == [('process_videos', {'bulk': True, 'queue': True})]
@@ -0,0 +1,164 @@
+"""
+Preset/CRF auto-tuning for software encodes (video.py --time-budget).
+
+Without tuning every clip is encoded with x264 -preset medium -crf 18, no matter
+how long it is or how much of the batch's time is left. With a fleet target
+("finish these videos in T minutes, each under the size limit") each clip gets
+a share of the remaining time in proportion to its duration, and:
+
+1. a few seconds from the middle of the clip are encoded through the real filter
+   graph at medium/CRF 18 (the sample), measuring speed and bitrate;
+2. the slowest preset predicted to finish within the clip's share is chosen
+   (short clips get slower, better presets and long clips faster ones), using
+   typical x264 preset speed ratios;
+3. CRF is raised from 18 only as far as the sample says is needed to land under
+   the size limit (x264's bitrate roughly halves for every +6 CRF).
+
+After each encode the achieved speed and bitrate are appended to a history file
+in the output folder. Later runs correct the built-in ratios by how far past
+predictions were off, per preset, so they keep getting closer to the target.
+"""
+import os
+import json
+import math
+import time
+import statistics
+
+HISTORY_FILE = '.encoder_tuning.jsonl'
+# Only the most recent entries are used for calibration
+HISTORY_WINDOW = 200
+
+SAMPLE_SECONDS = 3
+# Clips shorter than this are not sampled; past throughput decides their preset
+MIN_SAMPLED_DURATION = SAMPLE_SECONDS * 3
+
+BASE_PRESET = 'medium'
+BASE_CRF = 18
+MAX_CRF = 28
+
+# Fastest to slowest. Speed relative to medium and bitrate relative to medium at the same CRF.
+PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower')
+PRESET_SPEED = {
+    'ultrafast': 8.0, 'superfast': 6.0, 'veryfast': 4.0, 'faster': 2.5,
+    'fast': 1.6, 'medium': 1.0, 'slow': 0.6, 'slower': 0.3,
+}
+PRESET_BITRATE = {
+    'ultrafast': 1.8, 'superfast': 1.4, 'veryfast': 1.1, 'faster': 1.05,
+    'fast': 1.02, 'medium': 1.0, 'slow': 0.97, 'slower': 0.95,
+}
+
+def clip_time_share(time_left, duration, remaining_media_seconds, workers=1):
+    """Wall-clock seconds a clip may take: its share of what is left, by duration, across workers."""
+    if remaining_media_seconds <= 0 or duration <= 0:
+        return max(0.0, time_left)
+    return max(0.0, time_left) * workers * duration / remaining_media_seconds
+
+def sample_window(duration):
+    """(start, length) of the sample taken from the middle of a clip, or None for short clips."""
+    if duration < MIN_SAMPLED_DURATION:
+        return None
+    return max(0.0, duration / 2 - SAMPLE_SECONDS / 2), SAMPLE_SECONDS
+
+def load_history(output_folder):
+    """The most recent tuning records (oldest first)."""
+    path = os.path.join(output_folder, HISTORY_FILE)
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except OSError:
+        return []
+    return records[-HISTORY_WINDOW:]
+
+def record_result(output_folder, plan, speed, video_kbps, size_mb):
+    """Append what an encode tuned with plan actually achieved."""
+    record = dict(plan, ts=round(time.time(), 3), speed=round(speed, 4),
+                  throughput=round(speed * plan['pixel_rate']),
+                  video_kbps=round(video_kbps, 1), size_mb=round(size_mb, 3))
+    with open(os.path.join(output_folder, HISTORY_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+def _calibration(history, key, preset=None):
+    """
+    Median of achieved / modelled for key ('speed' or 'video_kbps') over past encodes
+    (1.0 without history). Records keep the uncorrected model value, so the
+    correction doesn't feed back into itself.
+    """
+    ratios = [
+        record[key] / record[f'model_{key}']
+        for record in history
+        if record.get(f'model_{key}') and record.get(key) and (preset is None or record.get('preset') == preset)
+    ]
+    return statistics.median(ratios) if ratios else 1.0
+
+def plan_encode(duration, time_share, target_video_kbps, pixel_rate, sample=None, history=()):
+    """
+    Choose preset and CRF for a clip.
+
+    Args:
+        duration: Clip duration in seconds
+        time_share: Wall-clock seconds the encode may take (see clip_time_share)
+        target_video_kbps: Video bitrate that keeps the output under the size limit
+        pixel_rate: Output pixels per second of video (width x height x fps)
+        sample: {'speed': x realtime, 'video_kbps': ...} from encoding at BASE_PRESET/BASE_CRF,
+            or None when the clip was too short to sample
+        history: Records from load_history, used to correct the predictions
+
+    Returns a plan dict (preset, crf, model and predicted speed/bitrate, ...), which is
+    also the record written to the history after the encode.
+    """
+    required_speed = duration / time_share if time_share > 0 else math.inf
+    model_speed = model_kbps = predicted_speed = None
+    crf = BASE_CRF
+
+    if sample is None:
+        # Too short to sample: the slowest preset whose past throughput (pixels per
+        # second, so clips of any size compare) keeps up. Presets without history of
+        # their own are estimated from the others scaled to medium; no history at all
+        # keeps BASE_PRESET
+        medium_throughputs = [
+            r['throughput'] / PRESET_SPEED[r['preset']]
+            for r in history if r.get('preset') in PRESET_SPEED and r.get('throughput')
+        ]
+        if not medium_throughputs:
+            preset = BASE_PRESET
+        else:
+            medium_throughput = statistics.median(medium_throughputs)
+            preset = PRESETS[0]
+            for candidate in reversed(PRESETS):
+                throughputs = [r['throughput'] for r in history if r.get('preset') == candidate and r.get('throughput')]
+                throughput = statistics.median(throughputs) if throughputs else medium_throughput * PRESET_SPEED[candidate]
+                if throughput >= required_speed * pixel_rate:
+                    preset = candidate
+                    break
+    else:
+        preset = PRESETS[0]
+        for candidate in reversed(PRESETS):
+            if sample['speed'] * PRESET_SPEED[candidate] * _calibration(history, 'speed', candidate) >= required_speed:
+                preset = candidate
+                break
+        model_speed = sample['speed'] * PRESET_SPEED[preset]
+        predicted_speed = model_speed * _calibration(history, 'speed', preset)
+
+        size_correction = _calibration(history, 'video_kbps')
+        kbps_at_base_crf = sample['video_kbps'] * PRESET_BITRATE[preset]
+        if kbps_at_base_crf * size_correction > target_video_kbps > 0:
+            ratio = kbps_at_base_crf * size_correction / target_video_kbps
+            crf = min(MAX_CRF, BASE_CRF + math.ceil(6 * math.log2(ratio)))
+        model_kbps = kbps_at_base_crf * 2 ** (-(crf - BASE_CRF) / 6)
+
+    return {
+        'preset': preset,
+        'crf': crf,
+        'duration': round(duration, 3),
+        'pixel_rate': round(pixel_rate),
+        'time_share': round(time_share, 3) if math.isfinite(time_share) else None,
+        'required_speed': round(required_speed, 4) if math.isfinite(required_speed) else None,
+        'model_speed': round(model_speed, 4) if model_speed else None,
+        'predicted_speed': round(predicted_speed, 4) if predicted_speed else None,
+        'model_video_kbps': round(model_kbps, 1) if model_kbps else None,
+    }
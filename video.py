@@ -5,52 +5,45 @@ import math
 import tempfile
 import shutil
 import time
-import re
 import sys
 import platform
 from typing import List, Tuple, Dict
-import signal # Added for SIGINT
-from PIL import Image, ImageDraw # Added for mask and border generation
+from fractions import Fraction
+import threading
+from overlays import (get_rounded_mask_path, get_border_overlay_path, get_corner_tiles_path, get_corner_tile_size,
+                      get_corner_tile_offsets)
+from build_manifest import load_manifest, save_manifest, is_up_to_date, record_output
+import job_queue
+import metrics
+import encoders
+import tuning
+from ffmpeg_common import run_ffmpeg, build_composite_filter, build_roi_filters, STATIC_ROI_QOFFSET
 import concurrent.futures
 import argparse
 
-def run_ffmpeg(cmd: list, log_success: bool = True):
-    """
-    Run an FFmpeg command and handle stderr output cleanly.
-    Returns (success: bool, stderr_output: str, stdout_output: str).
-    
-    This function is ideal for simple FFmpeg operations like version checks,
-    encoder listings, and test video creation. For complex operations that 
-    require progress tracking, use run_ffmpeg_with_progress().
-    """
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    stderr = result.stderr.strip()
-    stdout = result.stdout.strip()
-    
-    if result.returncode != 0:
-        print(f"❌ FFmpeg error (code {result.returncode}):")
-        print(stderr)
-        return False, stderr, stdout
-    
-    if log_success:
-        print("✅ FFmpeg completed successfully.")
-        # Optionally log stderr for review (FFmpeg logs progress to stderr even on success)
-        # with open("ffmpeg.log", "a") as f:
-        #     f.write(f"Command: {' '.join(cmd)}\n")
-        #     f.write(f"FFmpeg logs: {stderr}\n\n")
-    
-    return True, stderr, stdout
+# Bump when the processing logic changes so existing outputs are rebuilt
+SCRIPT_VERSION = '1.4'
+
+# Progress displays: terminal bar or one JSON event per line (see print_progress_json)
+PROGRESS_MODES = ('bar', 'json')
+# JSON progress events go to stderr, one per line behind this prefix, so they stay
+# apart from the human-readable log on stdout and from ffmpeg's error output
+PROGRESS_PREFIX = '@progress '
 
-def run_ffmpeg_with_progress(cmd: list, filename: str, duration: float, start_time: float):
+def run_ffmpeg_with_progress(cmd: list, filename: str, duration: float, start_time: float, on_progress=None):
     """
     Run an FFmpeg command with real-time progress tracking.
     Returns (success: bool, stderr_lines: list).
     
-    This function is designed for long-running FFmpeg operations that benefit
-    from progress tracking. It properly handles returncode-based success/failure
-    determination while providing real-time feedback.
+    Progress comes from ffmpeg's machine-readable protocol (-progress pipe:1):
+    blocks of key=value lines on stdout, each ending in progress=continue|end.
+    stdout is read with blocking reads and stderr is drained on a separate thread,
+    so nothing spins while ffmpeg is busy and neither pipe can fill up and stall it.
+    
+    on_progress(event) is called once per block with the event from parse_progress()
+    plus 'file'; by default a terminal progress bar is drawn instead.
     """
-    # Start the process
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
@@ -59,81 +52,41 @@ def run_ffmpeg_with_progress(cmd: list, filename: str, duration: float, start_ti
         bufsize=1
     )
     
-    # Monitor progress from stderr (where ffmpeg outputs stats)
-    last_percentage = -1
+    # Kept for error messages; appended to from the reader thread
     stderr_lines = []
-    completion_detected = False
-    last_update_time = start_time
+    stderr_reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+    stderr_reader.start()
     
     try:
-        while True:
-            # Read from stderr where ffmpeg outputs progress
-            line = process.stderr.readline()
-            if not line:
-                if process.poll() is not None:
-                    break
-                # Check for timeout if no updates for too long after 100%
-                if completion_detected and (time.time() - last_update_time) > 30:
-                    print(f"\rFinalizing {filename[:30]}... (This may take a moment)")
-                    break
+        fields = {}
+        last_event = None
+        for line in process.stdout:
+            key, sep, value = line.strip().partition('=')
+            if not sep:
+                continue
+            fields[key] = value
+            if key != 'progress':
                 continue
             
-            # Store stderr for potential error messages
-            stderr_lines.append(line)
-            last_update_time = time.time()
-            
-            # Check for completion indicators
-            if any(indicator in line.lower() for indicator in ['video:', 'audio:', 'subtitle:', 'global headers:']):
-                # ffmpeg is showing final summary - we're done
-                if completion_detected:
-                    sys.stdout.write(f"\r{filename[:30]:<30} │ {'█' * 40} │ 100.0% │ Complete!     ")
-                    sys.stdout.flush()
-                    break
-            
-            # Look for time= in the output
-            if 'time=' in line:
-                # Extract time from stats line
-                time_match = re.search(r'time=(\d{2}):(\d{2}):(\d{2}\.\d{2})', line)
-                if time_match and duration > 0:
-                    hours = int(time_match.group(1))
-                    minutes = int(time_match.group(2))
-                    seconds = float(time_match.group(3))
-                    current_time = hours * 3600 + minutes * 60 + seconds
-                    
-                    # Calculate percentage
-                    percentage = (current_time / duration) * 100
-                    percentage = min(percentage, 100)
-                    
-                    # Check if we've reached completion
-                    if percentage >= 99.5:
-                        completion_detected = True
-                        # Show 100% completion
-                        elapsed = time.time() - start_time
-                        display_progress(
-                            filename,
-                            100.0,
-                            elapsed,
-                            duration,
-                            current_time
-                        )
-                        # Gracefully signal ffmpeg to finalize early
-                        try:
-                            process.send_signal(signal.SIGINT)
-                        except Exception:
-                            pass
-                        # Exit the monitoring loop
-                        break
-                    elif percentage - last_percentage >= 0.1:
-                        # Update display for normal progress
-                        elapsed = time.time() - start_time
-                        display_progress(
-                            filename,
-                            percentage,
-                            elapsed,
-                            duration,
-                            current_time
-                        )
-                        last_percentage = percentage
+            event = parse_progress(fields, duration)
+            event['file'] = filename
+            fields = {}
+            # out_time goes N/A for a few updates near the end of some encodes (e.g. once
+            # the audio has finished); keep the last known position instead of going back to 0
+            if event['out_time'] is None and last_event is not None:
+                event['out_time'] = last_event['out_time']
+                event['percentage'] = last_event['percentage']
+            last_event = event
+            if on_progress is not None:
+                on_progress(event)
+            else:
+                display_progress(
+                    filename,
+                    100.0 if event['done'] else event['percentage'] or 0,
+                    time.time() - start_time,
+                    duration,
+                    event['out_time'] or 0
+                )
         
         # Wait for process to complete with longer timeout
         try:
@@ -144,10 +97,12 @@ def run_ffmpeg_with_progress(cmd: list, filename: str, duration: float, start_ti
             print(f"\rTimeout waiting for {filename} to finalize after {format_time(timeout_seconds)}. Terminating...")
             process.terminate()
             process.wait()
+        stderr_reader.join()
         
-        # Clear the progress line
-        sys.stdout.write('\r' + ' ' * 120 + '\r')
-        sys.stdout.flush()
+        if on_progress is None:
+            # Clear the progress line
+            sys.stdout.write('\r' + ' ' * 120 + '\r')
+            sys.stdout.flush()
         
         # Check returncode for success/failure
         if process.returncode == 0:
@@ -160,9 +115,31 @@ def run_ffmpeg_with_progress(cmd: list, filename: str, duration: float, start_ti
         print("\n\nProcessing interrupted by user.")
         raise
     except Exception as e:
+        process.kill()
         print(f"\n❌ Error during processing: {e}")
         return False, stderr_lines
 
+def print_progress_json(event):
+    """
+    on_progress callback that writes each event to stderr as one JSON line behind
+    PROGRESS_PREFIX, for the backend to relay (see parse_progress_line).
+    """
+    sys.stderr.write(PROGRESS_PREFIX + json.dumps(dict(event, event='progress')) + '\n')
+    sys.stderr.flush()
+
+def parse_progress_line(line):
+    """The event from a line written by print_progress_json, or None for any other line."""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PROGRESS_PREFIX):])
+    except ValueError:
+        return None
+
+def get_progress_callback(progress):
+    """The on_progress callback for a --progress mode ('bar' draws the terminal bar)."""
+    return print_progress_json if progress == 'json' else None
+
 def create_output_directory(path):
     """Creates a directory if it doesn't exist."""
     if not os.path.exists(path):
@@ -175,6 +152,11 @@ def get_file_size_mb(filepath):
         return 0
     return os.path.getsize(filepath) / (1024 * 1024)
 
+# Share of the size budget given to the video bitrate, and the bitrate range it is kept in
+SIZE_SAFETY_MARGIN = 0.90
+MIN_VIDEO_BITRATE_KBPS = 500
+MAX_VIDEO_BITRATE_KBPS = 5000
+
 def calculate_target_bitrate(duration, target_size_mb=10, audio_bitrate_kbps=192):
     """
     Calculate the optimal video bitrate to achieve target file size.
@@ -200,16 +182,126 @@ def calculate_target_bitrate(duration, target_size_mb=10, audio_bitrate_kbps=192
     video_bits = target_bits - audio_bits
     
     # Apply safety margin to ensure we stay under limit
-    safety_margin = 0.90  # Use 90% of calculated bitrate for safety
-    target_video_bitrate_kbps = (video_bits / duration / 1000) * safety_margin
+    target_video_bitrate_kbps = (video_bits / duration / 1000) * SIZE_SAFETY_MARGIN
     
-    # Ensure minimum quality threshold
-    min_bitrate = 500  # 500 kbps minimum
-    max_bitrate = 5000  # 5 Mbps maximum for reasonable quality
-    
-    return max(min_bitrate, min(max_bitrate, target_video_bitrate_kbps))
+    # Ensure minimum quality threshold (and 5 Mbps maximum for reasonable quality)
+    return max(MIN_VIDEO_BITRATE_KBPS, min(MAX_VIDEO_BITRATE_KBPS, target_video_bitrate_kbps))
+
+def predict_output_size_mb(duration, video_bitrate_kbps, audio_bitrate_kbps=192):
+    """Worst-case output size in MB for a capped-bitrate encode of the given duration."""
+    return (video_bitrate_kbps + audio_bitrate_kbps) * 1000 * duration / 8 / (1024 * 1024)
+
+def get_min_size_limit_mb(duration, audio_bitrate_kbps=192):
+    """
+    The smallest size limit calculate_target_bitrate can budget for without hitting
+    MIN_VIDEO_BITRATE_KBPS; tighter limits can't be met however often a clip is re-encoded.
+    """
+    return predict_output_size_mb(duration, MIN_VIDEO_BITRATE_KBPS / SIZE_SAFETY_MARGIN, audio_bitrate_kbps)
+
+# Audio: re-encoded to AAC at AUDIO_BITRATE_KBPS / 48 kHz, unless the source's audio can be
+# stream-copied: a single AAC track, mono or stereo, 44.1 or 48 kHz, with a known bitrate
+# no higher than the re-encode would use, going into a container that takes AAC
+AUDIO_BITRATE_KBPS = 192
+AUDIO_COPY_SAMPLE_RATES = (44100, 48000)
+AUDIO_COPY_FORMATS = ('mp4', 'mov', 'mkv')
+
+def can_copy_audio(audio, output_format, max_bitrate_kbps=AUDIO_BITRATE_KBPS) -> bool:
+    """Whether audio (get_video_info's 'audio') can go into output_format without re-encoding."""
+    return bool(
+        audio and audio['codec'] == 'aac' and audio.get('streams', 1) == 1
+        and 1 <= audio['channels'] <= 2 and audio['sample_rate'] in AUDIO_COPY_SAMPLE_RATES
+        and audio['bitrate_kbps'] and audio['bitrate_kbps'] <= max_bitrate_kbps
+        and output_format in AUDIO_COPY_FORMATS
+    )
+
+def get_audio_settings(audio, output_format, bitrate_kbps=AUDIO_BITRATE_KBPS) -> List[str]:
+    """Audio options for an output: none for silent sources, stream copy when compliant, else AAC."""
+    if not audio:
+        return ['-an']
+    if can_copy_audio(audio, output_format, bitrate_kbps):
+        return ['-c:a', 'copy']
+    return ['-c:a', 'aac', '-b:a', f'{bitrate_kbps}k', '-ar', '48000']
+
+def get_audio_bitrate_kbps(audio, output_format, bitrate_kbps=AUDIO_BITRATE_KBPS) -> float:
+    """Audio bitrate an output will carry (see get_audio_settings), for size budgets."""
+    if not audio:
+        return 0
+    if can_copy_audio(audio, output_format, bitrate_kbps):
+        return audio['bitrate_kbps']
+    return bitrate_kbps
+
+def get_output_audio(audio, output_format, bitrate_kbps=AUDIO_BITRATE_KBPS):
+    """The audio stream an output will carry (see get_audio_settings), as get_video_info would report it."""
+    if not audio or can_copy_audio(audio, output_format, bitrate_kbps):
+        return audio
+    return {'codec': 'aac', 'sample_rate': 48000, 'channels': audio['channels'], 'bitrate_kbps': bitrate_kbps,
+            'streams': 1}
+
+def get_thread_settings(encoder_threads) -> List[str]:
+    """Output options limiting an encode to its share of the CPU budget (empty when unlimited)."""
+    if not encoder_threads:
+        return []
+    return ['-threads', str(encoder_threads)]
 
-def reencode_to_target_size(input_path, output_path, target_size_mb, duration, system_info, output_codec='h264'):
+def estimate_canvas_height(video_info: dict) -> int:
+    """Approximate output canvas height for a clip (3:4 crop, 1.2x taller canvas)."""
+    crop_height = min(video_info['height'], video_info['width'] * 4 / 3)
+    return int(crop_height * 1.2)
+
+def plan_encoder_threads(video_infos: List[dict], total_threads: int = None, jobs: int = None,
+                         profile: dict = None) -> Tuple[int, int]:
+    """
+    Split a CPU budget between concurrent encodes so jobs x threads never exceeds it.
+
+    Every libx264 encode defaults to using all cores by itself, so N parallel jobs
+    would otherwise run N x N threads. x264 (and the filter graph) stop scaling
+    well beyond a few threads on small frames, so low-resolution batches get more
+    jobs with fewer threads each and 1080p+ batches fewer, wider jobs. Short clips
+    spend a larger share of their time in start-up, probing and muxing, which only
+    parallelise across jobs, so they shift the split further towards jobs.
+
+    Args:
+        video_infos: ffprobe info for the clips in the batch (None entries are ignored)
+        total_threads: CPU budget to share (defaults to CPU count)
+        jobs: Fixed number of jobs; only the threads per job are planned
+        profile: Delivery profile whose canvas and duration caps apply to the batch
+
+    Returns:
+        (jobs, threads_per_job)
+    """
+    total_threads = total_threads or os.cpu_count() or 1
+    infos = [info for info in video_infos if info]
+    clip_count = max(1, len(video_infos))
+
+    if jobs:
+        jobs = max(1, min(jobs, clip_count))
+        return jobs, max(1, total_threads // jobs)
+
+    if infos:
+        canvas_height = max(estimate_canvas_height(info) for info in infos)
+        average_duration = sum(get_profile_duration(info.get('duration', 0), profile) for info in infos) / len(infos)
+        if profile and profile['max_canvas_height']:
+            canvas_height = min(canvas_height, profile['max_canvas_height'])
+    else:
+        canvas_height, average_duration = 1080, 0
+
+    if canvas_height <= 640:
+        threads_per_job = 2
+    elif canvas_height <= 1296:
+        threads_per_job = 4
+    elif canvas_height <= 1728:
+        threads_per_job = 6
+    else:
+        threads_per_job = 8
+
+    if 0 < average_duration < 15:
+        threads_per_job = max(1, threads_per_job // 2)
+
+    jobs = max(1, min(clip_count, total_threads // threads_per_job))
+    return jobs, max(1, total_threads // jobs)
+
+def reencode_to_target_size(input_path, output_path, target_size_mb, duration, system_info, output_codec='h264',
+                            encoder_threads=None, on_progress=None, preset='slow', video_info=None):
     """
     Re-encode video to meet target file size using two-pass encoding for optimal quality.
     
@@ -220,14 +312,26 @@ def reencode_to_target_size(input_path, output_path, target_size_mb, duration, s
         duration: Video duration in seconds
         system_info: System capabilities info
         output_codec: Output codec to use
+        encoder_threads: Thread budget for both passes (None lets ffmpeg use every core)
+        on_progress: Progress callback for pass 2 (see run_ffmpeg_with_progress)
+        preset: x264 preset for both passes (tuned runs pass the clip's tuned preset)
+        video_info: Probe of the source the oversized video was encoded from; its audio
+            tells what the video carries (input_path is probed when not given)
     
     Returns:
         True if successful, False otherwise
     """
     print(f"   📦 Re-encoding to meet {target_size_mb} MB size limit...")
     
-    # Calculate target bitrate
-    audio_bitrate = 128  # Reduce audio bitrate for size-constrained encoding
+    # Calculate target bitrate. Audio is reduced to 128 kbps for size-constrained encoding,
+    # unless it is already AAC at or below that (then it is copied) or there is none
+    output_format = os.path.splitext(output_path)[1].lstrip('.').lower()
+    if video_info is not None:
+        audio = get_output_audio(video_info.get('audio'), output_format)
+    else:
+        audio = (get_video_info(input_path) or {}).get('audio')
+    audio_settings = get_audio_settings(audio, output_format, 128)
+    audio_bitrate = get_audio_bitrate_kbps(audio, output_format, 128)
     target_video_bitrate = calculate_target_bitrate(duration, target_size_mb, audio_bitrate)
     
     print(f"   🎯 Target video bitrate: {target_video_bitrate:.0f} kbps")
@@ -237,18 +341,27 @@ def reencode_to_target_size(input_path, output_path, target_size_mb, duration, s
     temp_dir = tempfile.mkdtemp()
     log_file = os.path.join(temp_dir, 'ffmpeg2pass')
     
+    # Keep the codec of the encode being resized; x265 takes its pass options through -x265-params
+    if output_codec == 'h265':
+        video_codec = ['-c:v', 'libx265', '-tag:v', 'hvc1']
+        pass_settings = lambda number: ['-x265-params', f'pass={number}:stats={log_file}']
+    else:
+        video_codec = ['-c:v', 'libx264']
+        pass_settings = lambda number: ['-pass', str(number), '-passlogfile', log_file]
+    
     try:
         # Pass 1: Analysis pass
         cmd_pass1 = [
             'ffmpeg',
+            *get_thread_settings(encoder_threads),
             '-i', input_path,
-            '-c:v', 'libx264',
+            *video_codec,
             '-b:v', f'{int(target_video_bitrate)}k',
             '-maxrate', f'{int(target_video_bitrate * 1.2)}k',
             '-bufsize', f'{int(target_video_bitrate * 2)}k',
-            '-preset', 'slow',  # Slower preset for better quality
-            '-pass', '1',
-            '-passlogfile', log_file,
+            '-preset', preset,
+            *pass_settings(1),
+            *get_thread_settings(encoder_threads),
             '-an',  # No audio in pass 1
             '-f', 'null',
             '-y',
@@ -256,7 +369,9 @@ def reencode_to_target_size(input_path, output_path, target_size_mb, duration, s
         ]
         
         print(f"   🔄 Pass 1/2: Analyzing video...")
-        success, _, _ = run_ffmpeg(cmd_pass1, log_success=False)
+        with metrics.stage('reencode_pass1', file=os.path.basename(output_path)) as event:
+            success, _, _ = run_ffmpeg(cmd_pass1, log_success=False)
+            event['ok'] = success
         
         if not success:
             print("   ❌ Pass 1 failed")
@@ -265,16 +380,16 @@ def reencode_to_target_size(input_path, output_path, target_size_mb, duration, s
         # Pass 2: Encoding pass
         cmd_pass2 = [
             'ffmpeg',
+            *get_thread_settings(encoder_threads),
             '-i', input_path,
-            '-c:v', 'libx264',
+            *video_codec,
             '-b:v', f'{int(target_video_bitrate)}k',
             '-maxrate', f'{int(target_video_bitrate * 1.2)}k',
             '-bufsize', f'{int(target_video_bitrate * 2)}k',
-            '-preset', 'slow',
-            '-pass', '2',
-            '-passlogfile', log_file,
-            '-c:a', 'aac',
-            '-b:a', f'{audio_bitrate}k',
+            '-preset', preset,
+            *pass_settings(2),
+            *get_thread_settings(encoder_threads),
+            *audio_settings,
             '-movflags', '+faststart',
             '-y',
             output_path
@@ -282,7 +397,11 @@ def reencode_to_target_size(input_path, output_path, target_size_mb, duration, s
         
         print(f"   🔄 Pass 2/2: Encoding with optimal settings...")
         start_time = time.time()
-        success, stderr_lines = run_ffmpeg_with_progress(cmd_pass2, os.path.basename(output_path), duration, start_time)
+        with metrics.stage('reencode_pass2', file=os.path.basename(output_path), media_seconds=duration) as event:
+            success, stderr_lines = run_ffmpeg_with_progress(
+                cmd_pass2, os.path.basename(output_path), duration, start_time, on_progress
+            )
+            event['ok'] = success
         
         if not success:
             print("   ❌ Pass 2 failed")
@@ -301,7 +420,8 @@ def reencode_to_target_size(input_path, output_path, target_size_mb, duration, s
         except Exception:
             pass
 
-def enforce_size_limit(output_path, target_size_mb, duration, system_info, output_codec='h264'):
+def enforce_size_limit(output_path, target_size_mb, duration, system_info, output_codec='h264', encoder_threads=None,
+                       on_progress=None, preset='slow', video_info=None):
     """
     Check output file size and re-encode if it exceeds the limit.
     
@@ -311,6 +431,10 @@ def enforce_size_limit(output_path, target_size_mb, duration, system_info, outpu
         duration: Video duration in seconds
         system_info: System capabilities info
         output_codec: Output codec used
+        encoder_threads: Thread budget for any re-encode
+        on_progress: Progress callback for any re-encode (see run_ffmpeg_with_progress)
+        preset: x264 preset for any re-encode
+        video_info: Probe of the source output_path was encoded from (see reencode_to_target_size)
     
     Returns:
         True if file is within limit (or successfully re-encoded), False otherwise
@@ -340,7 +464,11 @@ def enforce_size_limit(output_path, target_size_mb, duration, system_info, outpu
             target_size_mb, 
             duration, 
             system_info, 
-            output_codec
+            output_codec,
+            encoder_threads,
+            on_progress,
+            preset,
+            video_info
         )
         
         if success:
@@ -352,15 +480,18 @@ def enforce_size_limit(output_path, target_size_mb, duration, system_info, outpu
             else:
                 print(f"   ⚠️  Size still exceeds limit: {final_size:.2f} MB")
                 # Try one more time with even lower bitrate
-                target_video_bitrate = calculate_target_bitrate(duration, target_size_mb * 0.95, 128)
-                print(f"   🔄 Attempting aggressive re-encode with {target_video_bitrate:.0f} kbps...")
+                print(f"   🔄 Attempting aggressive re-encode at 95% of the limit...")
                 success = reencode_to_target_size(
                     temp_input, 
                     output_path, 
                     target_size_mb * 0.95,  # Target 95% of limit for safety
                     duration, 
                     system_info, 
-                    output_codec
+                    output_codec,
+                    encoder_threads,
+                    on_progress,
+                    preset,
+                    video_info
                 )
                 final_size = get_file_size_mb(output_path)
                 print(f"   📊 Final size after aggressive re-encode: {final_size:.2f} MB")
@@ -377,12 +508,16 @@ def enforce_size_limit(output_path, target_size_mb, duration, system_info, outpu
             pass
 
 def get_video_info(video_path):
-    """Get video information using ffprobe."""
+    """
+    Get video information using ffprobe: the first video stream, plus 'audio' for
+    the first audio stream ({'codec', 'sample_rate', 'channels', 'bitrate_kbps'
+    (None if unknown), 'streams'}) or None for silent files.
+    """
     cmd = [
         'ffprobe',
         '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height,codec_name,duration,r_frame_rate',
+        '-show_entries',
+        'stream=codec_type,width,height,codec_name,duration,r_frame_rate,sample_rate,channels,bit_rate',
         '-of', 'json',
         video_path
     ]
@@ -390,18 +525,31 @@ def get_video_info(video_path):
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, check=True)
         info = json.loads(result.stdout)
-        stream = info['streams'][0]
+        stream = next(s for s in info['streams'] if s.get('codec_type') == 'video')
+        audio_streams = [s for s in info['streams'] if s.get('codec_type') == 'audio']
         
         # Parse frame rate
         fps_parts = stream['r_frame_rate'].split('/')
         fps = float(fps_parts[0]) / float(fps_parts[1]) if len(fps_parts) == 2 else float(fps_parts[0])
         
+        audio = None
+        if audio_streams:
+            bit_rate = audio_streams[0].get('bit_rate')
+            audio = {
+                'codec': audio_streams[0].get('codec_name'),
+                'sample_rate': int(audio_streams[0].get('sample_rate') or 0),
+                'channels': int(audio_streams[0].get('channels') or 0),
+                'bitrate_kbps': int(bit_rate) / 1000 if bit_rate and bit_rate != 'N/A' else None,
+                'streams': len(audio_streams),
+            }
+        
         return {
             'width': int(stream['width']),
             'height': int(stream['height']),
             'codec': stream['codec_name'],
             'duration': float(stream.get('duration', 0)),
-            'fps': fps
+            'fps': fps,
+            'audio': audio
         }
     except subprocess.CalledProcessError as e:
         print(f"Error getting video info: {e}")
@@ -410,6 +558,80 @@ def get_video_info(video_path):
         print(f"Unexpected error: {e}")
         return None
 
+# The metadata index lives in a cache directory, not in the input folders it describes
+VIDEO_INFO_CACHE_FILE = 'video_info_cache.json'
+VIDEO_INFO_CACHE_VERSION = 2
+VIDEO_INFO_CACHE_DIR = os.environ.get('SPOTLIGHT_CACHE_DIR')
+DEFAULT_VIDEO_INFO_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'spotlight_cache')
+
+def _video_info_cache_path(cache_dir=None):
+    return os.path.join(cache_dir or VIDEO_INFO_CACHE_DIR or DEFAULT_VIDEO_INFO_CACHE_DIR, VIDEO_INFO_CACHE_FILE)
+
+def load_video_info_cache(cache_path) -> Dict[str, dict]:
+    """Load the ffprobe metadata index, returning an empty one if it is missing or stale."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == VIDEO_INFO_CACHE_VERSION:
+            return data.get('entries', {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+def save_video_info_cache(cache_path, entries: Dict[str, dict]):
+    """Write the metadata index atomically, dropping entries for files that no longer exist."""
+    entries = {path: entry for path, entry in entries.items() if os.path.exists(path)}
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': VIDEO_INFO_CACHE_VERSION, 'entries': entries}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️  Could not save video info cache: {e}", file=sys.stderr)
+
+def get_video_infos(video_paths: List[str], jobs: int = 8, cache_dir: str = None) -> Dict[str, dict]:
+    """
+    Get video information for many files, reusing the on-disk metadata index in
+    cache_dir (defaults to $SPOTLIGHT_CACHE_DIR or a spotlight_cache temp directory).
+
+    Files whose path, size and mtime match the index skip ffprobe entirely; the
+    rest are probed concurrently and added to the index.
+    Returns {video_path: info or None}.
+    """
+    cache_path = _video_info_cache_path(cache_dir)
+    entries = load_video_info_cache(cache_path)
+    results = {}
+    to_probe = []
+    for video_path in video_paths:
+        key = os.path.abspath(video_path)
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            results[video_path] = None
+            continue
+        entry = entries.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            results[video_path] = entry['info']
+        else:
+            to_probe.append((video_path, key, stat))
+
+    if not to_probe:
+        return results
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(jobs, len(to_probe)))) as executor:
+        probed = executor.map(lambda item: get_video_info(item[0]), to_probe)
+        for (video_path, key, stat), info in zip(to_probe, probed):
+            results[video_path] = info
+            if info:
+                entries[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'info': info}
+    save_video_info_cache(cache_path, entries)
+    return results
+
+def get_video_info_cached(video_path, cache_dir: str = None):
+    """Get video information for one file through the on-disk metadata index."""
+    return get_video_infos([video_path], cache_dir=cache_dir).get(video_path)
+
 def detect_system() -> Dict[str, any]:
     """Detect system information and capabilities."""
     system_info = {
@@ -428,33 +650,50 @@ def detect_system() -> Dict[str, any]:
     
     return system_info
 
-def check_hardware_encoders(system_info: Dict[str, any]) -> Dict[str, any]:
-    """Check available hardware encoders."""
-    if not system_info['is_macos']:
-        return system_info
-    
-    # Check for VideoToolbox encoders using run_ffmpeg
-    success, stderr_output, stdout_output = run_ffmpeg(['ffmpeg', '-encoders'], log_success=False)
-    
-    if success:
-        hw_encoders = []
-        if 'h264_videotoolbox' in stdout_output:
-            hw_encoders.append('h264_videotoolbox')
-        if 'hevc_videotoolbox' in stdout_output:
-            hw_encoders.append('hevc_videotoolbox')
-        if 'prores_videotoolbox' in stdout_output:
-            hw_encoders.append('prores_videotoolbox')
-        
-        system_info['available_hw_encoders'] = hw_encoders
-        system_info['has_videotoolbox'] = len(hw_encoders) > 0
-        
-        if system_info['has_videotoolbox']:
-            print(f"✅ Hardware acceleration available: {', '.join(hw_encoders)}")
+# Output codecs whose encoder backends are probed up front
+PROBED_CODECS = ('h264', 'h265', 'prores')
+
+def check_hardware_encoders(system_info: Dict[str, any], ffmpeg_bin: str = 'ffmpeg') -> Dict[str, any]:
+    """
+    Check which hardware encoders actually work (VideoToolbox, NVENC, Quick Sync,
+    VAAPI): each one ffmpeg lists is confirmed with a short test encode (see encoders.py).
+    
+    Adds 'encoder_backends' ({codec: [backend names, fastest first, ending in software]})
+    and fills 'available_hw_encoders' / 'has_videotoolbox'.
+    
+    VideoToolbox is only kept on Apple Silicon, the one case get_optimal_codec_settings
+    has VideoToolbox settings for; elsewhere it would encode with libx264 under its name.
+    """
+    backends = {
+        codec: [
+            name for name in encoders.probe_backends(codec, ffmpeg_bin, system_info['platform'])
+            if name != 'videotoolbox' or system_info['is_apple_silicon']
+        ]
+        for codec in PROBED_CODECS
+    }
+    hw_encoders = [
+        encoders.get_backend(name)['encoders'][codec]
+        for codec, names in backends.items() for name in names if name != encoders.SOFTWARE
+    ]
+    
+    system_info['encoder_backends'] = backends
+    system_info['available_hw_encoders'] = hw_encoders
+    system_info['has_videotoolbox'] = any('videotoolbox' in encoder for encoder in hw_encoders)
+    
+    if hw_encoders:
+        print(f"✅ Hardware acceleration available: {', '.join(hw_encoders)}")
     
     return system_info
 
+# Set once ffmpeg/ffprobe have been found, so long-lived callers only check once
+_ffmpeg_available = False
+
 def check_ffmpeg_installed():
     """Check if ffmpeg and ffprobe are installed."""
+    global _ffmpeg_available
+    if _ffmpeg_available:
+        return True
+
     # Check ffmpeg
     success, stderr_output, stdout_output = run_ffmpeg(['ffmpeg', '-version'], log_success=False)
     if not success:
@@ -468,6 +707,7 @@ def check_ffmpeg_installed():
     # Check ffprobe
     try:
         subprocess.run(['ffprobe', '-version'], capture_output=True, text=True, check=True)
+        _ffmpeg_available = True
         return True
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("Error: ffprobe must be installed to use this script.")
@@ -490,47 +730,43 @@ def format_time(seconds):
     else:
         return f"{secs}s"
 
-def parse_progress(line, total_duration):
-    """Parse ffmpeg progress output and return progress info."""
-    # When using -progress pipe:1, ffmpeg outputs key=value pairs
-    # We need to look for lines that start with "out_time_ms="
-    if line.startswith('out_time_ms='):
-        try:
-            # Extract microseconds and convert to seconds
-            time_ms = int(line.split('=')[1])
-            current_time = time_ms / 1000000.0  # Convert microseconds to seconds
-            
-            if total_duration > 0:
-                # Calculate percentage
-                percentage = (current_time / total_duration) * 100
-                percentage = min(percentage, 100)  # Cap at 100%
-                
-                return {
-                    'current_time': current_time,
-                    'percentage': percentage,
-                    'total_duration': total_duration
-                }
-        except (ValueError, IndexError):
-            pass
-    
-    # Also try the standard time format as fallback
-    time_match = re.search(r'time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})', line)
-    if time_match and total_duration > 0:
-        hours = int(time_match.group(1))
-        minutes = int(time_match.group(2))
-        seconds = int(time_match.group(3))
-        current_time = hours * 3600 + minutes * 60 + seconds
-        
-        # Calculate percentage
-        percentage = (current_time / total_duration) * 100
-        percentage = min(percentage, 100)  # Cap at 100%
-        
-        return {
-            'current_time': current_time,
-            'percentage': percentage,
-            'total_duration': total_duration
-        }
-    return None
+def _progress_number(value, suffix=''):
+    """A number from an ffmpeg progress value such as '1.02x' or '2310.4kbits/s' (None for 'N/A' or missing)."""
+    if value is None:
+        return None
+    try:
+        return float(value[:-len(suffix)] if suffix and value.endswith(suffix) else value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_progress(fields, total_duration):
+    """
+    Turn one block of ffmpeg -progress key=value pairs into a progress event:
+        frame, fps, speed (x realtime), out_time (seconds), bitrate_kbps,
+        total_size (bytes), percentage (None when the duration is unknown),
+        done (True on the final block)
+    Values ffmpeg reports as N/A are None.
+    """
+    # out_time_ms is in microseconds too; newer ffmpeg builds also write out_time_us
+    out_time_us = _progress_number(fields.get('out_time_us', fields.get('out_time_ms')))
+    out_time = max(0.0, out_time_us / 1000000.0) if out_time_us is not None else None
+    frame = _progress_number(fields.get('frame'))
+    total_size = _progress_number(fields.get('total_size'))
+    
+    percentage = None
+    if total_duration > 0 and out_time is not None:
+        percentage = min(out_time / total_duration * 100, 100)  # Cap at 100%
+    
+    return {
+        'frame': int(frame) if frame is not None else None,
+        'fps': _progress_number(fields.get('fps')),
+        'speed': _progress_number(fields.get('speed'), 'x'),
+        'out_time': out_time,
+        'bitrate_kbps': _progress_number(fields.get('bitrate'), 'kbits/s'),
+        'total_size': int(total_size) if total_size is not None else None,
+        'percentage': percentage,
+        'done': fields.get('progress') == 'end',
+    }
 
 def display_progress(filename, percentage, elapsed_time, total_duration, current_time):
     """Display progress bar with time information."""
@@ -558,6 +794,132 @@ def display_progress(filename, percentage, elapsed_time, total_duration, current
     sys.stdout.write(progress_line)
     sys.stdout.flush()
 
+def get_output_path(output_folder: str, filename: str, output_format: str) -> str:
+    """Path of the processed video for an input filename."""
+    return os.path.join(output_folder, os.path.splitext(filename)[0] + f".{output_format}")
+
+def get_partial_output_path(output_path: str) -> str:
+    """
+    Hidden temp path an encode is written to before being renamed over output_path,
+    so output folders never contain a half-written video.
+    """
+    folder, name = os.path.split(output_path)
+    base, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{base}.partial{ext}")
+
+# Temp folder per segmented encode (see encode_in_segments)
+SEGMENT_DIR_PREFIX = '.segments_'
+
+def cleanup_partial_outputs(output_folder: str) -> int:
+    """Remove temp outputs left behind by an interrupted run. Returns how many were removed."""
+    removed = 0
+    if os.path.isdir(output_folder):
+        for name in os.listdir(output_folder):
+            if name.startswith(SEGMENT_DIR_PREFIX):
+                shutil.rmtree(os.path.join(output_folder, name), ignore_errors=True)
+                removed += 1
+            elif name.startswith('.') and '.partial.' in name:
+                try:
+                    os.remove(os.path.join(output_folder, name))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+# Delivery profiles (--profile): caps applied in the filter graph before compositing.
+# max_canvas_height scales the crop down so the 3:4 canvas fits; max_fps drops frames
+# from faster sources; max_duration trims longer clips. None means no cap.
+DELIVERY_PROFILES = {
+    'hd': {'max_canvas_height': 1920, 'max_fps': 30, 'max_duration': None},
+    'web': {'max_canvas_height': 1280, 'max_fps': 30, 'max_duration': 180},
+    'story': {'max_canvas_height': 1280, 'max_fps': 30, 'max_duration': 60},
+}
+
+def get_profile_duration(duration, profile: dict = None):
+    """Output duration of a clip under a delivery profile's max_duration."""
+    if profile and profile['max_duration'] and duration:
+        return min(duration, profile['max_duration'])
+    return duration
+
+def get_build_params(output_codec: str, output_format: str, max_output_size_mb: float, single_pass: bool,
+                     tuned: bool = False, segmented: bool = False, profile: str = None, roi: bool = False) -> dict:
+    """Everything besides the input that determines an output video (recorded in the build manifest)."""
+    params = {
+        'aspect_ratio': '3:4',
+        'radius_ratio': 16 / 360,
+        'border_ratio': 2 / 360,
+        'canvas_scale': 1.2,
+        'codec': output_codec,
+        'format': output_format,
+        'max_output_size_mb': max_output_size_mb,
+        'single_pass': single_pass,
+    }
+    # Only recorded when set, so outputs built before tuning existed stay up to date
+    if tuned:
+        params['tuned'] = True
+    if segmented:
+        params['segmented'] = True
+    if profile:
+        params['profile'] = dict(DELIVERY_PROFILES[profile], name=profile)
+    if roi:
+        params['roi'] = STATIC_ROI_QOFFSET
+    return params
+
+# Delivery variants for --renditions, all encoded from one composite by one ffmpeg
+# (see encode_renditions). codec/format None use the run's; max_height scales the
+# canvas down (3:4 kept) and never up, so on canvases already within it 'mobile' only
+# differs from 'full' by codec and size limit. max_output_size_mb None uses the run's size limit; a rendition's own
+# limit grows with the clip where the minimum bitrate can't fit it (get_min_size_limit_mb).
+RENDITIONS = {
+    'full': {'codec': None, 'format': None, 'max_height': None, 'max_output_size_mb': None, 'suffix': ''},
+    'mobile': {'codec': 'h264', 'format': 'mp4', 'max_height': 640, 'max_output_size_mb': 4, 'suffix': '_mobile'},
+    'hevc': {'codec': 'h265', 'format': 'mp4', 'max_height': None, 'max_output_size_mb': None, 'suffix': '_hevc'},
+}
+
+def get_rendition_outputs(output_folder: str, filename: str, renditions: List[str], output_codec: str,
+                          output_format: str, max_output_size_mb: float, single_pass: bool,
+                          profile: str = None, roi: bool = False) -> List[dict]:
+    """
+    One entry per rendition name: its codec, format, max_height and size limit with
+    the run's defaults filled in, plus output_path and the build params recorded
+    for it in the manifest. 'full' is written to the usual output path.
+    """
+    outputs = []
+    for name in renditions:
+        rendition = RENDITIONS[name]
+        codec = rendition['codec'] or output_codec
+        file_format = rendition['format'] or output_format
+        max_mb = rendition['max_output_size_mb'] or max_output_size_mb
+        base = os.path.splitext(filename)[0] + rendition['suffix']
+        params = get_build_params(codec, file_format, max_mb, single_pass, profile=profile, roi=roi)
+        params['rendition'] = name
+        if rendition['max_height']:
+            params['max_height'] = rendition['max_height']
+        outputs.append({
+            'name': name,
+            'codec': codec,
+            'format': file_format,
+            'max_height': rendition['max_height'],
+            'max_output_size_mb': max_mb,
+            'own_size_limit': rendition['max_output_size_mb'] is not None,
+            'output_path': os.path.join(output_folder, f"{base}.{file_format}"),
+            'build_params': params,
+        })
+    return outputs
+
+def get_manifest_targets(output_folder: str, filename: str, output_codec: str, output_format: str,
+                         max_output_size_mb: float, single_pass: bool, build_params: dict,
+                         renditions: List[str] = None, profile: str = None,
+                         roi: bool = False) -> List[Tuple[str, dict]]:
+    """(output_path, build_params) for every output a video produces, as checked and recorded in the manifest."""
+    if renditions:
+        return [
+            (output['output_path'], output['build_params'])
+            for output in get_rendition_outputs(output_folder, filename, renditions, output_codec, output_format,
+                                                max_output_size_mb, single_pass, profile, roi)
+        ]
+    return [(get_output_path(output_folder, filename, output_format), build_params)]
+
 def get_video_files(folder: str) -> List[Tuple[str, str]]:
     """Get all video files in a folder with their full paths."""
     allowed_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v', '.mpg', '.mpeg')
@@ -590,9 +952,10 @@ def display_video_menu(video_files: List[Tuple[str, str]]) -> List[int]:
     print("-"*60)
     
     # Display videos with numbers
+    video_infos = get_video_infos([path for _, path in video_files])
     for i, (filename, _) in enumerate(video_files, 1):
         # Get video info for display
-        video_info = get_video_info(video_files[i-1][1])
+        video_info = video_infos.get(video_files[i-1][1])
         if video_info:
             duration = f"{video_info['duration']:.1f}s" if video_info['duration'] > 0 else "N/A"
             resolution = f"{video_info['width']}x{video_info['height']}"
@@ -654,28 +1017,59 @@ def confirm_selection(video_files: List[Tuple[str, str]], selected_indices: List
     confirmation = input("\nProceed with processing? (y/n): ").strip().lower()
     return confirmation == 'y'
 
-def get_optimal_codec_settings(system_info: Dict[str, any], output_codec: str, video_info: dict = None) -> List[str]:
-    """Get optimal codec settings based on system capabilities and output format."""
+def get_bitrate_cap_settings(target_bitrate_kbps) -> List[str]:
+    """VBV settings that cap a CRF encode at the given bitrate (empty when there is no cap)."""
+    if not target_bitrate_kbps:
+        return []
+    return [
+        '-maxrate', f'{int(target_bitrate_kbps)}k',
+        '-bufsize', f'{int(target_bitrate_kbps * 2)}k'
+    ]
+
+def get_optimal_codec_settings(system_info: Dict[str, any], output_codec: str, video_info: dict = None,
+                               target_bitrate_kbps: float = None, backend: dict = None,
+                               encode_tuning: dict = None) -> List[str]:
+    """
+    Get optimal codec settings based on system capabilities and output format.
+
+    When target_bitrate_kbps is given, the encode is capped at that bitrate so the
+    output lands under the size limit without a separate re-encode.
+
+    backend is the encoder backend picked by encoders.select_backend; NVENC, Quick
+    Sync and VAAPI use their own settings from encoders.py.
+
+    encode_tuning ({'preset', 'crf'}, see tuning.plan_encode) replaces the default
+    x264/x265 preset and CRF.
+    """
     codec_settings = []
+    preset = encode_tuning['preset'] if encode_tuning else 'medium'
+    crf = encode_tuning['crf'] if encode_tuning else 18
     
     # Determine the actual encoder to use
-    if system_info['is_apple_silicon'] and system_info['has_videotoolbox']:
+    if backend is not None and backend['args'] is not None:
+        codec_settings.extend(encoders.encoder_args(backend, output_codec, target_bitrate_kbps))
+        if output_codec == 'h264':
+            codec_settings.extend(['-profile:v', 'high'])
+        print(f"🚀 Using hardware acceleration: {codec_settings[1]}")
+    elif system_info['is_apple_silicon'] and system_info['has_videotoolbox']:
         if output_codec == 'h264' and 'h264_videotoolbox' in system_info['available_hw_encoders']:
             codec_settings.extend(['-c:v', 'h264_videotoolbox'])
             # VideoToolbox specific settings
             # Use more conservative bitrate settings for stability
+            hw_bitrate = f'{int(min(3000, target_bitrate_kbps))}k' if target_bitrate_kbps else '3M'
             codec_settings.extend([
-                '-b:v', '3M',          # Target bitrate 3 Mbps (reduced for stability)
+                '-b:v', hw_bitrate,    # Target bitrate 3 Mbps (reduced for stability)
                 '-profile:v', 'main',  # Main profile for better compatibility
                 '-allow_sw', '1'       # Allow software fallback
             ])
             print("🚀 Using hardware acceleration: h264_videotoolbox")
         elif output_codec == 'h265' and 'hevc_videotoolbox' in system_info['available_hw_encoders']:
             codec_settings.extend(['-c:v', 'hevc_videotoolbox'])
+            hw_bitrate_kbps = min(3000, target_bitrate_kbps) if target_bitrate_kbps else 3000
             codec_settings.extend([
-                '-b:v', '3M',          # HEVC is more efficient, lower bitrate
-                '-maxrate', '4M',
-                '-bufsize', '6M',
+                '-b:v', f'{int(hw_bitrate_kbps)}k',  # HEVC is more efficient, lower bitrate
+                '-maxrate', f'{int(hw_bitrate_kbps * 4 / 3)}k',
+                '-bufsize', f'{int(hw_bitrate_kbps * 2)}k',
                 '-profile:v', 'main',
                 '-tag:v', 'hvc1',      # Better compatibility
                 '-allow_sw', '1'
@@ -691,28 +1085,30 @@ def get_optimal_codec_settings(system_info: Dict[str, any], output_codec: str, v
         else:
             # Fallback to software encoding
             codec_settings.extend(['-c:v', f'lib{output_codec}' if output_codec in ['x264', 'x265'] else output_codec])
-            codec_settings.extend(['-preset', 'medium', '-crf', '18'])
+            codec_settings.extend(['-preset', preset, '-crf', str(crf)])
+            codec_settings.extend(get_bitrate_cap_settings(target_bitrate_kbps))
             print(f"⚠️  Hardware acceleration not available for {output_codec}, using software encoding")
     else:
         # Non-Apple Silicon or VideoToolbox not available
         if output_codec == 'h264':
             codec_settings.extend(['-c:v', 'libx264'])
             codec_settings.extend([
-                '-preset', 'medium',
-                '-crf', '18',
+                '-preset', preset,
+                '-crf', str(crf),
                 '-profile:v', 'high',
                 '-level', '4.1'
             ])
         elif output_codec == 'h265':
             codec_settings.extend(['-c:v', 'libx265'])
             codec_settings.extend([
-                '-preset', 'medium',
-                '-crf', '20',
+                '-preset', preset,
+                '-crf', str(crf + 2),
                 '-tag:v', 'hvc1'
             ])
         else:
             codec_settings.extend(['-c:v', output_codec])
-            codec_settings.extend(['-preset', 'medium', '-crf', '18'])
+            codec_settings.extend(['-preset', preset, '-crf', str(crf)])
+        codec_settings.extend(get_bitrate_cap_settings(target_bitrate_kbps))
         print(f"ℹ️  Using software encoding: {codec_settings[1]}")
     
     # Pixel format is handled in the filter chain (format=yuv420p)
@@ -723,8 +1119,413 @@ def get_optimal_codec_settings(system_info: Dict[str, any], output_codec: str, v
     
     return codec_settings
 
+# Regions are shrunk to whole macroblocks, so no block that holds video is affected
+ROI_BLOCK_SIZE = 16
+
+def get_static_regions(canvas_width: int, canvas_height: int, paste_x: int, paste_y: int,
+                       content_width: int, content_height: int) -> List[Tuple[int, int, int, int]]:
+    """
+    (x, y, width, height) of the static canvas around the bordered video (content_width
+    x content_height at paste_x, paste_y): the bands below, above, left and right of it.
+    """
+    block = ROI_BLOCK_SIZE
+    # Block-aligned bounds of the bordered video, rounded outwards
+    top = paste_y // block * block
+    bottom = -(-(paste_y + content_height) // block) * block
+    left = paste_x // block * block
+    right = -(-(paste_x + content_width) // block) * block
+    regions = [
+        (0, bottom, canvas_width, canvas_height - bottom),
+        (0, 0, canvas_width, top),
+        (0, top, left, min(bottom, canvas_height) - top),
+        (right, top, canvas_width - right, min(bottom, canvas_height) - top),
+    ]
+    return [(x, y, w, h) for x, y, w, h in regions if w >= block and h >= block]
+
+def scale_regions(regions, scale_x: float, scale_y: float) -> List[Tuple[int, int, int, int]]:
+    """Regions scaled with the frame, shrunk to the whole blocks that stay inside them."""
+    block = ROI_BLOCK_SIZE
+    scaled = []
+    for x, y, w, h in regions:
+        left = math.ceil(x * scale_x / block) * block
+        top = math.ceil(y * scale_y / block) * block
+        right = math.floor((x + w) * scale_x / block) * block
+        bottom = math.floor((y + h) * scale_y / block) * block
+        if right - left >= block and bottom - top >= block:
+            scaled.append((left, top, right - left, bottom - top))
+    return scaled
+
+def yuv_composite_fits(border_size: int, paste_x: int, paste_y: int) -> bool:
+    """Whether build_yuv_composite_filter can place the video: on the 4:2:0 chroma grid (even offsets)."""
+    return (paste_x + border_size) % 2 == 0 and (paste_y + border_size) % 2 == 0
+
+def align_paste_position(paste: int, border_size: int, slack: int) -> int:
+    """
+    Move a paste position by one pixel, within 0..slack (canvas minus content), so
+    the video inside the border starts on an even offset (see yuv_composite_fits).
+    Returns paste unchanged when it already does or there is no room.
+    """
+    if (paste + border_size) % 2 == 0:
+        return paste
+    if paste + 1 <= slack:
+        return paste + 1
+    return paste - 1 if paste >= 1 else paste
+
+def build_yuv_composite_filter(crop_width: int, crop_height: int, crop_x: int, crop_y: int, border_size: int,
+                               canvas_width: int, canvas_height: int, paste_x: int, paste_y: int,
+                               radius: int, pix_fmt: str = 'yuv420p', canvas_rate: str = None,
+                               scale_size: Tuple[int, int] = None,
+                               static_regions: List[Tuple[int, int, int, int]] = None) -> str:
+    """
+    Build the same spotlight composite as build_composite_filter without taking
+    whole frames through RGBA and alpha blending: the crop stays in YUV 4:2:0 and is
+    padded straight onto the black canvas, the straight edges of the border are
+    filled with drawbox, and only the four rounded corners are alpha-blended, from
+    the corner tiles (input 1: overlays.get_corner_tiles for the outer radius and
+    this paste position's parity). The composited stream is labelled [final].
+
+    pad only places the video on the chroma grid, so paste_x + border_size and
+    paste_y + border_size must be even (see yuv_composite_fits / align_paste_position).
+    Unlike the RGBA graph, whose overlays round odd positions down, the border is
+    drawn exactly at paste_x, paste_y.
+
+    The video drives the graph, so it ends exactly when the source does; canvas_rate
+    (the source rate, or the delivery profile's lower rate) is applied with fps at
+    the start, as build_composite_filter's canvas would. The corner tiles are a
+    single-frame input held by the overlays.
+    """
+    content_width = (scale_size[0] if scale_size else crop_width) + border_size * 2
+    content_height = (scale_size[1] if scale_size else crop_height) + border_size * 2
+    rate = f"fps={canvas_rate}," if canvas_rate else ""
+    scale = f",scale={scale_size[0]}:{scale_size[1]}" if scale_size else ""
+    roi = f"{build_roi_filters(static_regions)}," if static_regions else ""
+    edges = (
+        (paste_x, paste_y, content_width, border_size),
+        (paste_x, paste_y + content_height - border_size, content_width, border_size),
+        (paste_x, paste_y + border_size, border_size, content_height - border_size * 2),
+        (paste_x + content_width - border_size, paste_y + border_size, border_size, content_height - border_size * 2),
+    )
+    border = ','.join(f"drawbox=x={x}:y={y}:w={w}:h={h}:color=0x808080:t=fill" for x, y, w, h in edges)
+    tile = get_corner_tile_size(radius)
+    offsets = get_corner_tile_offsets(content_width, content_height, radius, (paste_x % 2, paste_y % 2))
+    graph = [
+        f"[0:v]{rate}crop={crop_width}:{crop_height}:{crop_x}:{crop_y}{scale},format=yuv420p,"
+        f"pad={canvas_width}:{canvas_height}:{paste_x + border_size}:{paste_y + border_size}:color=black,"
+        f"{border}[framed0]",
+        f"[1:v]format=yuva420p,split=4" + ''.join(f"[tiles{k}]" for k in range(4)),
+    ]
+    for k, (x, y) in enumerate(offsets):
+        graph.append(f"[tiles{k}]crop={tile}:{tile}:{k % 2 * tile}:{k // 2 * tile}[corner{k}]")
+        tail = f",{roi}format={pix_fmt}[final]" if k == 3 else f"[framed{k + 1}]"
+        graph.append(f"[framed{k}][corner{k}]overlay={paste_x + x}:{paste_y + y}{tail}")
+    return ';'.join(graph)
+
+def get_canvas_rate(fps) -> str:
+    """
+    The source frame rate as an exact ffmpeg rational, or None. NTSC rates (23.976,
+    29.97, 59.94) come back as n/1001 even when rounded, since a canvas running
+    even slightly slower than the source drops its last frame.
+    """
+    if not fps or fps <= 0:
+        return None
+    ntsc = round(fps * 1.001)
+    if abs(fps - ntsc / 1.001) < 0.005:
+        return f"{ntsc * 1000}/1001"
+    rate = Fraction(fps).limit_denominator(1001)
+    return f"{rate.numerator}/{rate.denominator}"
+
+def measure_sample_encode(build_command, backend, window, partial_path):
+    """
+    Encode the sample window through the real filter graph at tuning.BASE_PRESET /
+    BASE_CRF and return {'speed', 'video_kbps'}, or None if the encode failed.
+    """
+    root, ext = os.path.splitext(partial_path)
+    sample_path = f"{root}.sample{ext}"
+    cmd = build_command(backend, {'preset': tuning.BASE_PRESET, 'crf': tuning.BASE_CRF}, window, sample_path)
+    try:
+        start_time = time.time()
+        success, _, _ = run_ffmpeg(cmd, log_success=False)
+        elapsed = time.time() - start_time
+        if not success or elapsed <= 0 or not os.path.exists(sample_path):
+            return None
+        return {
+            'speed': window[1] / elapsed,
+            'video_kbps': os.path.getsize(sample_path) * 8 / 1000 / window[1],
+        }
+    finally:
+        if os.path.exists(sample_path):
+            os.remove(sample_path)
+
+# Segment-parallel encoding (--segments): clips at least this long are split at keyframes
+SEGMENT_MIN_DURATION = 60
+# Shortest segment worth an ffmpeg process of its own
+SEGMENT_MIN_SECONDS = 10
+
+def split_at_keyframes(video_path, segment_dir, segment_seconds, trim_args=()):
+    """
+    Split the video stream of video_path into segments of about segment_seconds with
+    the segment muxer (stream copy, so cuts land on the next keyframe). NUT keeps the
+    source timestamps exact. trim_args are input options such as ['-t', '60'].
+    Returns [(path, duration)] or None if ffmpeg failed.
+    """
+    list_path = os.path.join(segment_dir, 'segments.csv')
+    cmd = [
+        'ffmpeg',
+        *trim_args,
+        '-i', video_path,
+        '-map', '0:v:0',
+        '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', f'{segment_seconds:.3f}',
+        '-segment_format', 'nut',
+        '-segment_list', list_path,
+        '-segment_list_type', 'csv',
+        '-reset_timestamps', '1',
+        '-y', os.path.join(segment_dir, 'source_%04d.nut')
+    ]
+    success, _, _ = run_ffmpeg(cmd, log_success=False)
+    if not success:
+        return None
+    segments = []
+    with open(list_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            # filename,start,end
+            name, start, end = line.strip().rsplit(',', 2)
+            segments.append((os.path.join(segment_dir, name), float(end) - float(start)))
+    return segments
+
+# Containers the segment join writes with the moov atom up front
+FASTSTART_EXTENSIONS = ('.mp4', '.mov', '.m4v')
+
+def encode_in_segments(build_command, backend, video_path, partial_path, duration, segment_jobs,
+                       video_kbps, encoder_threads, filename, start_time, on_progress=None, encode_tuning=None,
+                       trim_args=(), audio_settings=None):
+    """
+    Encode video_path through the composite graph as parallel segments and join them.
+
+    The video is split at keyframes into about segment_jobs segments, each encoded
+    (without audio) by its own ffmpeg with an even share of encoder_threads. Every
+    segment is capped at video_kbps, so each stays within its share of the size
+    budget by duration; a segment that still overshoots its share is re-encoded on
+    its own with a proportionally lower cap. The segments are joined with the concat
+    demuxer (stream copy) and the source audio is encoded (or copied, with
+    audio_settings from get_audio_settings) in the same step, so it has no gaps at
+    the joins.
+
+    trim_args (e.g. ['-t', '60']) are applied to the source when splitting and to its audio.
+
+    Returns (success, stderr_lines) like run_ffmpeg_with_progress, or None when the
+    clip can't be split (e.g. a single keyframe) and should be encoded in one piece.
+    """
+    segment_dir = tempfile.mkdtemp(prefix=SEGMENT_DIR_PREFIX, dir=os.path.dirname(partial_path))
+    try:
+        segments = split_at_keyframes(video_path, segment_dir, max(SEGMENT_MIN_SECONDS, duration / segment_jobs),
+                                      trim_args)
+        if not segments or len(segments) < 2:
+            return None
+        print(f"\n✂️  Encoding '{filename}' as {len(segments)} segments, {segment_jobs} at a time")
+        
+        total_threads = encoder_threads or os.cpu_count() or 1
+        segment_threads = max(1, total_threads // min(segment_jobs, len(segments)))
+        # Progress over the whole clip: the sum of every segment's position
+        positions = [0.0] * len(segments)
+        lock = threading.Lock()
+        
+        def report(index, event):
+            with lock:
+                if event['out_time'] is not None:
+                    positions[index] = event['out_time']
+                position = sum(positions)
+                percentage = min(position / duration * 100, 100) if duration > 0 else None
+                if on_progress is not None:
+                    on_progress(dict(event, out_time=position, percentage=percentage, done=False,
+                                     file=filename, segment=index))
+                else:
+                    display_progress(filename, percentage or 0, time.time() - start_time, duration, position)
+        
+        def encode_segment(index):
+            source, segment_duration = segments[index]
+            output = os.path.join(segment_dir, f'encoded_{index:04d}.nut')
+            budget_bytes = video_kbps * 1000 / 8 * segment_duration
+            kbps = video_kbps
+            for attempt in range(2):
+                cmd = build_command(backend, encode_tuning, output=output, source=source,
+                                    threads=segment_threads, bitrate_kbps=kbps, audio=False)
+                success, stderr_lines = run_ffmpeg_with_progress(
+                    cmd, filename, segment_duration, start_time, lambda event: report(index, event)
+                )
+                if not success:
+                    return False, stderr_lines
+                size = os.path.getsize(output)
+                if size <= budget_bytes or attempt == 1:
+                    return True, stderr_lines
+                # Over its share of the budget: try once more with a lower cap
+                kbps = max(1, kbps * budget_bytes / size * 0.95)
+            return True, stderr_lines
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=segment_jobs) as executor:
+            results = list(executor.map(encode_segment, range(len(segments))))
+        for success, stderr_lines in results:
+            if not success:
+                return False, stderr_lines
+        
+        list_path = os.path.join(segment_dir, 'encoded.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for index, (_, segment_duration) in enumerate(segments):
+                # The source segment's exact length, so joins don't gain a frame of padding
+                f.write(f"file 'encoded_{index:04d}.nut'\nduration {segment_duration:.6f}\n")
+        cmd = [
+            'ffmpeg',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            *trim_args,
+            '-i', video_path,
+            '-map', '0:v',
+            '-map', '1:a?',  # Audio from the original, in one piece
+            '-c:v', 'copy',
+            *(audio_settings if audio_settings is not None else ['-c:a', 'aac', '-b:a', f'{AUDIO_BITRATE_KBPS}k', '-ar', '48000']),
+            # Like the single-piece encodes: moov before mdat so MP4/MOV outputs stream
+            *(['-movflags', '+faststart'] if partial_path.lower().endswith(FASTSTART_EXTENSIONS) else []),
+            '-y', partial_path
+        ]
+        success, stderr, _ = run_ffmpeg(cmd, log_success=False)
+        if on_progress is None:
+            # Clear the progress line
+            sys.stdout.write('\r' + ' ' * 120 + '\r')
+            sys.stdout.flush()
+        elif success:
+            on_progress({'frame': None, 'fps': None, 'speed': None, 'out_time': duration, 'bitrate_kbps': None,
+                         'total_size': os.path.getsize(partial_path), 'percentage': 100.0 if duration > 0 else None,
+                         'done': True, 'file': filename})
+        return success, stderr.splitlines()
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+def encode_renditions(outputs, composite_filter, inputs, canvas_size, video_info, system_info, duration,
+                      encoder_threads, filename, on_progress=None, single_pass=False, trim_args=(),
+                      static_regions=()):
+    """
+    Encode a rendition ladder with one ffmpeg: the composite (composite_filter,
+    ending in [final]) is built once and split into a branch per rendition, scaled
+    to its max_height where needed and sent to its own encoder. Each rendition is
+    then held to its own size limit with enforce_size_limit and renamed into place.
+
+    Args:
+        outputs: Renditions from get_rendition_outputs
+        inputs: (video_path, *overlay_paths), the overlays being the composite's single-frame inputs
+        canvas_size: (width, height) of the composite
+        single_pass: Cap each rendition at the bitrate budget of its own size limit
+        trim_args: Input options for the source, e.g. ['-t', '60'] from a delivery profile
+        static_regions: Low-priority canvas regions at full size (see get_static_regions),
+            scaled and marked on each branch
+
+    A rendition with its own size limit (own_size_limit) that the minimum bitrate
+    can't meet for this duration has it raised (see get_min_size_limit_mb).
+
+    Returns True if every rendition was encoded and is within its size limit; each
+    output's 'ok' says whether that rendition was.
+    """
+    video_path, *overlay_paths = inputs
+    canvas_width, canvas_height = canvas_size
+    for output in outputs:
+        output['ok'] = False
+        output['partial_path'] = get_partial_output_path(output['output_path'])
+        min_size_mb = get_min_size_limit_mb(duration, get_audio_bitrate_kbps(video_info.get('audio'), output['format']))
+        if output['own_size_limit'] and min_size_mb > output['max_output_size_mb']:
+            print(f"ℹ️  {output['name']}: {output['max_output_size_mb']} MB is below the minimum bitrate for "
+                  f"{format_time(duration)}; limiting it to {min_size_mb:.2f} MB")
+            output['max_output_size_mb'] = min_size_mb
+        height = min(canvas_height, output['max_height'] or canvas_height) // 2 * 2
+        output['size'] = (round(height * canvas_width / canvas_height / 2) * 2, height)
+        output['backend'] = encoders.select_backend(system_info, output['codec'], *output['size'])
+    
+    def build_command():
+        branches = [composite_filter, f"[final]split={len(outputs)}" + ''.join(f"[split{k}]" for k in range(len(outputs)))]
+        for k, output in enumerate(outputs):
+            width, height = output['size']
+            scale = f"scale={width}:{height}," if height != canvas_height else ""
+            # ROI side data is in pixels and isn't adjusted by scale, so it is added per branch
+            roi = build_roi_filters(scale_regions(static_regions, width / canvas_width, height / canvas_height))
+            branches.append(
+                f"[split{k}]{scale}{roi + ',' if roi else ''}format={encoders.get_output_filter(output['backend'])}[out{k}]"
+            )
+        # Global options of every backend in use (e.g. the VAAPI device), once each
+        input_args = [arg for args in sorted({tuple(output['backend']['input_args']) for output in outputs}) for arg in args]
+        
+        cmd = [
+            'ffmpeg',
+            *input_args,
+            *get_thread_settings(encoder_threads),
+            *trim_args,
+            '-i', video_path,
+            *[arg for path in overlay_paths for arg in ('-i', path)],
+            '-filter_complex', ';'.join(branches),
+        ]
+        if encoder_threads:
+            cmd.extend(['-filter_complex_threads', str(encoder_threads)])
+        for k, output in enumerate(outputs):
+            effective_system_info = system_info.copy()
+            if output['backend']['name'] != 'videotoolbox':
+                effective_system_info['has_videotoolbox'] = False
+            audio = video_info.get('audio')
+            bitrate_kbps = None
+            if single_pass and duration > 0:
+                bitrate_kbps = calculate_target_bitrate(duration, output['max_output_size_mb'],
+                                                        get_audio_bitrate_kbps(audio, output['format']))
+            cmd.extend(['-map', f'[out{k}]', '-map', '0:a?'])
+            cmd.extend(get_optimal_codec_settings(
+                effective_system_info, output['codec'], video_info, bitrate_kbps, output['backend']
+            ))
+            cmd.extend(get_thread_settings(encoder_threads))
+            cmd.extend([*get_audio_settings(audio, output['format']), '-y', output['partial_path']])
+        return cmd
+    
+    print(f"\nEncoding {len(outputs)} renditions of '{filename}': "
+          + ', '.join(f"{output['name']} {output['size'][0]}x{output['size'][1]} {output['codec']}" for output in outputs))
+    start_time = time.time()
+    try:
+        with metrics.stage('encode', file=filename, media_seconds=duration, renditions=len(outputs)) as event:
+            success, stderr_lines = run_ffmpeg_with_progress(build_command(), filename, duration, start_time, on_progress)
+            if not success and any(output['backend']['name'] != encoders.SOFTWARE for output in outputs):
+                print(f"\n⚠️  Hardware encode failed; retrying every rendition with software encoding")
+                for output in outputs:
+                    output['backend'] = encoders.get_backend(encoders.SOFTWARE)
+                success, stderr_lines = run_ffmpeg_with_progress(build_command(), filename, duration, start_time, on_progress)
+            event['encoder'] = ','.join(output['backend']['name'] for output in outputs)
+            event['ok'] = success
+        if not success:
+            print(f"❌ Error processing {filename}:")
+            for line in stderr_lines[-10:]:
+                if line.strip():
+                    print(f"   {line.strip()}")
+            return False
+        
+        print(f"✅ Successfully processed '{filename}' in {format_time(time.time() - start_time)}")
+        all_ok = True
+        for output in outputs:
+            print(f"   {output['name']}:")
+            with metrics.stage('size_check', file=os.path.basename(output['output_path'])) as event:
+                size_ok = enforce_size_limit(
+                    output['partial_path'], output['max_output_size_mb'], duration, system_info, output['codec'],
+                    encoder_threads, on_progress, video_info=video_info
+                )
+                event['ok'] = size_ok
+                if os.path.exists(output['partial_path']):
+                    event['bytes'] = os.path.getsize(output['partial_path'])
+            if os.path.exists(output['partial_path']):
+                os.replace(output['partial_path'], output['output_path'])
+            output['ok'] = size_ok
+            all_ok = all_ok and size_ok
+        return all_ok
+    finally:
+        for output in outputs:
+            if os.path.exists(output['partial_path']):
+                os.remove(output['partial_path'])
+
 def process_videos_in_folder(input_folder, output_folder, video_files_to_process=None, 
-                           output_codec='h264', output_format='mp4', system_info=None, max_output_size_mb=10):
+                           output_codec='h264', output_format='mp4', system_info=None, max_output_size_mb=10,
+                           single_pass=False, force=False, use_manifest=True, encoder_threads=None, progress='bar',
+                           time_budget=None, segment_jobs=None, renditions=None, profile=None, roi=False,
+                           completed_outputs=None):
     """
     Processes videos: crops them to a 3:4 aspect ratio,
     adds a rounded border, and places them on a slightly larger 3:4 black canvas.
@@ -737,9 +1538,38 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
         output_format: Output file format
         system_info: System capabilities information
         max_output_size_mb: Maximum output file size in MB (default: 10)
+        single_pass: Budget the bitrate from the duration before encoding so the size
+            limit is met in the first encode; only clips predicted to overshoot can
+            still fall back to the two-pass re-encode
+        force: Reprocess videos even if the build manifest says their output is up to date
+        use_manifest: Check and record outputs in the build manifest (bulk workers leave
+            this to the parent process)
+        encoder_threads: Thread budget per encode (set by the bulk scheduler; None lets
+            ffmpeg use every core)
+        progress: 'bar' draws a terminal progress bar; 'json' writes one JSON event per
+            ffmpeg progress update (frame, fps, speed, out_time, bitrate) to stderr
+            instead (see print_progress_json)
+        time_budget: Wall-clock seconds for all the videos; software x264/x265 encodes
+            then get a share of the time left by duration and a preset/CRF tuned to
+            finish within it (see tuning.py)
+        segment_jobs: Encode clips of SEGMENT_MIN_DURATION or longer as this many
+            keyframe-aligned segments in parallel (see encode_in_segments)
+        renditions: Names from RENDITIONS to encode from one composite in one ffmpeg,
+            each with its own size limit, instead of the single output_codec output
+            (time_budget and segment_jobs don't apply to rendition ladders; a time_budget
+            given with renditions is ignored with a warning)
+        profile: Name of a DELIVERY_PROFILES entry capping canvas height, frame rate
+            and duration; the caps are applied in the filter graph before compositing
+        roi: Mark the static canvas around the video as low priority for the encoder
+            (see get_static_regions)
+        completed_outputs: Optional list that the path of every output built within its
+            size limit is appended to (how bulk workers report partial rendition ladders)
     """
     print(f"\nStarting video processing...")
     print(f"📦 Maximum output size: {max_output_size_mb} MB per video")
+    if renditions and time_budget:
+        print("⚠️  --time-budget doesn't tune rendition ladders; encoding them with the default settings")
+        time_budget = None
     
     # Check if ffmpeg is installed
     if not check_ffmpeg_installed():
@@ -763,18 +1593,51 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
     
     processed_count = 0
     failed_count = 0
+    skipped_count = 0
     total_start_time = time.time()
+    build_params = get_build_params(output_codec, output_format, max_output_size_mb, single_pass, bool(time_budget),
+                                    bool(segment_jobs and segment_jobs > 1), profile, roi)
+    manifest = load_manifest(output_folder) if use_manifest else {}
+    delivery_profile = DELIVERY_PROFILES[profile] if profile else None
+    on_progress = get_progress_callback(progress)
+    
+    # With a time budget, each clip's share of the time left is in proportion to its
+    # duration against everything still to encode
+    deadline = total_start_time + time_budget if time_budget else None
+    media_durations = []
+    if deadline is not None:
+        infos = get_video_infos([path for _, path in video_files_to_process])
+        media_durations = [
+            get_profile_duration((infos.get(path) or {}).get('duration') or 0, delivery_profile)
+            for _, path in video_files_to_process
+        ]
+        tuning_history = tuning.load_history(output_folder)
+        print(f"⏱️  Time budget: {format_time(time_budget)} for {format_time(sum(media_durations))} of video")
     
     # Process each video
     for idx, (filename, video_path) in enumerate(video_files_to_process, 1):
         try:
             print(f"\n[{idx}/{len(video_files_to_process)}] Processing '{filename}'...")
             # Prepare output file path
-            output_filename = os.path.splitext(filename)[0] + f".{output_format}"
-            output_path = os.path.join(output_folder, output_filename)
+            output_path = get_output_path(output_folder, filename, output_format)
+            partial_path = get_partial_output_path(output_path)
+            
+            # Skip inputs whose outputs were already built from the same content and settings
+            targets = get_manifest_targets(output_folder, filename, output_codec, output_format, max_output_size_mb,
+                                           single_pass, build_params, renditions, profile, roi)
+            stale_paths = {
+                path for path, params in targets
+                if not use_manifest or force or not is_up_to_date(manifest, path, video_path, params, SCRIPT_VERSION)
+            }
+            if not stale_paths:
+                print(f"→ Up to date: '{os.path.basename(output_path)}' (use --force to rebuild)")
+                skipped_count += 1
+                continue
             
-            # Get video information
-            video_info = get_video_info(video_path)
+            # Get video information (reused from the metadata index when unchanged)
+            with metrics.stage('probe', file=filename) as event:
+                video_info = get_video_info_cached(video_path)
+                event['ok'] = bool(video_info)
             if not video_info:
                 print(f"Could not get video info for {filename}")
                 failed_count += 1
@@ -785,6 +1648,15 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
             fps = video_info['fps']
             duration = video_info.get('duration', 0)
             
+            # Audio: silent clips skip the audio pipeline, compliant AAC is stream-copied,
+            # and the size budget uses the bitrate the output will actually carry
+            source_audio = video_info.get('audio')
+            audio_kbps = get_audio_bitrate_kbps(source_audio, output_format)
+            if not source_audio:
+                print(f"🔇 No audio track")
+            elif can_copy_audio(source_audio, output_format):
+                print(f"🔊 Copying {source_audio['codec'].upper()} audio ({source_audio['bitrate_kbps']:.0f} kbps)")
+            
             # --- UNIFIED STEP: Calculate crop dimensions for 3:4 aspect ratio ---
             target_ratio = 3 / 4
             video_ratio = original_width / original_height
@@ -817,19 +1689,38 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
             crop_width = crop_width if crop_width % 2 == 0 else crop_width - 1
             crop_height = crop_height if crop_height % 2 == 0 else crop_height - 1
             
+            # Delivery profile: scale the crop down (in the graph, before compositing) so the
+            # canvas fits max_canvas_height, and cap the frame rate and duration
+            video_width, video_height = crop_width, crop_height
+            canvas_fps = fps
+            trim_args = []
+            if delivery_profile:
+                max_canvas_height = delivery_profile['max_canvas_height']
+                if max_canvas_height and crop_height * 1.2 > max_canvas_height:
+                    video_height = int(max_canvas_height / 1.2) // 4 * 4
+                    video_width = round(crop_width * video_height / crop_height / 2) * 2
+                if delivery_profile['max_fps'] and fps and fps > delivery_profile['max_fps'] + 0.01:
+                    canvas_fps = delivery_profile['max_fps']
+                if get_profile_duration(duration, delivery_profile) < duration:
+                    duration = delivery_profile['max_duration']
+                    trim_args = ['-t', f'{duration:.3f}']  # Input option, so audio is trimmed too
+                    print(f"✂️  Trimming to the profile's {format_time(duration)} maximum")
+            scale_size = (video_width, video_height) if video_width != crop_width else None
+            source_rate = get_canvas_rate(canvas_fps) if canvas_fps != fps else None
+            
             # --- Step 1: Calculate proportional border and radius ---
             # Calculate proportional radius and border size based on video width
-            radius = int(crop_width * (16 / 360))
-            border_size = max(1, round(crop_width * (2 / 360)))
+            radius = int(video_width * (16 / 360))
+            border_size = max(1, round(video_width * (2 / 360)))
                 
             # --- Step 2: Calculate the final 3:4 canvas dimensions ---
             # Make the canvas 1.2x the height of the cropped video
-            target_height = crop_height * 1.2
+            target_height = video_height * 1.2
             canvas_height = int(round(target_height / 4) * 4)
             canvas_width = (canvas_height // 4) * 3
             
             # Safeguard: if the canvas is too narrow, expand it to fit the content
-            content_width = crop_width + border_size * 2
+            content_width = video_width + border_size * 2
             if canvas_width < content_width:
                 canvas_width = content_width
                 canvas_height = int(round((canvas_width * 4 / 3) / 4) * 4)
@@ -839,100 +1730,187 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
             canvas_height = canvas_height if canvas_height % 2 == 0 else canvas_height - 1
             
             # Calculate position to center horizontally and align to the top
-            paste_x = (canvas_width - (crop_width + border_size * 2)) // 2
+            paste_x = (canvas_width - (video_width + border_size * 2)) // 2
             paste_y = 0  # Align to the top
+            # Nudge by a pixel where needed so the video sits on the chroma grid and the
+            # YUV composite can pad it into place (otherwise the RGBA graph is used)
+            paste_x = align_paste_position(paste_x, border_size, canvas_width - content_width)
+            paste_y = align_paste_position(paste_y, border_size, canvas_height - video_height - border_size * 2)
+            yuv_composite = yuv_composite_fits(border_size, paste_x, paste_y)
+            # Static black canvas around the bordered video, for ROI-aware encoding
+            static_regions = []
+            if roi:
+                static_regions = get_static_regions(
+                    canvas_width, canvas_height, paste_x, paste_y,
+                    video_width + border_size * 2, video_height + border_size * 2
+                )
                 
-            # Pre-generate rounded-corner mask and border PNGs to speed up filtering
-            # Create a temporary directory for mask/border images
-            tmpdir = tempfile.mkdtemp()
-            base_name = os.path.splitext(filename)[0]
-            mask_path = os.path.join(tmpdir, f"{base_name}_mask.png")
-            border_path = os.path.join(tmpdir, f"{base_name}_border.png")
-            # Generate mask: solid white rounded rectangle on black background
-            mask_img = Image.new('L', (crop_width, crop_height), 0)
-            mask_draw = ImageDraw.Draw(mask_img)
-            mask_draw.rounded_rectangle((0, 0, crop_width, crop_height), radius=radius, fill=255)
-            mask_img.save(mask_path)
-            # Generate border: semi-transparent white rounded rectangle
-            br_w, br_h = crop_width + border_size*2, crop_height + border_size*2
-            border_img = Image.new('RGBA', (br_w, br_h), (128, 128, 128, 255))  # Solid grey border
-            border_mask = Image.new('L', (br_w, br_h), 0)
-            bdraw = ImageDraw.Draw(border_mask)
-            bdraw.rounded_rectangle((0, 0, br_w, br_h), radius=radius+border_size, fill=255)
-            border_img.putalpha(border_mask)
-            border_img.save(border_path)
-            # Build filter using pre-generated mask and border as inputs 1 and 2
-            # Build filter chain without explicit frame rate on color source
-            filter_str = (
-                f"[0:v]crop={crop_width}:{crop_height}:{crop_x}:{crop_y}[cropped];"
-                f"[1:v]format=rgba[mask];"
-                f"[cropped][mask]alphamerge[rounded];"
-                f"[2:v]format=rgba[border];"
-                # Center the rounded video inside the border image
-                f"[border][rounded]overlay={border_size}:{border_size}[bordered];"
-                f"color=c=black:s={canvas_width}x{canvas_height}[bg];"
-                f"[bg][bordered]overlay={paste_x}:{paste_y}[final]"
-            )
+            # Rounded-corner PNGs (corner tiles, or mask and border for the RGBA graph) only
+            # depend on the geometry, so they are drawn once and reused from the overlay cache
+            with metrics.stage('mask', file=filename):
+                if yuv_composite:
+                    overlay_paths = [get_corner_tiles_path(
+                        video_width, video_height, border_size, radius + border_size, (128, 128, 128, 255),
+                        (paste_x % 2, paste_y % 2)
+                    )]
+                else:
+                    overlay_paths = [
+                        get_rounded_mask_path(video_width, video_height, radius),
+                        get_border_overlay_path(
+                            video_width, video_height, border_size, radius + border_size, (128, 128, 128, 255)  # Solid grey border
+                        ),
+                    ]
             
-            # Check if output dimensions exceed hardware encoder limits
-            max_hw_w, max_hw_h = 4096, 2304
-            output_exceeds_hw_limits = (canvas_width > max_hw_w or canvas_height > max_hw_h)
+            def composite_filter(pix_fmt='yuv420p', regions=None):
+                if yuv_composite:
+                    return build_yuv_composite_filter(
+                        crop_width, crop_height, crop_x, crop_y, border_size,
+                        canvas_width, canvas_height, paste_x, paste_y, radius + border_size,
+                        pix_fmt=pix_fmt, canvas_rate=get_canvas_rate(canvas_fps),
+                        scale_size=scale_size, static_regions=regions
+                    )
+                return build_composite_filter(
+                    crop_width, crop_height, crop_x, crop_y, border_size,
+                    canvas_width, canvas_height, paste_x, paste_y,
+                    pix_fmt=pix_fmt, canvas_rate=get_canvas_rate(canvas_fps),
+                    scale_size=scale_size, source_rate=source_rate, static_regions=regions
+                )
             
-            # Enforce yuv420p format for compatibility with h264 encoders
-            # Convert from rgba (due to alphamerge/overlay) to yuv420p
-            use_hw_encoder = (
-                system_info.get('is_apple_silicon') and 
-                'h264_videotoolbox' in system_info.get('available_hw_encoders', []) and 
-                output_codec == 'h264' and
-                not output_exceeds_hw_limits
-            )
+            # Rendition ladder: one composite, split to an encoder per rendition
+            if renditions:
+                # Only the renditions that are missing or out of date
+                outputs = [
+                    output for output in get_rendition_outputs(output_folder, filename, renditions, output_codec,
+                                                               output_format, max_output_size_mb, single_pass,
+                                                               profile, roi)
+                    if output['output_path'] in stale_paths
+                ]
+                all_ok = encode_renditions(outputs, composite_filter(), (video_path, *overlay_paths),
+                                           (canvas_width, canvas_height), video_info, system_info, duration,
+                                           encoder_threads, filename, on_progress, single_pass, trim_args,
+                                           static_regions)
+                # Renditions that came out fine are kept even if others failed, so a rerun
+                # only redoes the failed ones
+                built = [output for output in outputs if output['ok']]
+                if use_manifest and built:
+                    for output in built:
+                        record_output(manifest, output['output_path'], video_path, output['build_params'], SCRIPT_VERSION)
+                    save_manifest(output_folder, manifest)
+                if completed_outputs is not None:
+                    completed_outputs.extend(output['output_path'] for output in built)
+                if all_ok:
+                    processed_count += 1
+                else:
+                    print(f"   ❌ Failed to produce every rendition")
+                    failed_count += 1
+                continue
             
-            if output_exceeds_hw_limits and system_info.get('is_apple_silicon'):
+            # Pick the fastest working encoder backend that accepts the output size
+            backend = encoders.select_backend(system_info, output_codec, canvas_width, canvas_height)
+            preferred = system_info.get('encoder_backends', {}).get(output_codec, [encoders.SOFTWARE])[0]
+            if backend['name'] == encoders.SOFTWARE and preferred != encoders.SOFTWARE:
                 print(f"⚠️  Output dimensions {canvas_width}x{canvas_height} exceed hardware encoder limits; using software encoding")
             
-            # Always convert to yuv420p for h264 compatibility (works with both HW and SW encoders)
-            filter_str = filter_str.replace('[final]', ',format=yuv420p[final]')
-            
-            # Build the ffmpeg command with optimized settings
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,
-                '-loop', '1',  # Loop mask image
-                '-i', mask_path,
-                '-loop', '1',  # Loop border image
-                '-i', border_path,
-                '-filter_complex', filter_str,
-                '-map', '[final]',
-                '-map', '0:a?',  # Copy audio from original
-            ]
+            # Single-pass mode: predict the bitrate budget from the duration and cap the
+            # first encode with it instead of encoding freely and re-encoding afterwards
+            target_bitrate_kbps = None
+            if single_pass and duration > 0:
+                target_bitrate_kbps = calculate_target_bitrate(duration, max_output_size_mb, audio_kbps)
+                predicted_size = predict_output_size_mb(duration, target_bitrate_kbps, audio_kbps)
+                print(f"🎯 Single-pass bitrate cap: {target_bitrate_kbps:.0f} kbps (≤ {predicted_size:.2f} MB predicted)")
+                if predicted_size > max_output_size_mb:
+                    print(f"⚠️  Clip is too long to fit {max_output_size_mb} MB at the minimum bitrate; "
+                          f"it may still need a second pass")
             
-            # Explicitly set output duration to match input video duration
-            # This prevents over-encoding when using looped image inputs
-            if duration > 0:
-                cmd.extend(['-t', str(duration)])
+            def build_command(backend, encode_tuning=None, sample=None, output=partial_path, source=video_path,
+                              threads=encoder_threads, bitrate_kbps=target_bitrate_kbps, audio=True):
+                # Build filter using the pre-generated overlays as inputs 1 (and 2), ending
+                # in the pixel format (and any hardware upload) the backend expects.
+                # sample=(start, seconds) encodes only that window, without audio.
+                filter_str = composite_filter(encoders.get_output_filter(backend), static_regions)
+                
+                # Build the ffmpeg command with optimized settings
+                cmd = [
+                    'ffmpeg',
+                    *backend['input_args'],
+                    *get_thread_settings(threads),  # Decoder threads
+                    *(['-ss', f'{sample[0]:.3f}', '-t', f'{sample[1]:.3f}'] if sample else []),
+                    *(trim_args if source == video_path and not sample else []),
+                    '-i', source,
+                    *[arg for path in overlay_paths for arg in ('-i', path)],  # Single frames, held by the filter graph
+                    '-filter_complex', filter_str,
+                    '-map', '[final]',
+                    '-map', '0:a?',  # Audio from original
+                ]
+                
+                # VideoToolbox is only used when it is the selected backend (e.g. not for
+                # outputs beyond its size limit)
+                effective_system_info = system_info.copy()
+                if backend['name'] != 'videotoolbox':
+                    effective_system_info['has_videotoolbox'] = False
+                codec_settings = get_optimal_codec_settings(
+                    effective_system_info, output_codec, video_info, bitrate_kbps, backend, encode_tuning
+                )
+                cmd.extend(codec_settings)
+                if threads:
+                    cmd.extend(get_thread_settings(threads))
+                    cmd.extend(['-filter_complex_threads', str(threads)])
+                
+                # Audio settings: stream copy when compliant, none for silent sources
+                if sample or not audio:
+                    cmd.append('-an')
+                else:
+                    cmd.extend(get_audio_settings(source_audio, output_format))
+                
+                # Add output (written to a temp file, renamed into place when complete)
+                cmd.extend([
+                    '-y',                  # Overwrite output file
+                    output
+                ])
+                return cmd
             
-            # Add optimized codec settings
-            # If output exceeds hardware limits, disable hardware encoding
-            effective_system_info = system_info.copy()
-            if output_exceeds_hw_limits:
-                effective_system_info['has_videotoolbox'] = False
+            # Time budget: pick the preset/CRF for this clip from a short sample encode
+            encode_plan = None
+            if (deadline is not None and duration > 0 and backend['name'] == encoders.SOFTWARE
+                    and output_codec in ('h264', 'h265')):
+                time_share = tuning.clip_time_share(deadline - time.time(), duration, sum(media_durations[idx - 1:]))
+                sample = None
+                window = tuning.sample_window(duration)
+                if window:
+                    with metrics.stage('tune_sample', file=filename) as event:
+                        sample = measure_sample_encode(build_command, backend, window, partial_path)
+                        event['ok'] = sample is not None
+                encode_plan = tuning.plan_encode(
+                    duration, time_share, calculate_target_bitrate(duration, max_output_size_mb, audio_kbps),
+                    canvas_width * canvas_height * (canvas_fps or 25), sample, tuning_history
+                )
+                print(f"🎛️  Tuned for a {format_time(time_share)} share: -preset {encode_plan['preset']} "
+                      f"-crf {encode_plan['crf']}"
+                      + (f" (sample {sample['speed']:.2f}x realtime, {sample['video_kbps']:.0f} kbps)" if sample else ""))
             
-            codec_settings = get_optimal_codec_settings(effective_system_info, output_codec, video_info)
-            cmd.extend(codec_settings)
+            # Segment mode: long clips are split at keyframes and the segments encoded in
+            # parallel, each capped at the clip's bitrate budget
+            segmented = bool(segment_jobs and segment_jobs > 1 and duration >= SEGMENT_MIN_DURATION)
+            segment_kbps = target_bitrate_kbps or calculate_target_bitrate(duration, max_output_size_mb, audio_kbps)
             
-            # Audio settings
-            cmd.extend([
-                '-c:a', 'aac',         # Use AAC for audio
-                '-b:a', '192k',        # Audio bitrate
-                '-ar', '48000',        # Sample rate
-            ])
+            # Whether the last encode really ran as segments; a clip without usable
+            # keyframes falls back to one whole-file encode
+            split = {'done': False}
             
-            # Add stats and output
-            cmd.extend([
-                '-stats',              # Show progress statistics
-                '-y',                  # Overwrite output file
-                output_path
-            ])
+            def encode(backend, encode_tuning=None):
+                split['done'] = False
+                if segmented:
+                    result = encode_in_segments(
+                        build_command, backend, video_path, partial_path, duration, segment_jobs, segment_kbps,
+                        encoder_threads, filename, start_time, on_progress, encode_tuning, trim_args,
+                        get_audio_settings(source_audio, output_format)
+                    )
+                    if result is not None:
+                        split['done'] = True
+                        return result
+                return run_ffmpeg_with_progress(
+                    build_command(backend, encode_tuning), filename, duration, start_time, on_progress
+                )
             
             # Execute the command with progress tracking
             print(f"\nApplying effects to '{filename}'...")
@@ -940,25 +1918,32 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
             print(f"Duration: {format_time(duration) if duration > 0 else 'Unknown'}")
             
             # Debug: Print full FFmpeg command (uncomment to see full command)
-            # print(f"\n🔍 FFmpeg command:\n{' '.join(cmd)}\n")
+            # print(f"\n🔍 FFmpeg command:\n{' '.join(build_command(backend, encode_plan))}\n")
             
             print("-" * 120)
             
             # Show initial progress
-            sys.stdout.write(f"\r{filename[:30]:<30} │ {'░' * 40} │   0.0% │ Initializing...")
-            sys.stdout.flush()
+            if on_progress is None:
+                sys.stdout.write(f"\r{filename[:30]:<30} │ {'░' * 40} │   0.0% │ Initializing...")
+                sys.stdout.flush()
             
             start_time = time.time()
             
             # Use the reusable FFmpeg wrapper with progress tracking
             try:
-                success, stderr_lines = run_ffmpeg_with_progress(cmd, filename, duration, start_time)
-                
-                # Clean up temporary mask/border files
-                try:
-                    shutil.rmtree(tmpdir)
-                except Exception:
-                    pass
+                with metrics.stage('encode', file=filename, media_seconds=duration,
+                                   width=canvas_width, height=canvas_height) as event:
+                    success, stderr_lines = encode(backend, encode_plan)
+                    if not success and backend['name'] != encoders.SOFTWARE:
+                        # A hardware encoder that passed the probe can still fail on real input
+                        print(f"\n⚠️  {backend['name']} encode failed; retrying with software encoding")
+                        backend = encoders.get_backend(encoders.SOFTWARE)
+                        encode_plan = None
+                        success, stderr_lines = encode(backend)
+                    event['encoder'] = backend['name']
+                    if split['done']:
+                        event['segment_jobs'] = segment_jobs
+                    event['ok'] = success
                 
                 if success:
                     end_time = time.time()
@@ -967,11 +1952,33 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
                     print(f"   Processing time: {format_time(processing_time)}")
                     if duration > 0 and processing_time > 0:
                         print(f"   Average speed: {duration/processing_time:.1f}x realtime")
+                    # Segments encode in parallel, so their combined speed says nothing
+                    # about what the plan's preset/CRF achieves on its own
+                    if encode_plan is not None and processing_time > 0 and not split['done']:
+                        size_mb = get_file_size_mb(partial_path)
+                        tuning.record_result(
+                            output_folder, encode_plan, duration / processing_time,
+                            max(0.0, size_mb * 8 * 1024 * 1024 / 1000 / duration - audio_kbps), size_mb
+                        )
                     
                     # Enforce size limit
-                    size_ok = enforce_size_limit(output_path, max_output_size_mb, duration, system_info, output_codec)
+                    with metrics.stage('size_check', file=filename) as event:
+                        size_ok = enforce_size_limit(
+                            partial_path, max_output_size_mb, duration, system_info, output_codec, encoder_threads,
+                            on_progress, encode_plan['preset'] if encode_plan else 'slow', video_info
+                        )
+                        event['ok'] = size_ok
+                        if os.path.exists(partial_path):
+                            event['bytes'] = os.path.getsize(partial_path)
+                    if os.path.exists(partial_path):
+                        os.replace(partial_path, output_path)
                     if size_ok:
                         processed_count += 1
+                        if use_manifest:
+                            record_output(manifest, output_path, video_path, build_params, SCRIPT_VERSION)
+                            save_manifest(output_folder, manifest)
+                        if completed_outputs is not None:
+                            completed_outputs.append(output_path)
                     else:
                         print(f"   ❌ Failed to meet size requirements")
                         failed_count += 1
@@ -991,6 +1998,9 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
             except Exception as e:
                 print(f"\n❌ Error during processing: {e}")
                 failed_count += 1
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
                     
         except Exception as e:
             print(f"Could not process {filename}. Reason: {e}")
@@ -1003,6 +2013,8 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
     print("PROCESSING COMPLETE")
     print("="*60)
     print(f"Total videos processed: {processed_count}")
+    if skipped_count > 0:
+        print(f"Skipped (up to date): {skipped_count}")
     if failed_count > 0:
         print(f"Failed to process: {failed_count}")
     print(f"Total processing time: {format_time(total_processing_time)}")
@@ -1011,7 +2023,7 @@ def process_videos_in_folder(input_folder, output_folder, video_files_to_process
         print(f"Average time per video: {format_time(avg_time)}")
     print("="*60)
     
-    return processed_count > 0
+    return processed_count + skipped_count > 0
 
 def create_test_video(output_path, width=600, height=360, duration=5):
     """Create a test video with specific dimensions."""
@@ -1053,31 +2065,72 @@ def create_sample_videos(input_folder):
     
     return created_videos
 
-def process_single_video(filename: str, video_path: str, output_folder: str, output_codec: str, output_format: str, system_info: Dict[str, any], max_output_size_mb: int = 10) -> bool:
+def process_single_video(filename: str, video_path: str, output_folder: str, output_codec: str, output_format: str, system_info: Dict[str, any], max_output_size_mb: int = 10,
+                         single_pass: bool = False, use_manifest: bool = True, encoder_threads: int = None,
+                         progress: str = 'bar', time_budget: float = None, segment_jobs: int = None,
+                         renditions: List[str] = None, profile: str = None,
+                         roi: bool = False) -> Tuple[bool, List[str]]:
     """
     Process a single video file with existing logic by calling process_videos_in_folder on one video.
-    Returns True if processing succeeds, False otherwise.
+    Returns (success, completed_outputs): whether processing succeeded, and the paths of
+    the outputs that were built (all renditions that worked, even if another failed).
     """
-    return process_videos_in_folder(
+    completed_outputs = []
+    success = process_videos_in_folder(
         os.path.dirname(video_path),
         output_folder,
         [(filename, video_path)],
         output_codec,
         output_format,
         system_info,
-        max_output_size_mb
+        max_output_size_mb,
+        single_pass=single_pass,
+        use_manifest=use_manifest,
+        encoder_threads=encoder_threads,
+        progress=progress,
+        time_budget=time_budget,
+        segment_jobs=segment_jobs,
+        renditions=renditions,
+        profile=profile,
+        roi=roi,
+        completed_outputs=completed_outputs
     )
+    return success, completed_outputs
 
-def process_videos_in_bulk(input_folder: str, output_folder: str, jobs: int = None, max_output_size_mb: int = 10):
+def process_videos_in_bulk(input_folder: str, output_folder: str, jobs: int = None, max_output_size_mb: int = 10,
+                           single_pass: bool = False, force: bool = False, output_codec: str = 'h264',
+                           output_format: str = 'mp4', system_info: Dict[str, any] = None, use_queue: bool = False,
+                           progress: str = 'bar', time_budget: float = None, segment_jobs: int = None,
+                           renditions: List[str] = None, profile: str = None, roi: bool = False,
+                           mp_context=None):
     """
     Processes all videos in input_folder in parallel and saves to output_folder.
     
     Args:
         input_folder: Input folder path
         output_folder: Output folder path
-        jobs: Number of parallel jobs (defaults to CPU count)
+        jobs: Number of parallel jobs (planned from clip resolution/duration by default)
         max_output_size_mb: Maximum output file size in MB (default: 10)
+        single_pass: Meet the size limit in the first encode (see process_videos_in_folder)
+        force: Reprocess videos even if their outputs are up to date
+        output_codec: Output video codec
+        output_format: Output file format
+        system_info: System capabilities information (detected if not provided)
+        use_queue: Track jobs in the durable SQLite queue in output_folder, so the next
+            queued run after one that was killed part-way picks up its queued and
+            interrupted jobs (worker_service starts that run itself at start-up)
+        progress: Progress display for each encode ('bar' or 'json', see process_videos_in_folder)
+        time_budget: Wall-clock seconds for the whole run; each job is given its share of
+            the time left when it starts (see process_videos_in_folder)
+        segment_jobs: Parallel segments for long clips (see process_videos_in_folder)
+        renditions: Rendition ladder to encode per video (see process_videos_in_folder)
+        profile: Delivery profile name (see process_videos_in_folder)
+        roi: ROI-aware encoding of the static canvas (see process_videos_in_folder)
+        mp_context: multiprocessing context for the worker pool (default start method if None)
+    
+    Returns True when every job succeeded (or everything was already up to date).
     """
+    start_time = time.time()
     video_files = get_video_files(input_folder)
     if not video_files:
         print(f"No videos found in {input_folder}.")
@@ -1086,44 +2139,160 @@ def process_videos_in_bulk(input_folder: str, output_folder: str, jobs: int = No
     # Prepare output directory
     create_output_directory(output_folder)
     
+    queue_conn = None
+    if use_queue:
+        queue_conn = job_queue.open_queue(output_folder)
+        recovered = job_queue.recover_interrupted(queue_conn)
+        removed = cleanup_partial_outputs(output_folder)
+        if recovered or removed:
+            print(f"♻️  Resuming interrupted run: {recovered} job(s) requeued, {removed} partial output(s) removed")
+    
+    if renditions and time_budget:
+        print("⚠️  --time-budget doesn't tune rendition ladders; encoding them with the default settings")
+        time_budget = None
+    
+    # Only new or changed inputs are sent to the workers; the manifest is owned by this process
+    build_params = get_build_params(output_codec, output_format, max_output_size_mb, single_pass, bool(time_budget),
+                                    bool(segment_jobs and segment_jobs > 1), profile, roi)
+    manifest = load_manifest(output_folder)
+    delivery_profile = DELIVERY_PROFILES[profile] if profile else None
+    def manifest_targets(filename):
+        return get_manifest_targets(output_folder, filename, output_codec, output_format, max_output_size_mb,
+                                    single_pass, build_params, renditions, profile, roi)
+    if not force:
+        stale = [
+            (filename, path) for filename, path in video_files
+            if not all(is_up_to_date(manifest, output_path, path, params, SCRIPT_VERSION)
+                       for output_path, params in manifest_targets(filename))
+        ]
+        if len(stale) < len(video_files):
+            print(f"Skipping {len(video_files) - len(stale)} up-to-date video(s) (use --force to rebuild)")
+        video_files = stale
+    
+    if queue_conn is not None:
+        job_queue.enqueue(queue_conn, video_files)
+        pending_count = job_queue.queue_summary(queue_conn).get(job_queue.QUEUED, 0)
+    else:
+        pending_count = len(video_files)
+    if pending_count == 0:
+        save_manifest(output_folder, manifest)
+        print("All videos are up to date.")
+        return True
+    
     # Detect system capabilities once
-    system_info = detect_system()
-    system_info = check_hardware_encoders(system_info)
+    if system_info is None:
+        system_info = detect_system()
+        system_info = check_hardware_encoders(system_info)
     
-    # Determine parallelism
-    max_workers = jobs or os.cpu_count() or 1
-    print(f"Processing {len(video_files)} videos with {max_workers} workers...")
+    # Determine parallelism: share one CPU budget between the jobs instead of
+    # letting every ffmpeg encode use all cores
+    video_infos = get_video_infos([path for _, path in video_files])
+    max_workers, encoder_threads = plan_encoder_threads(list(video_infos.values()), jobs=jobs, profile=delivery_profile)
+    print(f"Processing {pending_count} videos with {max_workers} workers × {encoder_threads} encoder threads...")
     print(f"Maximum output size: {max_output_size_mb} MB per video")
     
+    # Media seconds not yet finished, for splitting the time budget between jobs
+    deadline = start_time + time_budget if time_budget else None
+    durations = {
+        path: get_profile_duration((info or {}).get('duration') or 0, delivery_profile)
+        for path, info in video_infos.items()
+    }
+    media_left = sum(durations.values())
+    
+    # Jobs come from the durable queue when enabled, otherwise straight from the file list.
+    # Only max_workers jobs are taken at a time, so an interruption leaves at most that
+    # many jobs to recover.
+    if queue_conn is not None:
+        def next_job():
+            row = job_queue.claim_next(queue_conn)
+            return (row['filename'], row['input_path'], row['id']) if row else None
+    else:
+        remaining = iter(video_files)
+        def next_job():
+            item = next(remaining, None)
+            return (item[0], item[1], None) if item else None
+    
     results = []
-    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(
-                process_single_video,
-                filename,
-                path,
-                output_folder,
-                OUTPUT_CODEC,
-                OUTPUT_FORMAT,
-                system_info,
-                max_output_size_mb
-            ): filename for filename, path in video_files
-        }
-        for future in concurrent.futures.as_completed(futures):
-            fname = futures[future]
-            try:
-                success = future.result()
-                status = '✅' if success else '❌'
-            except Exception as e:
-                status = '❌'
-                print(f"Error in {fname}: {e}")
-            print(f"{status} {fname}")
-            results.append(status == '✅')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+        in_flight = {}
+        while True:
+            while len(in_flight) < max_workers:
+                job = next_job()
+                if job is None:
+                    break
+                filename, path, _ = job
+                job_budget = None
+                if deadline is not None:
+                    job_budget = tuning.clip_time_share(
+                        deadline - time.time(), durations.get(path, 0), media_left, max_workers
+                    )
+                # A ladder that partly failed before only redoes the renditions still out of date
+                job_renditions = renditions
+                if renditions and not force:
+                    job_renditions = [
+                        name for name, (output_path, params) in zip(renditions, manifest_targets(filename))
+                        if not is_up_to_date(manifest, output_path, path, params, SCRIPT_VERSION)
+                    ] or renditions
+                future = executor.submit(
+                    metrics.run_collected,
+                    process_single_video,
+                    filename,
+                    path,
+                    output_folder,
+                    output_codec,
+                    output_format,
+                    system_info,
+                    max_output_size_mb,
+                    single_pass,
+                    False,
+                    encoder_threads,
+                    progress,
+                    job_budget,
+                    segment_jobs,
+                    job_renditions,
+                    profile,
+                    roi
+                )
+                in_flight[future] = job
+            if not in_flight:
+                break
+            
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                fname, path, job_id = in_flight.pop(future)
+                media_left -= durations.get(path, 0)
+                error = None
+                completed = []
+                try:
+                    (success, completed), events = future.result()
+                    metrics.merge(events)
+                    status = '✅' if success else '❌'
+                except Exception as e:
+                    status = '❌'
+                    error = str(e)
+                    print(f"Error in {fname}: {e}")
+                print(f"{status} {fname}")
+                results.append(status == '✅')
+                # Every output the job built, including the renditions of a ladder that partly failed
+                if completed:
+                    for output_path, params in manifest_targets(fname):
+                        if output_path in completed:
+                            record_output(manifest, output_path, path, params, SCRIPT_VERSION)
+                    save_manifest(output_folder, manifest)
+                if job_id is not None:
+                    if status == '✅':
+                        job_queue.mark_done(queue_conn, job_id)
+                    else:
+                        job_queue.mark_failed(queue_conn, job_id, error)
     
     succeeded = sum(results)
     failed = len(results) - succeeded
     print(f"Bulk processing complete: {succeeded} succeeded, {failed} failed.")
-    return succeeded > 0
+    if queue_conn is not None:
+        summary = job_queue.queue_summary(queue_conn)
+        print(f"Job queue: {', '.join(f'{count} {state}' for state, count in sorted(summary.items()))}")
+        queue_conn.close()
+    return failed == 0
 
 if __name__ == "__main__":
     # --- Configuration ---
@@ -1148,13 +2317,32 @@ if __name__ == "__main__":
     parser.add_argument('--list-json', action='store_true', help='List available input videos with metadata as JSON')
     parser.add_argument('--files', help='Comma-separated list of filenames to process non-interactively')
     parser.add_argument('--files-json', help='JSON array of filenames to process non-interactively')
+    parser.add_argument('--single-pass', action='store_true', help='Budget the bitrate up front so the size limit is met in one encode')
+    parser.add_argument('--force', action='store_true', help='Reprocess videos even if their outputs are up to date')
+    parser.add_argument('--queue', action='store_true', help='Track bulk jobs in a durable queue so interrupted runs resume')
+    parser.add_argument('--progress', choices=PROGRESS_MODES, default='bar', help='Progress display: terminal bar or one JSON event per line (default: bar)')
+    parser.add_argument('--metrics', metavar='PATH', help='Record per-stage timings as JSON lines (or Prometheus text if PATH ends in .prom)')
+    parser.add_argument('--time-budget', type=float, metavar='MINUTES', help='Finish the batch within this many minutes by tuning the x264/x265 preset and CRF per clip')
+    parser.add_argument('--renditions', type=lambda value: value.split(','), metavar='NAMES', help=f"Comma-separated renditions to encode from one composite ({', '.join(RENDITIONS)})")
+    parser.add_argument('--profile', choices=list(DELIVERY_PROFILES), help='Delivery profile capping canvas height, frame rate and duration')
+    parser.add_argument('--roi', action='store_true', help='Mark the static black canvas as low priority for the encoder (ROI side data)')
+    parser.add_argument('--segments', type=int, metavar='N', help=f'Encode clips of {SEGMENT_MIN_DURATION}s or longer as N keyframe-aligned segments in parallel')
     args = parser.parse_args()
+    if args.metrics:
+        metrics.enable(args.metrics, 'video')
+    time_budget = args.time_budget * 60 if args.time_budget else None
+    unknown_renditions = [name for name in args.renditions or [] if name not in RENDITIONS]
+    if unknown_renditions:
+        parser.error(f"unknown rendition(s): {', '.join(unknown_renditions)} (choose from {', '.join(RENDITIONS)})")
+    if args.renditions and args.time_budget:
+        parser.error("--time-budget can't be combined with --renditions (rendition ladders aren't tuned)")
 
     if args.list_json:
         video_files = get_video_files(args.input_folder)
+        video_infos = get_video_infos([path for _, path in video_files])
         video_metadata = []
         for filename, path in video_files:
-            info = get_video_info(path)
+            info = video_infos.get(path)
             video_metadata.append({
                 'filename': filename,
                 'path': path,
@@ -1200,13 +2388,24 @@ if __name__ == "__main__":
             OUTPUT_CODEC,
             OUTPUT_FORMAT,
             system_info,
-            MAX_OUTPUT_SIZE_MB
+            MAX_OUTPUT_SIZE_MB,
+            single_pass=args.single_pass,
+            force=args.force,
+            progress=args.progress,
+            time_budget=time_budget,
+            segment_jobs=args.segments,
+            renditions=args.renditions,
+            profile=args.profile,
+            roi=args.roi
         )
         exit(0 if success else 1)
 
     if args.bulk:
-        process_videos_in_bulk(args.input_folder, args.output_folder, args.jobs, MAX_OUTPUT_SIZE_MB)
-        exit(0)
+        success = process_videos_in_bulk(args.input_folder, args.output_folder, args.jobs, MAX_OUTPUT_SIZE_MB, args.single_pass, args.force,
+                                         OUTPUT_CODEC, OUTPUT_FORMAT, use_queue=args.queue, progress=args.progress,
+                                         time_budget=time_budget, segment_jobs=args.segments, renditions=args.renditions,
+                                         profile=args.profile, roi=args.roi)
+        exit(0 if success else 1)
 
     # --- Continue existing interactive logic ---
     # Detect system capabilities
@@ -1254,7 +2453,10 @@ if __name__ == "__main__":
             choice = input("Enter 'y' to process, or any other key to exit: ").strip().lower()
             if choice == 'y':
                 process_videos_in_folder(args.input_folder, args.output_folder, created_videos, 
-                                       OUTPUT_CODEC, OUTPUT_FORMAT, system_info, MAX_OUTPUT_SIZE_MB)
+                                       OUTPUT_CODEC, OUTPUT_FORMAT, system_info, MAX_OUTPUT_SIZE_MB,
+                                       single_pass=args.single_pass, force=args.force, progress=args.progress,
+                                       time_budget=time_budget, segment_jobs=args.segments,
+                                       renditions=args.renditions, profile=args.profile, roi=args.roi)
             else:
                 print("\nSample videos created. You can run the script again to process them.")
         else:
@@ -1266,6 +2468,9 @@ if __name__ == "__main__":
         # Confirm selection
         if confirm_selection(video_files, selected_indices):
             process_videos_in_folder(args.input_folder, args.output_folder, selected_videos, 
-                                   OUTPUT_CODEC, OUTPUT_FORMAT, system_info, MAX_OUTPUT_SIZE_MB)
+                                   OUTPUT_CODEC, OUTPUT_FORMAT, system_info, MAX_OUTPUT_SIZE_MB,
+                                   single_pass=args.single_pass, force=args.force, progress=args.progress,
+                                   time_budget=time_budget, segment_jobs=args.segments,
+                                   renditions=args.renditions, profile=args.profile, roi=args.roi)
         else:
             print("\nCancelled. No videos were processed.")
\ No newline at end of file
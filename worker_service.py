@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Long-lived processing service for the Node backend.
+
+Spawning `python3 image.py` / `video.py` / `download.py` per HTTP request pays for
+interpreter start-up, the Pillow import and the ffmpeg/hardware-encoder checks on
+every call. This service imports the scripts once, detects capabilities once and
+keeps the in-process caches (overlay masks, ffprobe index) warm, then accepts jobs
+as JSON over a local HTTP socket:
+
+    POST /rpc  {"method": "process_images", "params": {"jobs": 4}}
+    ->         {"code": 0, "stdout": "...", "stderr": "...", "result": ...}
+
+With "stream": true the response is chunked JSON lines instead: each progress
+event the job writes (process_videos with progress "json") as it happens, then
+the payload above with "event": "result".
+
+The response mirrors what the backend used to build from a child process, so it
+can fall back to spawning the scripts when the service is not running. Jobs whose
+output is returned run in a pool of spawned job workers (PYTHON_WORKER_JOBS, default
+4), each capturing its own stdout/stderr, so a long bulk video run doesn't hold up
+image or download requests. Numeric
+params may be numbers or numeric strings (as the CLI fallback passes them); they and
+the named choices (engine, progress, profile, renditions) are checked up front, and
+invalid values get a 400 response.
+
+Methods (params mirror the scripts' CLI flags):
+    list_videos     {}                                      result: same as video.py --list-json
+    process_images  {files, jobs, force, engine, max_dimension}
+    process_videos  {files, bulk, jobs, single_pass, force, queue, progress, time_budget (minutes), segments, renditions, profile, roi}
+    download        {image_urls, video_urls, concurrency, retries}
+    download_process {image_urls, video_urls, concurrency, retries, jobs}   (see pipeline.py)
+"""
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import image
+import video
+import download
+import pipeline
+import job_queue
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_IMAGE_FOLDER = os.path.join(BASE_DIR, "input_images")
+OUTPUT_IMAGE_FOLDER = os.path.join(BASE_DIR, "output_images")
+INPUT_VIDEO_FOLDER = os.path.join(BASE_DIR, "input_videos")
+OUTPUT_VIDEO_FOLDER = os.path.join(BASE_DIR, "output_videos")
+
+DEFAULT_PORT = int(os.environ.get('PYTHON_WORKER_PORT', '5055'))
+OUTPUT_CODEC = 'h264'
+OUTPUT_FORMAT = 'mp4'
+MAX_OUTPUT_SIZE_MB = 10
+
+_system_info = None
+
+# Pools are started while request threads are running, and forking a multi-threaded
+# process can leave a child stuck on a lock another thread held. Spawned workers
+# start clean and still inherit fds 1 and 2 (see capture_output).
+POOL_CONTEXT = multiprocessing.get_context('spawn')
+
+# Captured jobs each run in a job worker: capture_output redirects that process's own
+# stdout/stderr, so jobs run side by side. Workers stay up between jobs and keep their
+# imports and caches warm.
+JOB_WORKERS = int(os.environ.get('PYTHON_WORKER_JOBS', '4'))
+_job_pool = None
+_job_pool_lock = threading.Lock()
+# How often a streamed job's stderr is checked for new progress events
+PROGRESS_POLL_SECONDS = 0.5
+
+@contextlib.contextmanager
+def capture_output(stderr_path=None):
+    """
+    Redirect file descriptors 1 and 2 into temp files for the duration of a job.
+    stderr goes to stderr_path instead when given, so the service can follow it
+    while the job runs (see handle_rpc).
+
+    Working at the fd level (rather than swapping sys.stdout) also captures output
+    from ffmpeg and from bulk worker processes, which inherit the descriptors. The
+    descriptors belong to the whole process, so this runs in a job worker (see
+    run_captured_job), never in the service's request threads.
+    """
+    captured = {}
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout, saved_stderr = os.dup(1), os.dup(2)
+    with tempfile.TemporaryFile() as out, \
+            (open(stderr_path, 'w+b') if stderr_path else tempfile.TemporaryFile()) as err:
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        try:
+            yield captured
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_stdout, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stdout)
+            os.close(saved_stderr)
+            out.seek(0)
+            err.seek(0)
+            captured['stdout'] = out.read().decode('utf-8', errors='replace')
+            captured['stderr'] = err.read().decode('utf-8', errors='replace')
+
+# Numeric params: name -> (type, minimum). Values are converted before any handler runs.
+NUMERIC_PARAMS = {
+    'jobs': (int, 0),
+    'segments': (int, 0),
+    'concurrency': (int, 1),
+    'retries': (int, 0),
+    'max_dimension': (int, 1),
+    'time_budget': (float, 0),
+}
+
+# Params that must be lists of strings (filenames or URL lines)
+LIST_PARAMS = ('files', 'image_urls', 'video_urls')
+
+# Params limited to a set of names, as by the CLI's choices: name -> allowed values
+CHOICE_PARAMS = {
+    'engine': image.ENGINES,
+    'progress': video.PROGRESS_MODES,
+    'profile': tuple(video.DELIVERY_PROFILES),
+}
+
+def _coerce_renditions(value):
+    """renditions as a list of names, from a list or a comma-separated string like --renditions."""
+    names = value.split(',') if isinstance(value, str) else value
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError(f"renditions must be a list of names, got {value!r}")
+    unknown = [name for name in names if name not in video.RENDITIONS]
+    if unknown:
+        raise ValueError(f"unknown rendition(s): {', '.join(unknown)} (choose from {', '.join(video.RENDITIONS)})")
+    return names
+
+def coerce_params(params):
+    """
+    Return params with the numeric ones converted (see NUMERIC_PARAMS), and the lists
+    (LIST_PARAMS) and named choices (CHOICE_PARAMS, renditions) checked; None and ''
+    count as not given, as on the CLI. Raises ValueError naming the first invalid param.
+    """
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object')
+    coerced = dict(params)
+    for name, (kind, minimum) in NUMERIC_PARAMS.items():
+        value = coerced.get(name)
+        if value is None or value == '':
+            coerced.pop(name, None)
+            continue
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            number = float(value)
+            if not math.isfinite(number) or (kind is int and not number.is_integer()):
+                raise ValueError
+            number = kind(number)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number, got {value!r}")
+        if number < minimum or (kind is float and number <= 0):
+            raise ValueError(f"{name} must be {'greater than' if kind is float else 'at least'} {minimum}, got {value!r}")
+        coerced[name] = number
+    for name in LIST_PARAMS:
+        value = coerced.get(name)
+        if value is None or value == '':
+            coerced.pop(name, None)
+        elif not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValueError(f"{name} must be a list of strings, got {value!r}")
+    for name, choices in CHOICE_PARAMS.items():
+        value = coerced.get(name)
+        if value is None or value == '':
+            coerced.pop(name, None)
+        elif value not in choices:
+            raise ValueError(f"{name} must be one of {', '.join(choices)}, got {value!r}")
+    if coerced.get('renditions') in (None, '', []):
+        coerced.pop('renditions', None)
+    else:
+        coerced['renditions'] = _coerce_renditions(coerced['renditions'])
+        if 'time_budget' in coerced:
+            raise ValueError("time_budget can't be combined with renditions (rendition ladders aren't tuned)")
+    return coerced
+
+def get_system_info():
+    """Detect ffmpeg and hardware encoders once per service lifetime."""
+    global _system_info
+    if _system_info is None:
+        if not video.check_ffmpeg_installed():
+            return None
+        _system_info = video.check_hardware_encoders(video.detect_system())
+    return _system_info
+
+def list_videos(params):
+    video_files = video.get_video_files(INPUT_VIDEO_FOLDER)
+    video_infos = video.get_video_infos([path for _, path in video_files])
+    return 0, [
+        {'filename': filename, 'path': path, 'info': video_infos.get(path) or {}}
+        for filename, path in video_files
+    ]
+
+def process_images(params):
+    ok = image.process_images_in_folder(
+        INPUT_IMAGE_FOLDER,
+        OUTPUT_IMAGE_FOLDER,
+        params.get('files'),
+        params.get('jobs') or 1,
+        bool(params.get('force')),
+        params.get('engine') or 'pillow',
+        params.get('max_dimension'),
+        mp_context=POOL_CONTEXT
+    )
+    return (0 if ok else 1), None
+
+def _time_budget_seconds(params):
+    """time_budget is given in minutes, like video.py --time-budget."""
+    minutes = params.get('time_budget')
+    return minutes * 60 if minutes else None
+
+def process_videos(params):
+    system_info = get_system_info()
+    if system_info is None:
+        return 1, None
+
+    if params.get('bulk'):
+        ok = video.process_videos_in_bulk(
+            INPUT_VIDEO_FOLDER,
+            OUTPUT_VIDEO_FOLDER,
+            params.get('jobs'),
+            MAX_OUTPUT_SIZE_MB,
+            bool(params.get('single_pass')),
+            bool(params.get('force')),
+            OUTPUT_CODEC,
+            OUTPUT_FORMAT,
+            system_info,
+            use_queue=bool(params.get('queue')),
+            progress=params.get('progress') or 'bar',
+            time_budget=_time_budget_seconds(params),
+            segment_jobs=params.get('segments'),
+            renditions=params.get('renditions'),
+            profile=params.get('profile'),
+            roi=bool(params.get('roi')),
+            mp_context=POOL_CONTEXT
+        )
+        return (0 if ok else 1), None
+
+    video_files = video.get_video_files(INPUT_VIDEO_FOLDER)
+    filenames = params.get('files')
+    if filenames:
+        lookup = dict(video_files)
+        missing = [fname for fname in filenames if fname not in lookup]
+        if missing:
+            print("The following files were not found in the input folder:")
+            for fname in missing:
+                print(f"  - {fname}")
+            return 1, None
+        video_files = [(fname, lookup[fname]) for fname in filenames]
+
+    ok = video.process_videos_in_folder(
+        INPUT_VIDEO_FOLDER,
+        OUTPUT_VIDEO_FOLDER,
+        video_files,
+        OUTPUT_CODEC,
+        OUTPUT_FORMAT,
+        system_info,
+        MAX_OUTPUT_SIZE_MB,
+        single_pass=bool(params.get('single_pass')),
+        force=bool(params.get('force')),
+        progress=params.get('progress') or 'bar',
+        time_budget=_time_budget_seconds(params),
+        segment_jobs=params.get('segments'),
+        renditions=params.get('renditions'),
+        profile=params.get('profile'),
+        roi=bool(params.get('roi'))
+    )
+    return (0 if ok else 1), None
+
+def _download_urls(params):
+    """Image and video lines from params, or from the links files when neither is given."""
+    image_urls = params.get('image_urls') or []
+    video_urls = params.get('video_urls') or []
+    if not image_urls and not video_urls:
+        # Same as running download.py without URLs: read the links files
+        image_urls = pipeline.read_links_file(os.path.join(BASE_DIR, download.IMAGE_INPUT_FILE))
+        video_urls = pipeline.read_links_file(os.path.join(BASE_DIR, download.VIDEO_INPUT_FILE))
+    return image_urls, video_urls
+
+def run_download(params):
+    concurrency = params.get('concurrency') or download.DEFAULT_CONCURRENCY
+    retries = params.get('retries', download.DEFAULT_RETRIES)
+    image_urls, video_urls = _download_urls(params)
+
+    if image_urls:
+        print("Starting image downloads...")
+        download.download_image_lines(image_urls, concurrency, retries)
+        print("Image downloads complete.")
+    if video_urls:
+        print("Starting video downloads...")
+        download.download_video_lines(video_urls, concurrency, retries)
+        print("Video downloads complete.")
+    print(f"\nDownload complete! Check '{download.INPUT_IMAGE_FOLDER}' and '{download.INPUT_VIDEO_FOLDER}' folders.")
+    return 0, None
+
+def run_download_process(params):
+    image_urls, video_urls = _download_urls(params)
+    code = pipeline.run_pipeline(
+        image_urls,
+        video_urls,
+        params.get('concurrency') or download.DEFAULT_CONCURRENCY,
+        params.get('retries', download.DEFAULT_RETRIES),
+        params.get('jobs')
+    )
+    return code, None
+
+# method name -> (handler, whether its console output is captured into the response)
+METHODS = {
+    'list_videos': (list_videos, False),
+    'process_images': (process_images, True),
+    'process_videos': (process_videos, True),
+    'download': (run_download, True),
+    'download_process': (run_download_process, True),
+}
+
+def _init_job_worker(system_info):
+    """Job worker start-up: reuse the capabilities the service already detected."""
+    global _system_info
+    _system_info = system_info
+
+def get_job_pool():
+    """The job worker pool, started on first use."""
+    global _job_pool
+    with _job_pool_lock:
+        if _job_pool is None:
+            _job_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=JOB_WORKERS, mp_context=POOL_CONTEXT,
+                initializer=_init_job_worker, initargs=(_system_info,)
+            )
+        return _job_pool
+
+def _discard_job_pool(pool):
+    """Drop a pool whose worker died, so the next job starts a fresh one."""
+    global _job_pool
+    with _job_pool_lock:
+        if _job_pool is pool:
+            _job_pool = None
+    pool.shutdown(wait=False)
+
+def run_captured_job(method, params, stderr_path=None):
+    """
+    Run a captured method in this (job worker) process; returns (code, result, stdout,
+    stderr). Progress events (video.PROGRESS_PREFIX lines) are left out of stderr.
+    """
+    handler, _ = METHODS[method]
+    with capture_output(stderr_path) as output:
+        try:
+            code, result = handler(params)
+        except Exception as e:
+            print(f"❌ {method} failed: {e}", file=sys.stderr)
+            code, result = 1, None
+    stderr = ''.join(line for line in output['stderr'].splitlines(keepends=True)
+                     if not line.startswith(video.PROGRESS_PREFIX))
+    return code, result, output['stdout'], stderr
+
+def _follow_progress(path, position, on_progress):
+    """Pass the progress events in complete lines after position in path to on_progress; returns the new position."""
+    with open(path, 'rb') as f:
+        f.seek(position)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    for line in data[:end].decode('utf-8', errors='replace').splitlines():
+        event = video.parse_progress_line(line)
+        if event is not None:
+            on_progress(event)
+    return position + end
+
+def handle_rpc(method, params, on_progress=None):
+    """
+    Run one job and return the response payload. on_progress(event) is called with
+    each progress event the job writes (video jobs with progress='json') as it runs.
+    """
+    handler, captured = METHODS[method]
+    if not captured:
+        code, result = handler(params)
+        return {'code': code, 'stdout': '', 'stderr': '', 'result': result}
+
+    stderr_path = None
+    if on_progress is not None:
+        fd, stderr_path = tempfile.mkstemp(prefix='.worker_stderr_')
+        os.close(fd)
+    pool = get_job_pool()
+    try:
+        future = pool.submit(run_captured_job, method, params, stderr_path)
+        position = 0
+        while stderr_path and not future.done():
+            concurrent.futures.wait([future], timeout=PROGRESS_POLL_SECONDS)
+            position = _follow_progress(stderr_path, position, on_progress)
+        code, result, stdout, stderr = future.result()
+    except concurrent.futures.process.BrokenProcessPool as e:
+        _discard_job_pool(pool)
+        return {'code': 1, 'stdout': '', 'stderr': f"❌ {method} failed: job worker exited ({e})\n", 'result': None}
+    finally:
+        if stderr_path:
+            os.remove(stderr_path)
+    return {'code': code, 'stdout': stdout, 'stderr': stderr, 'result': result}
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        """Write payload as one JSON line in its own chunk of a chunked response."""
+        line = (json.dumps(payload) + '\n').encode('utf-8')
+        self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b'\r\n')
+        self.wfile.flush()
+
+    def _stream_rpc(self, method, params):
+        """
+        Run a job with its progress events streamed as JSON lines ({"event": "progress",
+        ...}), followed by the usual payload with "event": "result".
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        connected = True
+
+        def on_progress(event):
+            nonlocal connected
+            if not connected:
+                return
+            try:
+                self._write_chunk(event)
+            except OSError:
+                # The client went away; the job still runs to completion
+                connected = False
+
+        payload = handle_rpc(method, params, on_progress)
+        if connected:
+            self._write_chunk(dict(payload, event='result'))
+            self.wfile.write(b'0\r\n\r\n')
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'pid': os.getpid()})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/rpc':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            method = request['method']
+            params = request.get('params') or {}
+            stream = bool(request.get('stream'))
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {'error': 'expected JSON body {"method": ..., "params": {...}}'})
+            return
+        if method not in METHODS:
+            self._send_json(400, {'error': f'unknown method: {method}'})
+            return
+        try:
+            params = coerce_params(params)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        if stream:
+            self._stream_rpc(method, params)
+        else:
+            self._send_json(200, handle_rpc(method, params))
+
+    def log_message(self, format, *args):
+        # The backend logs its own requests; keep the service's console for its own messages
+        pass
+
+def resume_queued_jobs():
+    """
+    Finish the bulk video run a previous service process left in the durable queue
+    (e.g. it was killed mid-batch), instead of waiting for the next bulk request.
+    """
+    pending = job_queue.pending_jobs(OUTPUT_VIDEO_FOLDER)
+    if not pending:
+        return None
+    print(f"♻️  Resuming {pending} queued video job(s) left by the last run", flush=True)
+    payload = handle_rpc('process_videos', {'bulk': True, 'queue': True})
+    print(payload['stdout'] + payload['stderr'], end='', flush=True)
+    print(f"Resumed video jobs finished with code {payload['code']}", flush=True)
+    return payload['code']
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident image/video processing service for the backend.")
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    get_system_info()
+    server = ThreadingHTTPServer((args.host, args.port), WorkerRequestHandler)
+    print(f"Processing service listening on http://{args.host}:{args.port}", flush=True)
+    threading.Thread(target=resume_queued_jobs, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if _job_pool is not None:
+            _job_pool.shutdown(cancel_futures=True)
+
+if __name__ == '__main__':
+    main()